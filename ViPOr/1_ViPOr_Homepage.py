@@ -5,11 +5,16 @@
 
 import streamlit as st
 
+from startup import prewarm
+
 st.set_page_config(
     page_title="Welcome to ViPOr!",
     page_icon="🐍",
 )
 
+# start importing galpy, astropy and matplotlib in the background, so the other pages open quickly
+prewarm()
+
 # some introductory text with basic information about gravitational potentials, forces and orbits
 
 st.markdown("# Welcome to :green[ViPOr] :green[Vi]sualizing :green[P]otentials and :green[Or]bits with Python!")
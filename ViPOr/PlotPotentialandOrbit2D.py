@@ -1,19 +1,20 @@
 # This file contrains functions for plotting figures that describe the orbit of a particle in two dimensions. This function is called in the
 # spherically symmetric, axisymmetric and triaxial mass distribution pages. 
 
-from galpy.orbit import Orbit
-from astropy import units
-import galpy.potential
-from galpy.util.conversion import get_physical
-import numexpr
-import matplotlib.pyplot as plt
-import numpy
-import streamlit as st
+from figure_manager import new_figure
+from orbit_animation import get_animation
+from orbit_cache import get_trace
+from image_cache import trace_image
+from interactive_plots import orbit_chart
+from potential_grid import plot_potential
+from profiler import timed
+from progressive import submit
+from sampling import triangle_downsample
 
 def plot_orbit_2D(_pot_fxn, _years, _R, _z):
 	'''
-	Plot the orbit of your selected potential in three dimensions, integrating over a variable number of times and allowing
-	the user to change the number of spiral arms present, and the effects of dynamical friction.
+	Plot the orbit of your selected potential in two dimensions, integrated over a number of Gyr chosen by the user, along with
+	the animations of the orbit and a contour plot of the potential.
 
 	Inputs
 	--------
@@ -28,76 +29,135 @@ def plot_orbit_2D(_pot_fxn, _years, _R, _z):
 	fig1: a two dimensional plot of the orbit in right ascension vs. declination coordinates
 	fig2: a two dimensional plot of the orbit in R vs. radial velocity coordinates
 	fig3: a two dimensional plot of the orbit in Cartesian coordinates
-	raw_html: the raw html for the animation, which can be plotted by streamlit
+	raw_html: the raw html for the animation in R vs. z coordinates, which can be plotted by streamlit
+	raw_html_2: the raw html for the animation in Cartesian coordinates
 	density: a contour plot of the potential
 	'''	
 
-	# define all the initial conditions — some of these are input by the user and others are set automatically
-	
-	R = _R*units.kpc
-	z = _z*units.kpc
-	
-	vR = 0.0*units.km/units.s
-	vT = 0.0*units.km/units.s
-	vz = 0.0*units.km/units.s
-	phi = 0.0*units.radian
+	# get every coordinate series of the orbit at once, as arrays; each series is trimmed to a pixel-appropriate number of
+	# points with triangle_downsample before it is plotted — the orbit is shared with the other plotting functions and
+	# pages, so it is only integrated again if the potential, the initial conditions or the duration have changed
+	trace = get_trace(_pot_fxn, _years, _R, _z)
+	fig0, fig1, fig2, fig3 = plot_R_z(trace), plot_ra_dec(trace), plot_R_vR(trace), plot_x_y(trace)
 
-	init_cond = [R, vR, vT, z, vz, phi]
+	# get the raw html data for the two-dimensional orbit in Cartesian and R vs. z coordinates
+	raw_html_2 = get_animation(_pot_fxn, _years, _R, _z, d1 = 'x', d2 = 'y')
+	raw_html = get_animation(_pot_fxn, _years, _R, _z, d1 = 'R', d2 = 'z')
+
+	# get the plot of the potential
+	density = plot_potential(_pot_fxn, phi = 0.0)
+
+	return fig0, fig1, fig2, fig3, raw_html, raw_html_2, density
+
+
+def submit_figure_2D(name, trace, backend = "matplotlib"):
+	'''
+	Starts making one of the plots of plot_orbit_2D in the worker pool, once the orbit's trace is ready.
+
+	Inputs
+	--------
+	name: the plot to make — "R_z", "ra_dec", "R_vR" or "x_y"
+	trace: the orbit's trace, or its Future
+	backend: "matplotlib" for the rendered image of the figure (see image_cache), or "interactive" for charts that are drawn by the
+	browser (see interactive_plots)
+
+	Outputs:
+	-------
+	figure: the Future of the rendered image of the figure, or of its interactive chart
+	'''
+
+	plot_fxn, chart_fxn = FIGURES[name]
+	if backend == "interactive":
+		return submit(chart_fxn, trace)
+	return submit(trace_image, plot_fxn, trace)
 
-	# initialize the orbit and integrate
-	orbit = Orbit(init_cond, **get_physical(_pot_fxn))
-	times = numpy.linspace(0.,_years,3001)*units.Gyr
-	orbit.integrate(times, _pot_fxn)
 
-	fig, ax = plt.subplots()
+def submit_animation_2D(pot_fxn, years, R, z, d1, d2, trace = None):
+	'''
+	Starts making one of the animations of plot_orbit_2D in the worker pool, with d1 and d2 as its horizontal and vertical axes ('R'
+	and 'z', or 'x' and 'y'), once the orbit's trace is ready, and returns its Future.
+	'''
+
+	return submit(get_animation, pot_fxn, years, R, z, d1 = d1, d2 = d2, after = [] if trace is None else [trace])
 
-	# get the data from the plot of the orbit in R vs. z coordinates
-	reg = orbit.plot(lw=0.6)[0].get_data()
 
-	# plot the orbit, setting axis labels and titles
-	fig0, ax0 = plt.subplots()
-	plt.plot(reg[0], reg[1])
+@timed("figures")
+def plot_R_z(trace):
+	'''
+	Plots the orbit in R vs. z coordinates, setting axis labels and titles.
+	'''
+
+	fig0, ax0 = new_figure()
+	keep = triangle_downsample(trace.R, trace.z)
+	ax0.plot(trace.R[keep], trace.z[keep])
 	ax0.set_xlabel(r"$R$ (kpc)")
 	ax0.set_ylabel(r"$z$ (kpc)")
 	ax0.set_title("Orbit, in R vs. z")
-	
-	# get the data for the orbit in right ascension vs. declination coordinates
-	ra_dec = orbit.plot(d1='ra',d2='dec')[0].get_data()
+	return fig0
+
+
+@timed("figures")
+def plot_ra_dec(trace):
+	'''
+	Plots the orbit in right ascension vs. declination coordinates, setting axis labels and titles.
+	'''
 
-	# plot the orbit, setting axis labels and titles
-	fig1, ax1 = plt.subplots()
-	ax1.scatter(ra_dec[0], ra_dec[1])
+	fig1, ax1 = new_figure()
+	keep = triangle_downsample(trace.ra, trace.dec)
+	ax1.scatter(trace.ra[keep], trace.dec[keep])
 	ax1.set_xlabel(r"$\alpha$, Right Ascension (deg)")
 	ax1.set_ylabel(r"$\delta$, Declination (deg)")
 	ax1.set_title("Orbit, in RA and Dec Coordinates")
+	return fig1
 
-	# get the data for the orbit in R vs. radial velocity coordinates
-	r_vr = orbit.plot(d1='R',d2='vR')[0].get_data()
 
-	# plot the orbit, setting axis labels and titles
-	fig2, ax2 = plt.subplots()
-	ax2.plot(r_vr[0], r_vr[1])
+@timed("figures")
+def plot_R_vR(trace):
+	'''
+	Plots the orbit in R vs. radial velocity coordinates, setting axis labels and titles.
+	'''
+
+	fig2, ax2 = new_figure()
+	keep = triangle_downsample(trace.R, trace.vR)
+	ax2.plot(trace.R[keep], trace.vR[keep])
 	ax2.set_xlabel(r"$R$ (kpc)")
 	ax2.set_ylabel(r"$v_R$ (km/s)")
 	ax2.set_title("Radius vs. Radial Velocity")
+	return fig2
 
-	# get the data for the orbit in Cartesian coordinates
-	x_y = orbit.plot(d1='x',d2='y')[0].get_data()
 
-	# plot the orbit, setting axis labels and titles
-	fig3, ax3 = plt.subplots()
-	ax3.scatter(x_y[0], x_y[1])
+@timed("figures")
+def plot_x_y(trace):
+	'''
+	Plots the orbit in Cartesian coordinates, setting axis labels and titles.
+	'''
+
+	fig3, ax3 = new_figure()
+	keep = triangle_downsample(trace.x, trace.y)
+	ax3.scatter(trace.x[keep], trace.y[keep])
 	ax3.set_xlabel(r"$x$ (kpc)")
 	ax3.set_ylabel(r"$y$ (kpc)")
 	ax3.set_title("Orbit, Projected Onto X-Y Plane")
+	return fig3
 
-	# get the raw html data for the two-dimensional orbit in Cartesian and R vs. z coordinates
-	raw_html_2 = orbit.animate(d1=['x'],d2=['y'])._repr_html_()
-	raw_html = orbit.animate(d1=['R'],d2=['z'])._repr_html_()
 
-	# get the plot of the potential
-	density = galpy.potential.plotPotentials(_pot_fxn, phi = 0.0*units.radian)
+# the same plots, as charts drawn by the browser
 
-	return fig0, fig1, fig2, fig3, raw_html, raw_html_2, density
+def chart_R_z(trace):
+	return orbit_chart(trace, "R", "z", "Orbit, in R vs. z")
+
+
+def chart_ra_dec(trace):
+	return orbit_chart(trace, "ra", "dec", "Orbit, in RA and Dec Coordinates", mark = "point")
+
+
+def chart_R_vR(trace):
+	return orbit_chart(trace, "R", "vR", "Radius vs. Radial Velocity")
+
+
+def chart_x_y(trace):
+	return orbit_chart(trace, "x", "y", "Orbit, Projected Onto X-Y Plane", mark = "point")
 
 
+# the plots of plot_orbit_2D by name, as their matplotlib figure and their chart
+FIGURES = {"R_z": (plot_R_z, chart_R_z), "ra_dec": (plot_ra_dec, chart_ra_dec), "R_vR": (plot_R_vR, chart_R_vR), "x_y": (plot_x_y, chart_x_y)}
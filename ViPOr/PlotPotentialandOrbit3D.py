@@ -1,21 +1,20 @@
 # This file contrains functions for plotting figures that describe the orbit of a particle in three dimensions. This function is called in the
 # spherically symmetric, axisymmetric and triaxial mass distribution pages. 
 
-from galpy.orbit import Orbit
-from astropy import units
-import galpy
-import galpy.potential
-from galpy.util.conversion import get_physical
-import numexpr
-import matplotlib.pyplot as plt
-import numpy
-
-import streamlit as st
+from figure_manager import new_figure
+from orbit_animation import get_animation
+from orbit_cache import get_trace
+from image_cache import trace_image
+from interactive_plots import orbit_chart_3d
+from potential_grid import plot_potential
+from profiler import timed
+from progressive import submit
+from sampling import triangle_downsample
 
 def plot_orbit_3D(pot_fxn, years, R, z):
 	'''
-	Plot the orbit of your selected potential in three dimensions, integrating over a variable number of times and allowing
-	the user to change the number of spiral arms present, and the effects of dynamical friction.
+	Plot the orbit of your selected potential in three dimensions, integrated over a number of Gyr chosen by the user, along with
+	the animation of the orbit and a contour plot of the potential.
 
 	Inputs
 	--------
@@ -33,61 +32,113 @@ def plot_orbit_3D(pot_fxn, years, R, z):
 	density: a contour plot of the potential
 	'''	
 
-	# define all the initial conditions — some of these are input by the user and others are set automatically
+	# get every coordinate series of the orbit at once, as arrays; each series is trimmed to a pixel-appropriate number of
+	# points with triangle_downsample before it is plotted — the orbit is shared with the other plotting functions and
+	# pages, so it is only integrated again if the potential, the initial conditions or the duration have changed
+	trace = get_trace(pot_fxn, years, R, z)
+	fig0, fig1, fig2 = plot_x_y_z(trace), plot_R_vR_z(trace), plot_R_vR_vz(trace)
+
+	# get the raw html for the animation and the contour plot of the potential, so these can be plotted with streamlit
+	raw_html = get_animation(pot_fxn, years, R, z, d1 = 'x', d2 = 'y', d3 = 'z', height = 800)
+	density = plot_potential(pot_fxn, phi = 0.0)
+
+	return fig0, fig1, fig2, raw_html, density
+
+
+def submit_figure_3D(name, trace, backend = "matplotlib"):
+	'''
+	Starts making one of the plots of plot_orbit_3D in the worker pool, once the orbit's trace is ready.
+
+	Inputs
+	--------
+	name: the plot to make — "x_y_z", "R_vR_z" or "R_vR_vz"
+	trace: the orbit's trace, or its Future
+	backend: "matplotlib" for the rendered image of the figure (see image_cache), or "interactive" for WebGL plots that are drawn by
+	the browser (see interactive_plots)
+
+	Outputs:
+	-------
+	figure: the Future of the rendered image of the figure, or of its interactive chart
+	'''
 
-	R = R*units.kpc
-	z = z*units.kpc
-	
-	vR = 0.0*units.km/units.s
-	vT = 0.0*units.km/units.s
-	vz = 0.0*units.km/units.s
-	phi = 0.0*units.radian
+	plot_fxn, chart_fxn = FIGURES[name]
+	if backend == "interactive":
+		return submit(chart_fxn, trace)
+	return submit(trace_image, plot_fxn, trace)
+
+
+def submit_animation_3D(pot_fxn, years, R, z, trace = None):
+	'''
+	Starts making the animation of plot_orbit_3D in the worker pool, once the orbit's trace is ready, and returns its Future.
+	'''
 
-	init_cond = [R, vR, vT, z, vz, phi]
+	return submit(get_animation, pot_fxn, years, R, z, d1 = 'x', d2 = 'y', d3 = 'z', height = 800, after = [] if trace is None else [trace])
 
-	# initialize the orbit, and integrate it over the input duration of time
-	orbit = Orbit(init_cond, **get_physical(pot_fxn))
-	times = numpy.linspace(0.,years,3001)*units.Gyr
-	orbit.integrate(times, pot_fxn)
 
-	# get the data from the plot of the orbit in Cartesian coordinates
-	reg = orbit.plot3d(lw=0.6)[0].get_data_3d()
+@timed("figures")
+def plot_x_y_z(trace):
+	'''
+	Plots the orbit in Cartesian coordinates, setting axis labels and titles.
+	'''
 
-	# plot the orbit, setting axis labels and titles
-	fig0, ax0 = plt.subplots(figsize = (10, 9),subplot_kw=dict(projection='3d'))
-	ax0.plot(reg[0], reg[1], reg[2])
+	fig0, ax0 = new_figure(figsize = (10, 9), projection = '3d')
+	keep = triangle_downsample(trace.x, trace.y, trace.z)
+	ax0.plot(trace.x[keep], trace.y[keep], trace.z[keep])
 	ax0.set_xlabel(r"$x$")
 	ax0.set_ylabel(r"$y$")
 	ax0.set_zlabel(r"$z$")
 	ax0.set_title("Orbit in X, Y and Z Coordinates")
 
-	plt.xlim(-100.,100.)
-	plt.ylim(-100.,100)
-	
-	# get the data for the other two three-dimensional orbit plots
-	r_vr = orbit.plot3d(d1 = 'R',d2 = 'vR', d3 = 'z')[0].get_data_3d()
-	ra_dec = orbit.plot3d(d1 = 'R',d2 = 'vR', d3 = 'vT')[0].get_data_3d()
+	ax0.set_xlim(-100.,100.)
+	ax0.set_ylim(-100.,100)
+	return fig0
+
 
-	# plot R vs. vR vs. z, configure axis labels and titles
-	fig1, ax1 = plt.subplots(figsize = (10, 9), subplot_kw=dict(projection='3d'))
-	ax1.plot(ra_dec[0], ra_dec[1], ra_dec[2])
+@timed("figures")
+def plot_R_vR_z(trace):
+	'''
+	Plots R vs. vR vs. z, and configures axis labels and titles.
+	'''
+
+	fig1, ax1 = new_figure(figsize = (10, 9), projection = '3d')
+	keep = triangle_downsample(trace.R, trace.vR, trace.z)
+	ax1.plot(trace.R[keep], trace.vR[keep], trace.z[keep])
 	ax1.set_xlabel(r"$R$")
 	ax1.set_ylabel(r"$v_R$")
 	ax1.set_zlabel(r"$z$")
 	ax1.set_title("Orbital Radius vs. Radial Velocity and Height from the Plane of the Disk")
+	return fig1
+
+
+@timed("figures")
+def plot_R_vR_vz(trace):
+	'''
+	Plots R vs. vR vs. vz, and configures axis labels and titles.
+	'''
 
-	# plot R vs. vR vs. vz, configure axis labels and titles
-	fig2, ax2 = plt.subplots(figsize = (10, 9), subplot_kw=dict(projection='3d'))
-	ax2.plot(r_vr[0], r_vr[1], r_vr[2])
+	fig2, ax2 = new_figure(figsize = (10, 9), projection = '3d')
+	keep = triangle_downsample(trace.R, trace.vR, trace.vz)
+	ax2.plot(trace.R[keep], trace.vR[keep], trace.vz[keep])
 	ax2.set_xlabel(r"$R$")
 	ax2.set_ylabel(r"$v_R$")
 	ax2.set_zlabel(r"$v_z$")
 	ax2.set_title("Orbital Radius vs. Radial and Vertical Velocities")
+	return fig2
 
-	# get the raw html for the animation and the contour plot of the potential, so these can be plotted with streamlit
-	raw_html = orbit.animate3d()._repr_html_()
-	density = galpy.potential.plotPotentials(pot_fxn, phi = 0.0*units.radian)
 
-	return fig0, fig1, fig2, raw_html, density
+# the same plots, drawn by the browser with WebGL
+
+def chart_x_y_z(trace):
+	return orbit_chart_3d(trace, "x", "y", "z", "Orbit in X, Y and Z Coordinates", limits = {"x": (-100., 100.), "y": (-100., 100.)})
+
+
+def chart_R_vR_z(trace):
+	return orbit_chart_3d(trace, "R", "vR", "z", "Orbital Radius vs. Radial Velocity and Height from the Plane of the Disk")
+
+
+def chart_R_vR_vz(trace):
+	return orbit_chart_3d(trace, "R", "vR", "vz", "Orbital Radius vs. Radial and Vertical Velocities")
+
 
-	
+# the plots of plot_orbit_3D by name, as their matplotlib figure and their chart
+FIGURES = {"x_y_z": (plot_x_y_z, chart_x_y_z), "R_vR_z": (plot_R_vR_z, chart_R_vR_z), "R_vR_vz": (plot_R_vR_vz, chart_R_vR_vz)}
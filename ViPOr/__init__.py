@@ -1 +1,2 @@
-from .ViPOr import *
+# ViPOr's modules import each other by their bare names, as the streamlit pages do, so they are meant to be run or imported from
+# this directory (see render_sweep.py for how the vipor-render command sets this up).
@@ -0,0 +1,116 @@
+# This file manages the lifecycle of the matplotlib figures that ViPOr draws. Figures are built with the object-oriented Figure API,
+# so they never enter pyplot's global figure registry, and every figure is released as soon as streamlit has displayed it. Without
+# this, each rerun of a page left half a dozen figures behind, and the memory of the server grew until it was restarted.
+
+import sys
+import threading
+import weakref
+
+import streamlit as st
+
+from profiler import stage
+
+# every figure handed out by new_figure that has not been released yet — this is a weak set, so a figure that is simply dropped
+# by its caller disappears from it once it's garbage collected
+_live = weakref.WeakSet()
+_lock = threading.Lock()
+_stats = {"created": 0, "released": 0}
+
+
+def new_figure(figsize = None, projection = None):
+	'''
+	Creates a figure with a single set of axes, without touching pyplot's global state.
+
+	Inputs
+	--------
+	figsize: the size of the figure in inches, as in plt.subplots
+	projection: the projection of the axes, e.g. '3d' for three dimensional plots
+
+	Outputs:
+	-------
+	fig: the matplotlib Figure
+	ax: the axes of the figure
+	'''
+
+	# matplotlib takes a while to import, so it's only imported when the first figure is made
+	from matplotlib.figure import Figure
+
+	fig = Figure(figsize = figsize)
+	ax = fig.add_subplot(projection = projection)
+
+	with _lock:
+		_live.add(fig)
+		_stats["created"] += 1
+
+	return fig, ax
+
+
+def release(fig):
+	'''
+	Releases a figure once it's no longer needed: its artists are cleared, and if it belongs to pyplot (e.g. figures drawn by
+	galpy's plotting functions) it is also closed, so pyplot stops holding on to it.
+
+	Inputs
+	--------
+	fig: the figure to release, or any artist belonging to it
+	'''
+
+	if fig is None:
+		return
+	if not hasattr(fig, "savefig"):
+		fig = fig.get_figure()
+
+	# closing a figure that pyplot doesn't know about does nothing, so this is safe for our own figures too — and if pyplot was
+	# never imported, it can't be holding on to any figures
+	if "matplotlib.pyplot" in sys.modules:
+		sys.modules["matplotlib.pyplot"].close(fig)
+	fig.clear()
+
+	with _lock:
+		_live.discard(fig)
+		_stats["released"] += 1
+
+
+def show_figure(fig, **kwargs):
+	'''
+	Displays a figure with streamlit and then releases it straight away.
+
+	Inputs
+	--------
+	fig: the figure to display, or any artist belonging to it (e.g. the output of galpy.potential.plotPotentials)
+	kwargs: keyword arguments passed on to st.pyplot, e.g. bbox_inches and pad_inches
+	'''
+
+	if not hasattr(fig, "savefig"):
+		fig = fig.get_figure()
+	with stage("rasterization"):
+		st.pyplot(fig, **kwargs)
+	release(fig)
+
+
+def live_figures():
+	'''
+	Reports how many figures are currently alive.
+
+	Outputs:
+	-------
+	info: a dictionary with the number of figures from new_figure that are not yet released ("managed"), the number of figures
+	held by pyplot ("pyplot"), and the total number of figures created and released
+	'''
+
+	with _lock:
+		pyplot = sys.modules.get("matplotlib.pyplot")
+		info = {"managed": len(_live), "pyplot": len(pyplot.get_fignums()) if pyplot else 0}
+		info.update(_stats)
+	return info
+
+
+def figure_panel(container):
+	'''
+	Shows the live figures in a Streamlit container (e.g. the sidebar): the figures that are not released yet, and the number created
+	and released since the server started.
+	'''
+
+	info = live_figures()
+	container.markdown("**%d** figures are alive (%d held by pyplot), of the %d created; %d were released." % (info["managed"],
+		info["pyplot"], info["created"], info["released"]))
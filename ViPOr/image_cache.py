@@ -0,0 +1,303 @@
+# This file caches the rendered images of ViPOr's figures. Rasterizing a matplotlib figure — above all the 10 x 9 inch 3D plots — costs
+# more than anything else on a page whose orbit is already cached, and the same orbit is drawn again on every rerun and in every session.
+# So each figure is keyed by a hash of what it shows — the data it plots, the function that draws it and the options it is saved with —
+# and on a hit the stored PNG (or SVG) is shown straight away, without building or rasterizing the figure at all. Images are kept in
+# memory and on disk, both bounded in size, so they also survive restarts of the server and are shared by the server's processes.
+
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+import threading
+
+import numpy
+
+from figure_manager import release
+from profiler import stage
+import result_store
+
+# where the rendered images are stored, unless the VIPOR_IMAGE_CACHE environment variable points somewhere else
+IMAGE_DIR = os.environ.get("VIPOR_IMAGE_CACHE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "image_cache"))
+
+# the total size (in bytes) of the images kept in memory and on disk
+MAX_BYTES = 64*1024**2
+MAX_DISK_BYTES = 512*1024**2
+
+# bump this whenever the styling of the figures changes, so the images drawn in the old style are no longer served
+STYLE_VERSION = 1
+
+# the options st.pyplot saves figures with, which the cached images are saved with too, so they look just the same
+SAVEFIG_DEFAULTS = {"bbox_inches": "tight", "dpi": 200, "format": "png"}
+
+# the options the plots of the orbits are saved with on the orbit pages
+ORBIT_SAVEFIG = {"bbox_inches": "tight", "pad_inches": 0.5}
+
+_images = result_store.region("images", max_bytes = MAX_BYTES, sizeof = lambda image: len(image.data))
+
+# the total size of the images on disk, which is kept up to date under the lock
+_lock = threading.Lock()
+_disk = {"bytes": None}
+
+
+class RenderedImage:
+	'''
+	The rendered image of a figure.
+
+	Attributes
+	--------
+	key: the content hash the image is stored under
+	data: the bytes of the image
+	format: "png" or "svg"
+	'''
+
+	__slots__ = ("key", "data", "format")
+
+	def __init__(self, key, data, format):
+		self.key = key
+		self.data = data
+		self.format = format
+
+
+def content_hash(*parts):
+	'''
+	Hashes the content of a figure: arrays by their type, shape and values, and everything else by its repr.
+	'''
+
+	digest = hashlib.sha1()
+	for part in parts:
+		if isinstance(part, numpy.ndarray):
+			digest.update(("%s%s" % (part.dtype.str, part.shape)).encode())
+			digest.update(numpy.ascontiguousarray(part).data)
+		else:
+			digest.update(repr(part).encode())
+		digest.update(b"|")
+	return digest.hexdigest()
+
+
+def image_key(builder, data, savefig):
+	'''
+	Builds the key of a figure's image from the function that draws it, a hash of the data it is drawn from and the options it is
+	saved with.
+	'''
+
+	return content_hash(STYLE_VERSION, builder.__module__ + "." + builder.__qualname__, data, sorted(savefig.items()))
+
+
+def _disk_path(key, format):
+	return os.path.join(IMAGE_DIR, key[:2], key + "." + format)
+
+
+def _disk_bytes():
+	'''
+	Returns the total size of the images on disk, which is measured once and then kept up to date. This is called with the lock held.
+	'''
+
+	if _disk["bytes"] is None:
+		total = 0
+		for folder, _, files in os.walk(IMAGE_DIR):
+			for file_name in files:
+				try:
+					total += os.path.getsize(os.path.join(folder, file_name))
+				except OSError:
+					pass
+		_disk["bytes"] = total
+	return _disk["bytes"]
+
+
+def _trim_disk():
+	'''
+	Deletes the least recently used images on disk until they fit in MAX_DISK_BYTES again. This is called with the lock held.
+	'''
+
+	if _disk_bytes() <= MAX_DISK_BYTES:
+		return
+
+	files = []
+	for folder, _, file_names in os.walk(IMAGE_DIR):
+		for file_name in file_names:
+			path = os.path.join(folder, file_name)
+			try:
+				status = os.stat(path)
+			except OSError:
+				continue
+			files.append((status.st_mtime, status.st_size, path))
+
+	# images are trimmed to three quarters of the limit, so the disk isn't scanned again on the very next image
+	total = sum(size for _, size, _ in files)
+	for _, size, path in sorted(files):
+		if total <= 0.75*MAX_DISK_BYTES:
+			break
+		try:
+			os.remove(path)
+			total -= size
+		except OSError:
+			pass
+	_disk["bytes"] = total
+
+
+def _read_disk(key, format):
+	'''
+	Reads an image from disk, or returns None if it isn't there.
+	'''
+
+	path = _disk_path(key, format)
+	try:
+		with open(path, "rb") as image_file:
+			data = image_file.read()
+		# the modification time of an image on disk is when it was last used, which is what the disk is trimmed by
+		os.utime(path)
+	except OSError:
+		return None
+	_images.count("disk")
+	return RenderedImage(key, data, format)
+
+
+def _write_disk(image):
+	'''
+	Writes an image to disk, trimming the images on disk if they no longer fit.
+	'''
+
+	path = _disk_path(image.key, image.format)
+	try:
+		os.makedirs(os.path.dirname(path), exist_ok = True)
+		# the image is written to a temporary file and then moved into place, so another process never reads half an image
+		handle, temporary = tempfile.mkstemp(dir = os.path.dirname(path), suffix = ".tmp")
+		with os.fdopen(handle, "wb") as image_file:
+			image_file.write(image.data)
+		os.replace(temporary, path)
+	except OSError:
+		# a read-only or full disk only means the image is kept in memory alone
+		return image
+
+	with _lock:
+		# the first image written measures what's already on disk, including itself
+		if _disk["bytes"] is None:
+			_disk_bytes()
+		else:
+			_disk["bytes"] += len(image.data)
+		_trim_disk()
+	return image
+
+
+def get_image(key, format = "png"):
+	'''
+	Looks up an image, first in memory and then on disk.
+
+	Outputs:
+	-------
+	image: the RenderedImage, or None if the image was never rendered (or has been evicted)
+	'''
+
+	image = _images.get(key)
+	if image is None:
+		image = _read_disk(key, format)
+		if image is not None:
+			_images.put(key, image)
+	return image
+
+
+def put_image(key, data, format = "png"):
+	'''
+	Stores a rendered image in memory and on disk.
+
+	Outputs:
+	-------
+	image: the RenderedImage
+	'''
+
+	return _images.put(key, _write_disk(RenderedImage(key, data, format)))
+
+
+def rasterize(fig, **savefig):
+	'''
+	Renders a figure to the bytes of an image, with the same options as st.pyplot, and releases the figure.
+	'''
+
+	options = dict(SAVEFIG_DEFAULTS, **savefig)
+	buffer = io.BytesIO()
+	with stage("rasterization"):
+		fig = fig if hasattr(fig, "savefig") else fig.get_figure()
+		fig.savefig(buffer, **options)
+	release(fig)
+	return buffer.getvalue()
+
+
+def cached_figure(builder, *args, data = None, savefig = None, **kwargs):
+	'''
+	Returns the image of a figure, drawing and rasterizing it only if it isn't in the cache yet.
+
+	Inputs
+	--------
+	builder: the function that draws the figure
+	args, kwargs: its arguments
+	data: something that identifies the content of the figure (anything content_hash takes, e.g. a digest of the data it plots)
+	savefig: the options the figure is saved with, on top of SAVEFIG_DEFAULTS (e.g. bbox_inches and pad_inches)
+
+	Outputs:
+	-------
+	image: the RenderedImage of the figure
+	'''
+
+	savefig = dict(SAVEFIG_DEFAULTS, **(savefig or {}))
+	key = image_key(builder, data, savefig)
+
+	# an image that isn't in memory is read from disk, or else drawn — once, however many sessions ask for it at the same time
+	def load_or_render():
+		image = _read_disk(key, savefig["format"])
+		if image is None:
+			image = _write_disk(RenderedImage(key, rasterize(builder(*args, **kwargs), **savefig), savefig["format"]))
+		return image
+
+	return _images.get_or_compute(key, load_or_render)
+
+
+def trace_image(plot_fxn, trace, savefig = ORBIT_SAVEFIG):
+	'''
+	Returns the image of a plot of an orbit, which is identified by the digest of the orbit's trace (see cached_figure).
+	'''
+
+	return cached_figure(plot_fxn, trace, data = trace.digest(), savefig = savefig)
+
+
+def show_image(image, **kwargs):
+	'''
+	Displays a rendered image with streamlit, at the full width of the page as st.pyplot does.
+	'''
+
+	import streamlit as st
+
+	st.image(image.data.decode() if image.format == "svg" else image.data, width = "stretch", **kwargs)
+
+
+def cache_info():
+	'''
+	Reports the state of the image cache.
+
+	Outputs:
+	-------
+	info: a dictionary with the number of hits (and how many of those were read from disk), misses and evictions, the number
+	of images in memory and their total size in bytes, the total size of the images on disk, and the limits of the cache
+	'''
+
+	info = _images.info()
+	# the images read from disk weren't rendered again, so they count as hits
+	info["disk"] = info.get("disk", 0)
+	info["hits"] += info["disk"]
+	info["misses"] -= info["disk"]
+	with _lock:
+		info["disk_bytes"] = _disk["bytes"]
+	info["max_disk_bytes"] = MAX_DISK_BYTES
+	return info
+
+
+def clear_cache(disk = False):
+	'''
+	Empties the images kept in memory, and also those on disk if asked to.
+	'''
+
+	_images.clear()
+	if disk:
+		with _lock:
+			shutil.rmtree(IMAGE_DIR, ignore_errors = True)
+			_disk["bytes"] = 0
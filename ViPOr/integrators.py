@@ -0,0 +1,359 @@
+# This file chooses the method that galpy integrates our orbits with. galpy's compiled integrators are several times faster than its pure
+# Python ones, but they are only used if galpy's C extension was built and every piece of the potential is implemented in C — otherwise
+# galpy quietly falls back to Python. So the first time an orbit is integrated in a family of potentials (the same classes of potential,
+# whatever their parameters), each integrator that can be used is timed on a short stretch of that orbit, and the fastest one that
+# conserves energy to within a tolerance is chosen for every later orbit of the family. Each orbit's energy drift is still checked after
+# it's integrated, and an orbit that drifts too far is integrated again with the family's most accurate integrator, which the family then
+# keeps.
+
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
+import os
+import threading
+import time
+
+import numpy
+
+import natural_units
+from profiler import timed
+import result_store
+
+# the largest relative change in energy, between the start and the end of an orbit, that an integrator may make
+DRIFT_TOLERANCE = 1e-4
+
+# the number of output steps of the stretch of orbit that the integrators are timed on
+BENCHMARK_STEPS = 100
+
+# the compiled integrators, and the pure Python ones used if the compiled ones can't be — these all pick their step size once, before
+# they start, so their cost is bounded even for an orbit that plunges through a cusp, where an adaptive integrator can grind to a halt
+C_METHODS = ("symplec4_c", "symplec6_c", "rk4_c", "rk6_c")
+PYTHON_METHODS = ("leapfrog", "odeint")
+
+# the adaptive integrators, which are only tried for orbits that never come near the center (e.g. those of a surface of section)
+ADAPTIVE_C_METHODS = ("dop853_c", "dopr54_c")
+ADAPTIVE_PYTHON_METHODS = ("dop853",)
+
+# the number of worker processes that batches of orbits (tracer clouds and surfaces of section) are integrated in, unless the VIPOR_CORES
+# environment variable sets it — the pool is shared by every session, so the server never integrates more than this many chunks at once,
+# and the batches of two sessions take turns chunk by chunk instead of one waiting for the other to finish
+MAX_CORES = int(os.environ.get("VIPOR_CORES", min(os.cpu_count() or 1, 4)))
+
+# the number of orbits in each chunk of a batch
+CHUNK_SIZE = 500
+
+_choices = result_store.region("integrators")
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def compiled_available(pot_fxn):
+	'''
+	Tells whether galpy's compiled integrators can be used for a potential: galpy's C extension must be loaded, and every piece of the
+	potential must be implemented in C.
+	'''
+
+	from galpy.orbit.Orbits import ext_loaded
+	from galpy.potential.Potential import _check_c
+
+	return bool(ext_loaded) and _check_c(pot_fxn)
+
+
+def potential_family(pot_fxn):
+	'''
+	Returns the family of a potential: the names of the classes of its pieces, which don't depend on their parameters.
+	'''
+
+	from galpy.potential import flatten
+
+	pieces = flatten(pot_fxn) if isinstance(pot_fxn, (list, tuple)) else [pot_fxn]
+	return tuple(type(piece).__name__ for piece in pieces)
+
+
+def candidate_methods(pot_fxn, adaptive = False):
+	'''
+	Returns the integrators that can be used for a potential — the compiled ones if they're available, and the pure Python ones if not —
+	including the adaptive ones if asked for.
+	'''
+
+	if compiled_available(pot_fxn):
+		return C_METHODS + (ADAPTIVE_C_METHODS if adaptive else ())
+	return PYTHON_METHODS + (ADAPTIVE_PYTHON_METHODS if adaptive else ())
+
+
+def _drifts(orbit, times, pot_fxn):
+	'''
+	Measures the relative change in energy of every orbit of an integrated batch between the first and the last time, and returns it
+	with the energies (in natural units) at both times, with one row per orbit.
+	'''
+
+	energies = numpy.asarray(orbit.E(numpy.asarray(times)[[0, -1]], pot = pot_fxn, use_physical = False), dtype = float).reshape(-1, 2)
+	return numpy.abs(energies[:, 1] - energies[:, 0])/numpy.maximum(numpy.abs(energies[:, 0]), 1e-12), energies
+
+
+def energy_drift(orbit, times, pot_fxn):
+	'''
+	Measures how well an integrated orbit (or batch of orbits) conserves its energy.
+
+	Inputs
+	--------
+	orbit: the integrated galpy Orbit
+	times: the times it was integrated at, in natural units
+	pot_fxn: the potential function it was integrated in
+
+	Outputs:
+	-------
+	drift: the relative change in energy between the first and the last time, the largest of the batch for a batch of orbits
+	E0, E1: the energy at the first and the last time (of the orbit with the largest drift), in natural units
+	'''
+
+	drifts, energies = _drifts(orbit, times, pot_fxn)
+	worst = int(numpy.argmax(drifts))
+	return float(drifts[worst]), float(energies[worst, 0]), float(energies[worst, 1])
+
+
+@timed("integrator benchmark")
+def _benchmark(pot_fxn, vxvv, dt, methods, ro, vo):
+	'''
+	Times each integrator on the same stretch of orbit, and chooses the fastest one that keeps the drift in energy under the tolerance.
+	If none of them does (e.g. for an orbit that plunges through a cusp), the one with the smallest drift is chosen instead.
+	'''
+
+	from galpy.orbit import Orbit
+
+	times = dt*numpy.arange(BENCHMARK_STEPS)
+	results = {}
+	for method in methods:
+		orbit = Orbit(list(vxvv), ro = ro, vo = vo)
+		started = time.perf_counter()
+		try:
+			orbit.integrate(times, pot_fxn, method = method, progressbar = False)
+		except Exception:
+			continue
+		seconds = time.perf_counter() - started
+		drift = energy_drift(orbit, times, pot_fxn)[0]
+		if numpy.isfinite(drift):
+			results[method] = {"seconds": seconds, "drift": drift}
+
+	if not results:
+		results[methods[0]] = {"seconds": None, "drift": None}
+		return {"method": methods[0], "reference": methods[0], "benchmark": results}
+
+	reference = min(results, key = lambda method: results[method]["drift"])
+	conserving = [method for method in results if results[method]["drift"] <= DRIFT_TOLERANCE]
+	method = min(conserving, key = lambda method: results[method]["seconds"]) if conserving else reference
+	return {"method": method, "reference": reference, "benchmark": results}
+
+
+def choose_method(pot_fxn, vxvv, dt, ro, vo, adaptive = False):
+	'''
+	Returns the integrator chosen for a family of potentials, benchmarking the integrators on the given orbit the first time the family
+	is asked for.
+
+	Inputs
+	--------
+	pot_fxn: the potential function
+	vxvv: the initial phase-space coordinates of the orbit the integrators are timed on, in natural units
+	dt: the time between its output steps, in natural units
+	ro, vo: the distance and velocity scales of the orbit
+	adaptive: whether the adaptive integrators may be chosen too
+
+	Outputs:
+	-------
+	choice: a dictionary with the chosen "method", the most accurate integrator as the "reference", and the time and energy drift of
+	every integrator in the "benchmark"
+	'''
+
+	methods = candidate_methods(pot_fxn, adaptive)
+	return _choices.get_or_compute((potential_family(pot_fxn), methods), _benchmark, pot_fxn, vxvv, dt, methods, ro, vo)
+
+
+def _fall_back(pot_fxn, adaptive):
+	'''
+	Switches a family of potentials over to its most accurate integrator, once one of its orbits has drifted too far with the fastest.
+	'''
+
+	key = (potential_family(pot_fxn), candidate_methods(pot_fxn, adaptive))
+	choice = _choices.get(key)
+	if choice is not None and choice["method"] != choice["reference"]:
+		_choices.put(key, dict(choice, method = choice["reference"]))
+
+
+def integrate(orbit, times, pot_fxn, adaptive = False, **kwargs):
+	'''
+	Integrates an orbit (or a batch of orbits) with the integrator chosen for its family of potentials, and checks how well it
+	conserves energy. If it drifts further than the tolerance, it is integrated again with the family's most accurate integrator,
+	which is then used for every later orbit of the family. The report is also kept with the orbit, as orbit.integration_report.
+
+	Inputs
+	--------
+	orbit: the galpy Orbit to integrate
+	times: the times to integrate it at, in natural units
+	pot_fxn: the potential function
+	adaptive: whether the adaptive integrators may be used, which is only safe for orbits that never come near the center
+	kwargs: anything else to pass on to orbit.integrate (e.g. dt)
+
+	Outputs:
+	-------
+	report: a dictionary with the "method" the orbit was integrated with, its relative energy "drift", its energies "E0" and "E1" at
+	the first and last time (in natural units), and whether it "fell back" to the most accurate integrator
+	'''
+
+	ro, vo = natural_units.scales(orbit)
+	vxvv = numpy.asarray(orbit.vxvv).reshape(-1, numpy.shape(orbit.vxvv)[-1])[0]
+	choice = choose_method(pot_fxn, vxvv, times[1] - times[0], ro, vo, adaptive)
+
+	method = choice["method"]
+	orbit.integrate(times, pot_fxn, method = method, progressbar = False, **kwargs)
+	drift, E0, E1 = energy_drift(orbit, times, pot_fxn)
+
+	fell_back = False
+	if not drift <= DRIFT_TOLERANCE and choice["reference"] != method:
+		method, fell_back = choice["reference"], True
+		orbit.integrate(times, pot_fxn, method = method, progressbar = False, **kwargs)
+		drift, E0, E1 = energy_drift(orbit, times, pot_fxn)
+		_choices.count("fallbacks")
+		_fall_back(pot_fxn, adaptive)
+
+	orbit.integration_report = {"method": method, "drift": drift, "E0": E0, "E1": E1, "fell back": fell_back}
+	return orbit.integration_report
+
+
+def process_pool():
+	'''
+	Returns the pool of worker processes that batches of orbits are integrated in, creating it the first time it is needed. The workers
+	are started afresh rather than forked from the server, whose threads (and galpy's OpenMP threads) a forked worker could deadlock on.
+	'''
+
+	global _pool
+
+	with _pool_lock:
+		if _pool is None:
+			_pool = ProcessPoolExecutor(max_workers = MAX_CORES, mp_context = multiprocessing.get_context("spawn"))
+		return _pool
+
+
+def _integrate_chunk(vxvv, times, pot_fxn, ro, vo, method, reference, kwargs):
+	'''
+	Integrates a chunk of a batch of orbits (this runs in a worker process), and integrates the orbits that drift further than the
+	tolerance in energy again with the most accurate integrator — only those, so that one orbit plunging through a cusp doesn't send the
+	whole batch back.
+
+	Outputs:
+	-------
+	phase_space: an array with one row of natural-unit [R, vR, vT, z, vz, phi] per orbit and time
+	drifts: the relative energy drift of each orbit
+	fell_back: the number of orbits that were integrated again
+	'''
+
+	from galpy.orbit import Orbit
+
+	orbits = Orbit(vxvv, ro = ro, vo = vo)
+	orbits.integrate(times, pot_fxn, method = method, progressbar = False, **kwargs)
+	phase_space = numpy.asarray(orbits.getOrbit()).reshape(len(vxvv), len(times), -1)
+	drifts = _drifts(orbits, times, pot_fxn)[0]
+
+	failed = ~(drifts <= DRIFT_TOLERANCE)
+	if not failed.any() or reference == method:
+		return phase_space, drifts, 0
+
+	again = Orbit(vxvv[failed], ro = ro, vo = vo)
+	again.integrate(times, pot_fxn, method = reference, progressbar = False, **kwargs)
+	phase_space[failed] = numpy.asarray(again.getOrbit()).reshape(int(failed.sum()), len(times), -1)
+	drifts[failed] = _drifts(again, times, pot_fxn)[0]
+	return phase_space, drifts, int(failed.sum())
+
+
+def integrate_batch(vxvv, times, pot_fxn, ro, vo, adaptive = False, **kwargs):
+	'''
+	Integrates a batch of orbits (e.g. a tracer cloud) with the integrator chosen for its family of potentials. The batch is split into
+	chunks of CHUNK_SIZE orbits, which are integrated in the pool of worker processes (or one after the other in this process, if
+	MAX_CORES is 1). Each orbit's energy drift is checked, and the orbits that drift further than the tolerance are integrated again with
+	the family's most accurate integrator. Unlike for a single orbit, the family keeps its integrator: a few orbits of a batch that
+	plunge through a cusp say little about the orbits that will be asked for next.
+
+	Inputs
+	--------
+	vxvv: the initial conditions of the orbits, with one row of natural-unit [R, vR, vT, z, vz, phi] per orbit
+	times: the times to integrate them at, in natural units
+	pot_fxn: the potential function
+	ro, vo: the distance and velocity scales of the orbits
+	adaptive: whether the adaptive integrators may be used, which is only safe for orbits that never come near the center
+	kwargs: anything else to pass on to orbit.integrate (e.g. dt)
+
+	Outputs:
+	-------
+	phase_space: an array with one row of natural-unit [R, vR, vT, z, vz, phi] per orbit and time
+	report: a dictionary with the "method" the batch was integrated with, the largest relative energy "drift" of its orbits, and the
+	number of orbits that "fell back" to the most accurate integrator
+	'''
+
+	global _pool
+
+	vxvv = numpy.asarray(vxvv, dtype = float)
+	choice = choose_method(pot_fxn, vxvv[0], times[1] - times[0], ro, vo, adaptive)
+	chunks = numpy.array_split(vxvv, max(1, -(-len(vxvv)//CHUNK_SIZE)))
+	args = (times, pot_fxn, ro, vo, choice["method"], choice["reference"], kwargs)
+
+	results = None
+	if MAX_CORES > 1:
+		try:
+			results = list(process_pool().map(_integrate_chunk, chunks, *[[arg]*len(chunks) for arg in args]))
+		except BrokenProcessPool:
+			# a worker died (e.g. it was killed for running out of memory): the pool is made again next time, and this batch is
+			# integrated here instead
+			with _pool_lock:
+				_pool = None
+	if results is None:
+		results = [_integrate_chunk(chunk, *args) for chunk in chunks]
+
+	fell_back = sum(result[2] for result in results)
+	if fell_back:
+		_choices.count("fallbacks", fell_back)
+	phase_space = numpy.concatenate([result[0] for result in results])
+	drift = float(max(numpy.max(result[1]) for result in results))
+	return phase_space, {"method": choice["method"], "drift": drift, "fell back": fell_back}
+
+
+def choices():
+	'''
+	Returns the integrator chosen for each family of potentials benchmarked so far, as a dictionary of the choices (see choose_method)
+	by family.
+	'''
+
+	return {key[0]: choice for key, choice in _choices.items()}
+
+
+def integrator_panel(container):
+	'''
+	Shows the integrator chosen for each family of potentials in a Streamlit container (e.g. the sidebar), with its time and energy
+	drift in the benchmark.
+	'''
+
+	rows = []
+	for family, choice in choices().items():
+		result = choice["benchmark"][choice["method"]]
+		rows.append({"potential": " + ".join(family), "integrator": choice["method"],
+			"time (ms)": None if result["seconds"] is None else round(1000.*result["seconds"], 1),
+			"energy drift": None if result["drift"] is None else "%.1e" % result["drift"]})
+	if rows:
+		container.markdown("The integrators chosen for each kind of potential:")
+		container.table(rows)
+		container.caption("Orbits that drift in energy by more than %.0e are integrated again with the most accurate integrator."
+			% DRIFT_TOLERANCE)
+
+
+def cache_info():
+	'''
+	Reports the state of the integrator choices.
+
+	Outputs:
+	-------
+	info: a dictionary with the number of hits, misses and evictions, the number of families benchmarked, and the number of orbits that
+	fell back to the most accurate integrator
+	'''
+
+	info = _choices.info()
+	info.setdefault("fallbacks", 0)
+	return info
@@ -0,0 +1,264 @@
+# This file is ViPOr's interactive plotting backend. Instead of drawing and rasterizing the orbit and rotation-curve plots with matplotlib on
+# the server, the server only prepares the data — each series downsampled to what the plot can show, as float32 — and the browser draws it:
+# the two-dimensional plots as vega-lite charts, which can be panned and zoomed, and the three-dimensional plots with WebGL, which can be
+# rotated and zoomed. Which backend the pages use is picked by the visitor in the sidebar.
+
+import base64
+import json
+from string import Template
+
+import numpy
+
+from orbit_animation import LABELS
+from profiler import timed
+from sampling import triangle_downsample
+
+# the backends the visitor can pick from, by the label they're shown with
+BACKENDS = {"Images": "matplotlib", "Interactive": "interactive"}
+
+_TEMPLATE_3D = Template('''<div style="font-family:sans-serif">
+<div style="text-align:center;font-size:15px;margin-bottom:4px">${title}</div>
+<div style="position:relative;width:100%;height:${canvas_height}px">
+<canvas id="vipor-gl" style="position:absolute;width:100%;height:100%;background:#ffffff"></canvas>
+<canvas id="vipor-labels" style="position:absolute;width:100%;height:100%;pointer-events:none"></canvas>
+</div>
+<div style="font-size:12px;color:#777777;margin-top:4px">Drag to rotate, scroll to zoom, double-click to reset the view.</div>
+</div>
+<script>
+(function() {
+	var raw = atob("${payload}");
+	var bytes = new Uint8Array(raw.length);
+	for (var i = 0; i < raw.length; i++) bytes[i] = raw.charCodeAt(i);
+	var data = new Float32Array(bytes.buffer);
+	var n = ${points}, labels = ${labels}, limits = ${limits};
+
+	// each coordinate is scaled to [-1, 1] on the GPU's side, so the orbit fills the box whatever its units
+	var scales = [0, 1, 2].map(function(d) {
+		var a = data.subarray(d*n, (d + 1)*n), lo = Infinity, hi = -Infinity;
+		for (var i = 0; i < n; i++) { if (a[i] < lo) lo = a[i]; if (a[i] > hi) hi = a[i]; }
+		if (limits[d]) { lo = limits[d][0]; hi = limits[d][1]; }
+		if (!(hi > lo)) { lo -= 1; hi += 1; }
+		return [lo, hi];
+	});
+	var vertices = new Float32Array(3*n);
+	for (var i = 0; i < n; i++) {
+		for (var d = 0; d < 3; d++) vertices[3*i + d] = 2*(data[d*n + i] - scales[d][0])/(scales[d][1] - scales[d][0]) - 1;
+	}
+	var box = new Float32Array([-1, -1, -1, 1, -1, -1, -1, -1, -1, -1, 1, -1, -1, -1, -1, -1, -1, 1]);
+
+	var canvas = document.getElementById("vipor-gl"), overlay = document.getElementById("vipor-labels");
+	var ctx = overlay.getContext("2d"), gl = canvas.getContext("webgl", {antialias: true});
+	if (!gl) { ctx.font = "14px sans-serif"; ctx.fillText("This browser can't show WebGL plots — switch the plots back to images in the sidebar.", 10, 30); return; }
+
+	function compile(type, source) { var shader = gl.createShader(type); gl.shaderSource(shader, source); gl.compileShader(shader); return shader; }
+	var program = gl.createProgram();
+	gl.attachShader(program, compile(gl.VERTEX_SHADER, "attribute vec3 position; uniform mat4 view; void main() { gl_Position = view*vec4(position, 1.0); }"));
+	gl.attachShader(program, compile(gl.FRAGMENT_SHADER, "precision mediump float; uniform vec4 color; void main() { gl_FragColor = color; }"));
+	gl.linkProgram(program); gl.useProgram(program);
+	var position = gl.getAttribLocation(program, "position"), view = gl.getUniformLocation(program, "view");
+	var color = gl.getUniformLocation(program, "color");
+	function buffer(array) { var b = gl.createBuffer(); gl.bindBuffer(gl.ARRAY_BUFFER, b); gl.bufferData(gl.ARRAY_BUFFER, array, gl.STATIC_DRAW); return b; }
+	var orbit = buffer(vertices), axes = buffer(box);
+
+	var yaw = -0.6, pitch = 0.45, zoom = 1, drag = null, width, height;
+	function matrix() {
+		var cy = Math.cos(yaw), sy = Math.sin(yaw), cp = Math.cos(pitch), sp = Math.sin(pitch);
+		var s = 0.55*zoom*Math.min(width, height), a = s/width, b = s/height;
+		return new Float32Array([a*cy, -b*sp*sy, 0, 0, -a*sy, -b*sp*cy, 0, 0, 0, b*cp, 0, 0, 0, 0, 0, 1]);
+	}
+	function pixel(p) {
+		var m = matrix(), x = m[0]*p[0] + m[4]*p[1] + m[8]*p[2], y = m[1]*p[0] + m[5]*p[1] + m[9]*p[2];
+		return [0.5*(x + 1)*width, 0.5*(1 - y)*height];
+	}
+	function fmt(v) { return Math.abs(v) >= 1000 || (Math.abs(v) < 0.01 && v != 0) ? v.toExponential(1) : v.toFixed(1); }
+	function lines(b, mode, count, rgba) {
+		gl.bindBuffer(gl.ARRAY_BUFFER, b); gl.vertexAttribPointer(position, 3, gl.FLOAT, false, 0, 0); gl.enableVertexAttribArray(position);
+		gl.uniform4fv(color, rgba); gl.drawArrays(mode, 0, count);
+	}
+
+	function draw() {
+		var dpr = window.devicePixelRatio || 1;
+		width = canvas.clientWidth; height = canvas.clientHeight;
+		[canvas, overlay].forEach(function(c) { if (c.width != width*dpr) { c.width = width*dpr; c.height = height*dpr; } });
+		gl.viewport(0, 0, canvas.width, canvas.height);
+		gl.clearColor(1, 1, 1, 1); gl.clear(gl.COLOR_BUFFER_BIT);
+		gl.uniformMatrix4fv(view, false, matrix());
+		lines(axes, gl.LINES, 6, [0.7, 0.7, 0.7, 1]);
+		lines(orbit, gl.LINE_STRIP, n, [0.12, 0.47, 0.71, 1]);
+
+		ctx.setTransform(dpr, 0, 0, dpr, 0, 0); ctx.clearRect(0, 0, width, height);
+		ctx.font = "12px sans-serif"; ctx.fillStyle = "#333333"; ctx.textAlign = "center";
+		var ends = [[1, -1, -1], [-1, 1, -1], [-1, -1, 1]];
+		for (var k = 0; k < 3; k++) {
+			var p = pixel(ends[k]);
+			ctx.fillText(labels[k] + " [" + fmt(scales[k][0]) + ", " + fmt(scales[k][1]) + "]", p[0], p[1] - 6);
+		}
+	}
+
+	canvas.onmousedown = function(e) { drag = [e.clientX, e.clientY]; };
+	window.onmouseup = function() { drag = null; };
+	canvas.onmousemove = function(e) {
+		if (!drag) return;
+		yaw += 0.01*(e.clientX - drag[0]); pitch = Math.max(-1.5, Math.min(1.5, pitch + 0.01*(e.clientY - drag[1])));
+		drag = [e.clientX, e.clientY]; draw();
+	};
+	canvas.onwheel = function(e) { e.preventDefault(); zoom = Math.max(0.2, Math.min(10, zoom*Math.exp(-0.001*e.deltaY))); draw(); };
+	canvas.ondblclick = function() { yaw = -0.6; pitch = 0.45; zoom = 1; draw(); };
+	window.onresize = draw;
+	draw();
+})();
+</script>''')
+
+
+class InteractiveChart:
+	'''
+	A plot that is drawn in the browser: either a vega-lite chart, with its data and its spec, or the html of a WebGL plot.
+
+	Attributes
+	--------
+	data: a dictionary of float32 columns, for vega-lite charts
+	spec: the vega-lite spec, for vega-lite charts
+	html: the html, for WebGL plots
+	height: the height of the plot, in pixels
+	'''
+
+	__slots__ = ("data", "spec", "html", "height")
+
+	def __init__(self, data = None, spec = None, html = None, height = None):
+		self.data = data
+		self.spec = spec
+		self.html = html
+		self.height = height
+
+
+def plot_backend():
+	'''
+	Shows the choice of plotting backend in the sidebar, and returns the one picked: "matplotlib" for images drawn on the server, or
+	"interactive" for plots drawn in the browser.
+	'''
+
+	import streamlit as st
+
+	label = st.sidebar.radio("Plots:", list(BACKENDS), key = "vipor_backend", horizontal = True,
+		help = "Images are drawn on the server. Interactive plots are drawn by your browser, and can be zoomed, panned and rotated.")
+	return BACKENDS[label]
+
+
+def _float32(values):
+	'''
+	Returns a series as a float32 array, stripping its units if it has any.
+	'''
+
+	return numpy.ascontiguousarray(getattr(values, "value", values), dtype = numpy.float32)
+
+
+def _axis(field, title, **options):
+	return dict({"field": field, "type": "quantitative", "title": title, "scale": {"zero": False}}, **options)
+
+
+@timed("chart data")
+def orbit_chart(trace, d1, d2, title, mark = "line"):
+	'''
+	Prepares a two-dimensional plot of an orbit as a vega-lite chart.
+
+	Inputs
+	--------
+	trace: the OrbitTrace of the orbit
+	d1, d2: the names of the coordinate series on the x and y axes
+	title: the title of the chart
+	mark: "line" to join the points in time order, or "point" to scatter them
+
+	Outputs:
+	-------
+	chart: the InteractiveChart
+	'''
+
+	keep = triangle_downsample(trace[d1], trace[d2])
+	data = {"t": _float32(trace.t[keep]), d1: _float32(trace[d1][keep]), d2: _float32(trace[d2][keep])}
+
+	spec = {"title": title,
+		"mark": {"type": "line", "strokeWidth": 1.5} if mark == "line" else {"type": "circle", "size": 12, "opacity": 0.7},
+		"encoding": {"x": _axis(d1, LABELS[d1]), "y": _axis(d2, LABELS[d2]),
+			# vega-lite joins a line's points in order of x unless it's told otherwise, which would scramble an orbit
+			"order": {"field": "t", "type": "quantitative"},
+			"tooltip": [{"field": name, "type": "quantitative", "title": LABELS[name], "format": ".3g"} for name in ("t", d1, d2)]},
+		"params": [{"name": "zoom", "select": "interval", "bind": "scales"}]}
+	return InteractiveChart(data = data, spec = spec)
+
+
+@timed("chart data")
+def orbit_chart_3d(trace, d1, d2, d3, title, limits = None, height = 600):
+	'''
+	Prepares a three-dimensional plot of an orbit, drawn by the browser with WebGL.
+
+	Inputs
+	--------
+	trace: the OrbitTrace of the orbit
+	d1, d2, d3: the names of the coordinate series on each axis
+	title: the title of the plot
+	limits: a dictionary with fixed (min, max) limits for any of the axes, by the name of their series (the other axes fit the orbit)
+	height: the height of the plot, in pixels
+
+	Outputs:
+	-------
+	chart: the InteractiveChart
+	'''
+
+	names = (d1, d2, d3)
+	keep = triangle_downsample(*[trace[name] for name in names])
+
+	# the three series go into a single float32 array, which is sent as one payload, as for the animations
+	data = numpy.concatenate([_float32(trace[name][keep]) for name in names])
+	payload = base64.b64encode(data.tobytes()).decode("ascii")
+
+	limits = limits or {}
+	html = _TEMPLATE_3D.substitute(payload = payload, points = len(keep), title = title, canvas_height = height - 60,
+		labels = json.dumps([LABELS[name] for name in names]), limits = json.dumps([limits.get(name) for name in names]))
+	return InteractiveChart(html = html, height = height)
+
+
+def curves_chart(radii, curves, title, xlabel, ylabel):
+	'''
+	Prepares a plot of one or more curves against the same radii (e.g. rotation curves) as a vega-lite chart, with a legend.
+
+	Inputs
+	--------
+	radii: the radii, as an array (or a Quantity)
+	curves: a dictionary with the values of each curve at the radii, by the label of the curve
+	title, xlabel, ylabel: the title of the chart and the titles of its axes
+
+	Outputs:
+	-------
+	chart: the InteractiveChart
+	'''
+
+	radii = _float32(radii)
+	columns = {"R": [], "curve": [], "label": []}
+	for label, values in curves.items():
+		values = _float32(values)
+		keep = triangle_downsample(radii, values)
+		columns["R"].append(radii[keep])
+		columns["curve"].append(values[keep])
+		columns["label"].append(numpy.full(len(keep), label, dtype = object))
+
+	data = {name: numpy.concatenate(parts) if parts else numpy.zeros(0, dtype = numpy.float32 if name != "label" else object)
+		for name, parts in columns.items()}
+	spec = {"title": title, "mark": {"type": "line", "strokeWidth": 1.5},
+		"encoding": {"x": _axis("R", xlabel), "y": _axis("curve", ylabel),
+			"color": {"field": "label", "type": "nominal", "title": None, "legend": {"orient": "top-right"}}},
+		"params": [{"name": "zoom", "select": "interval", "bind": "scales"}]}
+	return InteractiveChart(data = data, spec = spec)
+
+
+def show_chart(chart):
+	'''
+	Displays an interactive plot with streamlit.
+	'''
+
+	import pandas
+	import streamlit as st
+
+	if chart.html is not None:
+		st.components.v1.html(chart.html, height = chart.height)
+	else:
+		st.vega_lite_chart(pandas.DataFrame(chart.data), chart.spec, width = "stretch")
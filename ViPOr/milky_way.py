@@ -0,0 +1,203 @@
+# This file holds the four components of the Milky Way page — the bulge, the disk, the dark matter halo and the black hole — and their
+# precomputed tables. The components never change, so the potential of each one on the contour grid and its rotation curve are computed
+# once, written to disk, and read back by every later server instead of being evaluated with galpy again. Potentials add, and so do the
+# squares of circular velocities, so the page's contour map and rotation curve for any combination of ticked components are put
+# together from the tables of the components by adding arrays, rather than evaluating the combination itself.
+
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+import numpy
+
+from image_cache import cached_figure
+from orbit_cache import potential_fingerprint, remember_fingerprint
+from potential_grid import GRID, draw_contours, evaluate_grid
+from profiler import stage
+import result_store
+
+# the directory the tables are kept in, unless the VIPOR_MILKY_WAY environment variable sets it
+TABLE_DIR = os.environ.get("VIPOR_MILKY_WAY", os.path.join(os.path.dirname(os.path.abspath(__file__)), "milky_way_tables"))
+
+# the radii of the rotation curves, in natural units
+RADII = numpy.linspace(0.01, 10, 1000)
+
+# the label of each component, as it is shown on the page, in the order the components are added up
+LABELS = OrderedDict((("bulge", "Bulge Potential"), ("disk", "Disk Potential"), ("halo", "Dark Matter, NFW Potential"),
+	("black hole", "Black Hole Potential")))
+
+_tables = result_store.region("milky way tables", max_entries = len(LABELS))
+
+_lock = threading.Lock()
+_components = OrderedDict()
+
+
+def components():
+	'''
+	Returns the components of the Milky Way, as a dictionary of galpy potentials by name, creating them the first time they are needed.
+	The components are shared, so they must never be modified.
+	'''
+
+	with _lock:
+		if not _components:
+			from galpy.potential import KeplerPotential, MiyamotoNagaiPotential, NFWPotential, PowerSphericalPotentialwCutoff
+			from galpy.util import conversion
+
+			_components["bulge"] = PowerSphericalPotentialwCutoff(alpha = 1.8, rc = 1.9/8., normalize = 0.05)
+			_components["disk"] = MiyamotoNagaiPotential(a = 3./8., b = 0.28/8., normalize = .6)
+			_components["halo"] = NFWPotential(a = 16/8., normalize = .35)
+			_components["black hole"] = KeplerPotential(amp = 4*10**6./conversion.mass_in_msol(220., 8.))
+			for pot_fxn in _components.values():
+				remember_fingerprint(pot_fxn)
+		return _components
+
+
+def _table_path(name):
+	'''
+	Returns the path of a component's table, which is named after everything it depends on — the component, the grid and the radii —
+	so a table is never read back for a component or grid that has changed.
+	'''
+
+	digest = hashlib.sha1()
+	digest.update(potential_fingerprint(components()[name]).encode())
+	digest.update(repr(sorted(GRID.items())).encode())
+	digest.update(RADII.tobytes())
+	return os.path.join(TABLE_DIR, "%s-%s.npz" % (name.replace(" ", "_"), digest.hexdigest()[:16]))
+
+
+def _build_table(name):
+	'''
+	Evaluates a component on the contour grid, and computes its rotation curve.
+	'''
+
+	from galpy.potential import calcRotcurve
+
+	pot_fxn = components()[name]
+	Rs, zs, potRz = evaluate_grid(pot_fxn, GRID["rmin"], GRID["rmax"], GRID["nrs"], GRID["zmin"], GRID["zmax"], GRID["nzs"], GRID["phi"])
+	with stage("rotation curve"):
+		curve = numpy.asarray(calcRotcurve(pot_fxn, RADII), dtype = numpy.float64)
+	return {"Rs": Rs, "zs": zs, "potRz": potRz, "curve": curve}
+
+
+def _load_or_build(name):
+	'''
+	Reads a component's table from disk, or else builds it and writes it to disk for the next server.
+	'''
+
+	path = _table_path(name)
+	try:
+		with numpy.load(path) as table_file:
+			table = {field: table_file[field] for field in ("Rs", "zs", "potRz", "curve")}
+		_tables.count("disk")
+		return table
+	except (OSError, KeyError, ValueError):
+		pass
+
+	table = _build_table(name)
+	_tables.count("built")
+	try:
+		os.makedirs(TABLE_DIR, exist_ok = True)
+		# the table is written to a temporary file and then moved into place, so another process never reads half a table
+		handle, temporary = tempfile.mkstemp(dir = TABLE_DIR, suffix = ".tmp")
+		with os.fdopen(handle, "wb") as table_file:
+			numpy.savez(table_file, **table)
+		os.replace(temporary, path)
+	except OSError:
+		# a read-only or full disk only means the table is built again by the next server
+		pass
+	return table
+
+
+def component_table(name):
+	'''
+	Returns the table of a component of the Milky Way, reading or building it only the first time it is asked for.
+
+	Inputs
+	--------
+	name: the name of the component, one of LABELS
+
+	Outputs:
+	-------
+	table: a dictionary with the radii "Rs" and heights "zs" of the contour grid, the potential "potRz" on the grid (see
+	potential_grid.evaluate_grid) and the rotation "curve" at RADII, all in natural units, which must not be modified by the caller
+	'''
+
+	return _tables.get_or_compute(name, _load_or_build, name)
+
+
+def superpose(names):
+	'''
+	Puts together the potential and the rotation curve of a combination of components from their tables.
+
+	Inputs
+	--------
+	names: the names of the components, as in LABELS
+
+	Outputs:
+	-------
+	potRz: the potential of the combination on the contour grid
+	curves: the rotation curve of each component, by its label
+	rot_curve: the rotation curve of the combination, whose squared circular velocity is the sum of those of the components
+	'''
+
+	tables = [component_table(name) for name in names]
+	with stage("superposition"):
+		potRz = numpy.sum([table["potRz"] for table in tables], axis = 0)
+		curves = OrderedDict((LABELS[name], table["curve"]) for name, table in zip(names, tables))
+		rot_curve = numpy.sqrt(numpy.sum([table["curve"]**2 for table in tables], axis = 0))
+	return potRz, curves, rot_curve
+
+
+def plot_superposition(names, ncontours = 21):
+	'''
+	Draws the contour map of the potential of a combination of components, in the same style as potential_grid.plot_potential.
+	'''
+
+	potRz = superpose(names)[0]
+	extent = [GRID["rmin"], GRID["rmax"], GRID["zmin"], GRID["zmax"]]
+	return draw_contours(potRz, extent, r"$R/R_0$", r"$z/R_0$", ncontours)
+
+
+def superposition_image(names, ncontours = 21):
+	'''
+	Returns the image of the contour map drawn by plot_superposition, which is only drawn if it isn't in the image cache yet. The image
+	is identified by the fingerprints of the components, the number of contours and the grid.
+	'''
+
+	data = ([potential_fingerprint(components()[name]) for name in names], ncontours, sorted(GRID.items()))
+	return cached_figure(plot_superposition, list(names), ncontours, data = data)
+
+
+def precompute():
+	'''
+	Reads or builds the table of every component, e.g. ahead of time from the command line.
+
+	Outputs:
+	-------
+	paths: the path of each component's table
+	'''
+
+	paths = []
+	for name in LABELS:
+		component_table(name)
+		paths.append(_table_path(name))
+	return paths
+
+
+def cache_info():
+	'''
+	Reports the number of hits, misses and evictions of the component tables, the number of tables held, and how many were read from
+	disk and how many were built.
+	'''
+
+	info = _tables.info()
+	info.setdefault("disk", 0)
+	info.setdefault("built", 0)
+	return info
+
+
+if __name__ == "__main__":
+	for path in precompute():
+		print(path)
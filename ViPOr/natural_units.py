@@ -0,0 +1,90 @@
+# This file is ViPOr's unit-free fast path. galpy works internally in natural units, where lengths are in units of ro (8 kpc by default)
+# and velocities in units of vo (220 km/s), and it accepts astropy Quantities only to convert them back to natural units — which costs
+# far more than the arithmetic itself on every rerun. Here the potentials, initial conditions and time grids are set up with plain floats
+# and NumPy arrays in natural units, and the integrated orbits are converted to kpc, km/s and Gyr only once, when their series are
+# extracted for display.
+
+import numpy
+
+_defaults = {}
+
+
+def default_scales():
+	'''
+	Returns galpy's default distance and velocity scales, ro (in kpc) and vo (in km/s), as set in its configuration file.
+	'''
+
+	if not _defaults:
+		from galpy.util.config import __config__
+		_defaults["ro"] = __config__.getfloat("normalization", "ro")
+		_defaults["vo"] = __config__.getfloat("normalization", "vo")
+	return _defaults["ro"], _defaults["vo"]
+
+
+def scales(pot_fxn = None):
+	'''
+	Returns the distance and velocity scales, ro (in kpc) and vo (in km/s), of a potential, or galpy's defaults if no potential is
+	given.
+	'''
+
+	if pot_fxn is None:
+		return default_scales()
+
+	from galpy.util.conversion import get_physical
+	physical = get_physical(pot_fxn)
+	return physical["ro"], physical["vo"]
+
+
+def length(kpc, ro = None):
+	'''
+	Converts a length in kpc to natural units.
+	'''
+
+	return kpc/(ro or default_scales()[0])
+
+
+def time_in_Gyr(ro, vo):
+	'''
+	Returns the natural unit of time, in Gyr, for the given distance and velocity scales.
+	'''
+
+	from galpy.util import conversion
+	return conversion.time_in_Gyr(vo, ro)
+
+
+def initial_conditions(R, z, ro):
+	'''
+	Returns the initial conditions of an orbit that starts at rest, at radius R and height z (both in kpc), as the natural-unit
+	[R, vR, vT, z, vz, phi] that galpy's Orbit takes.
+	'''
+
+	return [R/ro, 0., 0., z/ro, 0., 0.]
+
+
+def time_grid(years, n_steps, ro, vo):
+	'''
+	Returns n_steps evenly spaced times from zero to a number of Gyr, in natural units.
+	'''
+
+	return numpy.linspace(0., years/time_in_Gyr(ro, vo), n_steps)
+
+
+def physical_series(phase_space, t, ro, vo):
+	'''
+	Converts the phase-space coordinates of an orbit from natural to physical units, all at once.
+
+	Inputs
+	--------
+	phase_space: an array with one row of natural-unit [R, vR, vT, z, vz, phi] per time, as returned by galpy's Orbit.getOrbit
+	t: the times of the rows, in natural units
+	ro, vo: the distance (kpc) and velocity (km/s) scales
+
+	Outputs:
+	-------
+	series: a dictionary with the time "t" (Gyr), the positions "x", "y", "z" and "R" (kpc) and the velocities "vR", "vT" and
+	"vz" (km/s)
+	'''
+
+	R, vR, vT, z, vz, phi = numpy.asarray(phase_space, dtype = numpy.float64).T
+	return {"t": numpy.asarray(t, dtype = numpy.float64)*time_in_Gyr(ro, vo), "x": ro*R*numpy.cos(phi), "y": ro*R*numpy.sin(phi),
+		"z": ro*z, "R": ro*R, "vR": vo*vR, "vT": vo*vT, "vz": vo*vz}
@@ -0,0 +1,214 @@
+# This file contains ViPOr's own orbit animations. Instead of embedding galpy's animate()._repr_html_() output — which serializes the full
+# trajectory as text inside a large HTML/JS blob — we send a decimated float32 copy of the trajectory as a single base64 payload, and a
+# small player draws it on a canvas in the browser. Animations are kept in the shared result store by the key of their orbit, so a rerun
+# (or another session) that doesn't change the orbit doesn't build them again.
+
+import base64
+import json
+from string import Template
+
+import numpy
+
+from orbit_cache import get_trace, request_key
+from profiler import timed
+import result_store
+
+# the default number of frames that an animation is decimated to
+FRAME_BUDGET = 500
+
+# the number of animations kept in the cache
+MAX_ENTRIES = 256
+
+# axis labels for each of the coordinate series of an OrbitTrace
+LABELS = {"t": "t (Gyr)", "x": "x (kpc)", "y": "y (kpc)", "z": "z (kpc)", "R": "R (kpc)", "vR": "v_R (km/s)", "vT": "v_T (km/s)",
+	"vz": "v_z (km/s)", "ra": "RA (deg)", "dec": "Dec (deg)"}
+
+_animations = result_store.region("animations", max_entries = MAX_ENTRIES)
+
+_TEMPLATE = Template('''<div style="font-family:sans-serif">
+<canvas id="vipor-orbit" style="width:100%;height:${canvas_height}px;display:block;background:#ffffff"></canvas>
+<div style="display:flex;align-items:center;gap:8px;margin-top:6px">
+<button id="vipor-play">Pause</button>
+<input id="vipor-frame" type="range" min="0" max="${last}" value="0" style="flex:1">
+<span id="vipor-time" style="min-width:8em;font-size:13px"></span>
+</div>
+</div>
+<script>
+(function() {
+	var raw = atob("${payload}");
+	var bytes = new Uint8Array(raw.length);
+	for (var i = 0; i < raw.length; i++) bytes[i] = raw.charCodeAt(i);
+	var data = new Float32Array(bytes.buffer);
+	var n = ${frames}, dims = ${dims}, labels = ${labels}, plane = ${plane}, fps = ${fps};
+	var t = data.subarray(0, n), cols = [];
+	for (var d = 0; d < dims; d++) cols.push(data.subarray((d + 1)*n, (d + 2)*n));
+
+	var canvas = document.getElementById("vipor-orbit"), ctx = canvas.getContext("2d");
+	var slider = document.getElementById("vipor-frame"), button = document.getElementById("vipor-play");
+	var clock = document.getElementById("vipor-time");
+	var frame = 0, playing = true, last = 0, yaw = -0.6, pitch = 0.45, drag = null;
+
+	// the center and half-width of each coordinate, used to scale it onto the canvas
+	var scales = cols.map(function(a) {
+		var lo = Infinity, hi = -Infinity;
+		for (var i = 0; i < a.length; i++) { if (a[i] < lo) lo = a[i]; if (a[i] > hi) hi = a[i]; }
+		if (!(hi > lo)) { lo -= 1; hi += 1; }
+		return [0.5*(lo + hi), 0.5*(hi - lo), lo, hi];
+	});
+	function norm(d, v) { return (v - scales[d][0])/scales[d][1]; }
+	function fmt(v) { return Math.abs(v) >= 1000 || (Math.abs(v) < 0.01 && v != 0) ? v.toExponential(1) : v.toFixed(2); }
+
+	var width, height, margin = 60;
+	function point(i) {
+		if (dims == 2) {
+			return [margin + (norm(0, cols[0][i]) + 1)*0.5*(width - 1.5*margin), height - margin + -(norm(1, cols[1][i]) + 1)*0.5*(height - 1.5*margin)];
+		}
+		return project([norm(0, cols[0][i]), norm(1, cols[1][i]), norm(2, cols[2][i])]);
+	}
+	function project(p) {
+		var cy = Math.cos(yaw), sy = Math.sin(yaw), cp = Math.cos(pitch), sp = Math.sin(pitch);
+		var x1 = cy*p[0] - sy*p[1], y1 = sy*p[0] + cy*p[1];
+		var s = 0.3*Math.min(width, height);
+		return [0.5*width + s*x1, 0.5*height - s*(cp*p[2] - sp*y1)];
+	}
+	function line(a, b) { ctx.beginPath(); ctx.moveTo(a[0], a[1]); ctx.lineTo(b[0], b[1]); ctx.stroke(); }
+
+	function axes() {
+		ctx.strokeStyle = "#bbbbbb"; ctx.fillStyle = "#333333"; ctx.lineWidth = 1; ctx.font = "12px sans-serif";
+		if (dims == 2) {
+			ctx.strokeRect(margin, 0.5*margin, width - 1.5*margin, height - 1.5*margin);
+			ctx.textAlign = "center";
+			ctx.fillText(labels[0], 0.5*(width + 0.5*margin), height - 0.25*margin);
+			ctx.fillText(fmt(scales[0][2]), margin, height - 0.6*margin);
+			ctx.fillText(fmt(scales[0][3]), width - 0.5*margin, height - 0.6*margin);
+			ctx.textAlign = "right";
+			ctx.fillText(fmt(scales[1][2]), margin - 4, height - margin);
+			ctx.fillText(fmt(scales[1][3]), margin - 4, 0.5*margin + 10);
+			ctx.save(); ctx.translate(14, 0.5*height); ctx.rotate(-Math.PI/2); ctx.textAlign = "center";
+			ctx.fillText(labels[1], 0, 0); ctx.restore();
+			return;
+		}
+		if (plane) {
+			// the plane of the disk, z = 0, drawn as a shaded square
+			var zp = norm(2, 0.);
+			var corners = [[-1, -1, zp], [1, -1, zp], [1, 1, zp], [-1, 1, zp]].map(project);
+			ctx.fillStyle = "rgba(120, 120, 200, 0.15)"; ctx.beginPath(); ctx.moveTo(corners[0][0], corners[0][1]);
+			for (var c = 1; c < 4; c++) ctx.lineTo(corners[c][0], corners[c][1]);
+			ctx.closePath(); ctx.fill(); ctx.fillStyle = "#333333";
+		}
+		var o = project([-1, -1, -1]), ends = [project([1, -1, -1]), project([-1, 1, -1]), project([-1, -1, 1])];
+		ctx.textAlign = "center";
+		for (var k = 0; k < 3; k++) { line(o, ends[k]); ctx.fillText(labels[k], ends[k][0], ends[k][1] - 6); }
+	}
+
+	function draw() {
+		var dpr = window.devicePixelRatio || 1;
+		width = canvas.clientWidth; height = canvas.clientHeight;
+		if (canvas.width != width*dpr) { canvas.width = width*dpr; canvas.height = height*dpr; }
+		ctx.setTransform(dpr, 0, 0, dpr, 0, 0);
+		ctx.clearRect(0, 0, width, height);
+		axes();
+		// the full orbit, faintly, then the part of the orbit traced out so far, and the particle itself
+		ctx.lineWidth = 1; ctx.strokeStyle = "#dddddd"; ctx.beginPath();
+		var p = point(0); ctx.moveTo(p[0], p[1]);
+		for (var i = 1; i < n; i++) { p = point(i); ctx.lineTo(p[0], p[1]); }
+		ctx.stroke();
+		ctx.lineWidth = 1.5; ctx.strokeStyle = "#1f77b4"; ctx.beginPath();
+		p = point(0); ctx.moveTo(p[0], p[1]);
+		for (i = 1; i <= frame; i++) { p = point(i); ctx.lineTo(p[0], p[1]); }
+		ctx.stroke();
+		p = point(frame); ctx.fillStyle = "#d62728"; ctx.beginPath(); ctx.arc(p[0], p[1], 4, 0, 2*Math.PI); ctx.fill();
+		slider.value = frame;
+		clock.textContent = "t = " + t[frame].toFixed(2) + " Gyr";
+	}
+
+	function tick(now) {
+		if (playing && now - last > 1000/fps) { frame = (frame + 1) % n; last = now; draw(); }
+		window.requestAnimationFrame(tick);
+	}
+	button.onclick = function() { playing = !playing; button.textContent = playing ? "Pause" : "Play"; };
+	slider.oninput = function() { frame = parseInt(slider.value); draw(); };
+	if (dims == 3) {
+		canvas.onmousedown = function(e) { drag = [e.clientX, e.clientY]; };
+		window.onmouseup = function() { drag = null; };
+		canvas.onmousemove = function(e) {
+			if (!drag) return;
+			yaw += 0.01*(e.clientX - drag[0]); pitch = Math.max(-1.5, Math.min(1.5, pitch + 0.01*(e.clientY - drag[1])));
+			drag = [e.clientX, e.clientY]; draw();
+		};
+	}
+	window.onresize = draw;
+	draw();
+	window.requestAnimationFrame(tick);
+})();
+</script>''')
+
+
+def decimate(n_points, frame_budget):
+	'''
+	Picks the indices of the frames to keep, evenly spaced in time, so an orbit with n_points samples is animated with at most
+	frame_budget frames. The first and last samples are always kept.
+	'''
+
+	if n_points <= frame_budget:
+		return numpy.arange(n_points)
+	return numpy.unique(numpy.linspace(0, n_points - 1, frame_budget).round().astype(int))
+
+
+@timed("animation")
+def animation_html(trace, d1, d2, d3 = None, frame_budget = FRAME_BUDGET, height = 600, plane = False, fps = 30):
+	'''
+	Builds the html of an animation of an orbit in two or three dimensions, which can be shown with streamlit.
+
+	Inputs
+	--------
+	trace: the OrbitTrace of the orbit
+	d1, d2, d3: the names of the coordinate series on each axis (leave d3 out for a two dimensional animation)
+	frame_budget: the largest number of frames the animation may have
+	height: the height, in pixels, of the html component the animation is shown in
+	plane: whether to shade the plane of the disk (z = 0) in three dimensional animations
+	fps: the number of frames per second the animation plays at
+
+	Outputs:
+	-------
+	raw_html: the html of the animation
+	'''
+
+	names = [d for d in (d1, d2, d3) if d is not None]
+	keep = decimate(len(trace), frame_budget)
+
+	# all of the series go into a single float32 array — first the times, then each coordinate — which is sent as one payload
+	data = numpy.concatenate([trace["t"][keep]] + [trace[name][keep] for name in names]).astype(numpy.float32)
+	payload = base64.b64encode(data.tobytes()).decode("ascii")
+
+	return _TEMPLATE.substitute(payload = payload, frames = len(keep), dims = len(names), last = len(keep) - 1,
+		labels = json.dumps([LABELS[name] for name in names]), plane = "true" if plane else "false", fps = fps,
+		canvas_height = height - 60)
+
+
+def get_animation(pot_fxn, years, R = None, z = None, d1 = "R", d2 = "z", d3 = None, frame_budget = FRAME_BUDGET, height = 600, plane = False):
+	'''
+	Returns the html of an animation of an orbit, building it only if the same animation of the same orbit isn't in the cache yet.
+
+	Inputs
+	--------
+	pot_fxn, years, R, z: the potential, integration time and initial conditions of the orbit, as for orbit_cache.get_orbit
+	d1, d2, d3, frame_budget, height, plane: the options of the animation, as for animation_html
+
+	Outputs:
+	-------
+	raw_html: the html of the animation, which can be plotted by streamlit
+	'''
+
+	key = (request_key(pot_fxn, years, R, z), d1, d2, d3, frame_budget, height, plane)
+
+	return _animations.get_or_compute(key, lambda: animation_html(get_trace(pot_fxn, years, R, z), d1, d2, d3, frame_budget = frame_budget,
+		height = height, plane = plane))
+
+
+def cache_info():
+	'''
+	Reports the number of hits, misses and evictions of the animation cache, and the number of animations it holds.
+	'''
+
+	return _animations.info()
@@ -0,0 +1,460 @@
+# This file contains the cache of integrated orbits. Streamlit re-runs every page from the top whenever a widget changes, and pages 5
+# and 6 ask for the same orbit twice (once in two dimensions and once in three), so we keep the integrated orbits in the shared result
+# store (see result_store.py) and hand them back — to every session — whenever the potential, initial conditions and integration time
+# have not changed. Orbits that aren't in the cache are looked up in the precomputed orbit lattice (see orbit_lattice.py) before they
+# are integrated, and an orbit that is longer than the lattice's trajectory is integrated on from the end of it.
+#
+# By default, orbits are integrated incrementally: the trajectory of each potential and starting point is kept as far as it has been
+# integrated so far, at a fixed output rate, so when the integration time grows the orbit is only integrated over the new interval, and
+# when it shrinks the trajectory is simply cut short. Dragging the time slider then costs in proportion to how far it moved.
+
+from collections import OrderedDict
+import hashlib
+import threading
+import weakref
+
+import numpy
+
+import integrators
+import natural_units
+from orbit_lattice import lookup
+from orbit_trace import OrbitTrace
+from profiler import timed
+import result_store
+from sampling import output_rate, output_steps
+
+# the default limits of the cache — the number of orbits we keep, and the total memory (in bytes) that their arrays may take up
+MAX_ENTRIES = 128
+MAX_BYTES = 256*1024**2
+
+# the number of output steps used for every orbit, unless the caller asks for something else — "incremental" outputs the orbit at a
+# fixed rate per Gyr and integrates it incrementally (see sampling.output_rate), "adaptive" picks the number of steps from the orbit's
+# dynamical time and its duration (see sampling.output_steps), while a number fixes it
+N_STEPS = "incremental"
+
+# the number of incrementally integrated trajectories we keep, and the number of cut-short views of each of them
+MAX_RUNS = 32
+MAX_VIEWS = 32
+
+# the orbits and their OrbitTraces share one region of the store, and the incrementally integrated trajectories have one of their own
+_orbits = result_store.region("orbits", max_entries = MAX_ENTRIES, max_bytes = MAX_BYTES, sizeof = lambda value: _entry_nbytes(value))
+_runs = result_store.region("trajectories", max_entries = MAX_RUNS, max_bytes = MAX_BYTES, sizeof = lambda run: run.nbytes)
+
+# the fingerprints of the potentials interned by potential_registry, which never change — they go away with their potentials
+_fingerprints = weakref.WeakKeyDictionary()
+
+
+def _fingerprint_parts(obj, parts):
+	'''
+	Walks through a (possibly composite) potential and collects everything that defines it, in a stable order.
+	Derived look-up tables (large arrays) and internal hashes that galpy fills in lazily are skipped, so the
+	fingerprint of a potential doesn't change after it has been used.
+	'''
+
+	if isinstance(obj, (list, tuple)):
+		parts.append("[")
+		for item in obj:
+			_fingerprint_parts(item, parts)
+		parts.append("]")
+		return
+
+	parts.append(type(obj).__module__ + "." + type(obj).__name__)
+	for key in sorted(vars(obj)):
+		value = vars(obj)[key]
+		if key.endswith("_hash") or value is None:
+			continue
+		if isinstance(value, (bool, int, float, str, numpy.number, numpy.bool_)):
+			parts.append(key + "=" + repr(value.item() if isinstance(value, numpy.generic) else value))
+		elif isinstance(value, numpy.ndarray) and value.size <= 16:
+			parts.append(key + "=" + repr(value.tolist()))
+		elif isinstance(value, (list, tuple)) or type(value).__module__.startswith("galpy"):
+			parts.append(key + ":")
+			_fingerprint_parts(value, parts)
+
+
+def potential_fingerprint(pot_fxn):
+	'''
+	Computes a stable fingerprint of a galpy potential, made up of the type of the potential and all of its parameters.
+	Two potentials that were built with the same class and the same parameters have the same fingerprint, even if they
+	are different objects.
+
+	Inputs
+	--------
+	pot_fxn: a galpy potential, or a list of galpy potentials
+
+	Outputs:
+	-------
+	fingerprint: a hexadecimal string identifying the potential
+	'''
+
+	if not isinstance(pot_fxn, (list, tuple)):
+		fingerprint = _fingerprints.get(pot_fxn)
+		if fingerprint is not None:
+			return fingerprint
+
+	parts = []
+	_fingerprint_parts(pot_fxn, parts)
+	return hashlib.sha1("|".join(parts).encode()).hexdigest()
+
+
+def remember_fingerprint(pot_fxn):
+	'''
+	Computes the fingerprint of a potential that will never be modified (see potential_registry), and remembers it for as long
+	as the potential exists, so it isn't recomputed every time the potential's orbits are looked up.
+	'''
+
+	fingerprint = potential_fingerprint(pot_fxn)
+	_fingerprints[pot_fxn] = fingerprint
+	return fingerprint
+
+
+def request_key(pot_fxn, years, R = None, z = None, n_steps = N_STEPS):
+	'''
+	Builds the key of an orbit as it is asked for: the fingerprint of its potential, its initial conditions, its duration and how its
+	output steps are picked. Unlike orbit_key, this doesn't work out the number of output steps (which needs galpy), so it's cheap
+	enough to key anything that is made from the orbit (e.g. its animations) on every rerun.
+	'''
+
+	init = None if R is None else (round(float(R), 9), round(float(z), 9))
+	return (potential_fingerprint(pot_fxn), init, round(float(years), 9), n_steps)
+
+
+def orbit_key(pot_fxn, years, R = None, z = None, n_steps = N_STEPS):
+	'''
+	Builds the cache key for an orbit: the fingerprint of its potential, its initial conditions and its duration.
+	If R and z are not given, the key refers to galpy's default orbit (the Sun).
+	'''
+
+	if n_steps == "adaptive":
+		n_steps = output_steps(pot_fxn, years, R, z)
+	elif n_steps == "incremental":
+		n_steps = int(round(float(years)*output_rate(pot_fxn, R, z))) + 1
+
+	return request_key(pot_fxn, years, R, z, int(n_steps))
+
+
+def run_key(pot_fxn, R = None, z = None):
+	'''
+	Builds the key of an incrementally integrated trajectory: the fingerprint of its potential, its initial conditions and its output
+	rate (see sampling.output_rate). Every orbit with the same key is the start of the same trajectory.
+	'''
+
+	init = None if R is None else (round(float(R), 9), round(float(z), 9))
+	return (potential_fingerprint(pot_fxn), init, output_rate(pot_fxn, R, z))
+
+
+def _orbit_nbytes(orbit):
+	'''
+	Estimates the memory taken up by the arrays of an integrated orbit.
+	'''
+
+	return sum(getattr(orbit, name).nbytes for name in ("orbit", "t", "vxvv") if isinstance(getattr(orbit, name, None), numpy.ndarray))
+
+
+def _entry_nbytes(value):
+	'''
+	Estimates the memory taken up by an orbit or an OrbitTrace — the series of a trace from the lattice are memory-mapped, so they don't
+	count towards the store's memory.
+	'''
+
+	if isinstance(value, OrbitTrace):
+		return sum(result_store.estimate_size(value[name]) for name in OrbitTrace.SERIES)
+	return _orbit_nbytes(value)
+
+
+@timed("integration")
+def _integrate(pot_fxn, years, R, z, n_steps):
+	'''
+	Initializes and integrates an orbit that starts at rest, at radius R and height z (both in kpc), over a number of Gyr, with the
+	integrator chosen for its potential (see integrators.py). An orbit with a single output step (zero duration) is left at its
+	initial conditions, since galpy's integrators never return from an integration over an empty time interval.
+	'''
+
+	# galpy's orbits take a while to import, so they're only imported when the first orbit is integrated
+	from galpy.orbit import Orbit
+
+	# the initial conditions and times are given in natural units, so galpy doesn't have to convert any Quantities
+	ro, vo = natural_units.scales(pot_fxn)
+	if R is None:
+		orbit = Orbit(ro = ro, vo = vo)
+	else:
+		orbit = Orbit(natural_units.initial_conditions(R, z, ro), ro = ro, vo = vo)
+
+	if n_steps > 1 and years > 0.:
+		integrators.integrate(orbit, natural_units.time_grid(years, n_steps, ro, vo), pot_fxn)
+	return orbit
+
+
+def _build_trace(pot_fxn, years, R, z, key):
+	'''
+	Builds the OrbitTrace of an orbit, from the lattice if it's there, and otherwise from the integrated orbit. The lattice's
+	trajectories are output at the incremental rate, so they only hold the orbits whose steps are at that rate.
+	'''
+
+	rate_key = run_key(pot_fxn, R, z)
+	if key[3] == int(round(key[2]*rate_key[2])) + 1:
+		trace = lookup(rate_key, key[3])
+		if trace is not None:
+			_orbits.count("lattice")
+			return trace
+	return OrbitTrace.from_orbit(get_orbit(pot_fxn, years, R, z, key[3]))
+
+
+def get_orbit(pot_fxn, years, R = None, z = None, n_steps = N_STEPS):
+	'''
+	Returns the orbit of a particle in the given potential, integrated over a number of Gyr. The orbit is only integrated
+	the first time it is asked for; after that it is served from the cache.
+
+	Inputs
+	--------
+	pot_fxn: the potential function, either set by default or chosen by the user
+	years: integration time of the orbit, in Gyr
+	R: the initial radius from the galactic center, in kpc (if not given, galpy's default orbit is used)
+	z: the initial height from the galactic plane, in kpc
+	n_steps: the number of times at which the orbit is output, or "adaptive" to pick it from the orbit's dynamical time
+
+	Outputs:
+	-------
+	orbit: the integrated galpy Orbit, which must not be modified by the caller
+	'''
+
+	key = orbit_key(pot_fxn, years, R, z, n_steps)
+	return _orbits.get_or_compute(("orbit", key), _integrate, pot_fxn, years, R, z, key[3])
+
+
+def get_trace(pot_fxn, years, R = None, z = None, n_steps = N_STEPS):
+	'''
+	Returns the OrbitTrace of an orbit — every coordinate series of the orbit as NumPy arrays. The trace is built once per
+	integrated orbit and is kept in the cache alongside it.
+
+	Inputs
+	--------
+	the same as for get_orbit
+
+	Outputs:
+	-------
+	trace: the OrbitTrace of the integrated orbit, which must not be modified by the caller
+	'''
+
+	if n_steps == "incremental":
+		return _incremental_trace(pot_fxn, years, R, z)
+
+	key = orbit_key(pot_fxn, years, R, z, n_steps)
+	return _orbits.get_or_compute(("trace", key), _build_trace, pot_fxn, years, R, z, key)
+
+
+class _Run:
+	'''
+	The trajectory of an orbit with a given potential and starting point, as far as it has been integrated so far, output at a fixed
+	rate. The coordinate series are kept in arrays with room to grow, which are reallocated (with twice the room) when they're full, so
+	extending the trajectory costs in proportion to the extension. The energy drift is measured from the start of the trajectory to the
+	end of each segment, so the trace of any length reports the drift of the shortest stretch that covers it.
+	'''
+
+	def __init__(self, pot_fxn, rate):
+		self.ro, self.vo = natural_units.scales(pot_fxn)
+		self.rate = rate
+		self.length = 0
+		self.series = None
+		self.state = None
+		self.views = OrderedDict()
+		self.lattice = None
+		self.lock = threading.Lock()
+		self.energy = None
+		self.methods = []
+		self.drifts = []
+
+	@property
+	def nbytes(self):
+		return 0 if self.series is None else sum(values.nbytes for values in self.series.values())
+
+	def extend(self, pot_fxn, R, z, n_steps):
+		'''
+		Integrates the orbit on from its last output time, until it has n_steps output times. Must be called with the run's lock held.
+		'''
+
+		segment = _integrate_segment(pot_fxn, R, z, self.state, max(self.length - 1, 0), n_steps, self.rate, self.ro, self.vo)
+		trace = OrbitTrace.from_orbit(segment)
+
+		# after the first segment, each segment starts at the last output time of the one before, which is already in the arrays
+		first = 0 if self.length == 0 else 1
+		added = n_steps - self.length
+		if self.series is None or n_steps > len(self.series["t"]):
+			capacity = max(n_steps, 2*(0 if self.series is None else len(self.series["t"])))
+			grown = {name: numpy.empty(capacity) for name in OrbitTrace.SERIES}
+			for name, values in grown.items():
+				if self.length:
+					values[:self.length] = self.series[name][:self.length]
+			self.series = grown
+		for name in OrbitTrace.SERIES:
+			self.series[name][self.length:n_steps] = trace[name][first:first + added]
+
+		self.state = segment.getOrbit()[-1] if hasattr(segment, "t") else numpy.asarray(segment.vxvv).reshape(-1)
+		self.length = n_steps
+
+		# the drift in energy since the start of the trajectory, at the end of this segment, and the integrator of the segment
+		report = getattr(segment, "integration_report", None)
+		if report is not None:
+			if self.energy is None:
+				self.energy = report["E0"]
+			self.drifts.append((n_steps, abs(report["E1"] - self.energy)/max(abs(self.energy), 1e-12)))
+			self.methods.append((n_steps, report["method"]))
+
+	def seed(self, pot_fxn, trace):
+		'''
+		Starts the trajectory from its trace in the lattice, so that extending it only integrates the extension — from the last point of
+		the trace, which the lattice keeps in single precision. The orbits that are no longer than the lattice's trajectory are then
+		views into the lattice itself. Must be called with the run's lock held.
+		'''
+
+		from galpy.potential import evaluatePotentials
+
+		n_steps = len(trace)
+		self.series = {name: numpy.array(trace[name], dtype = numpy.float64) for name in OrbitTrace.SERIES}
+		self.length = n_steps
+		self.lattice = trace
+
+		# the phase-space state at the last output time, in natural units, and the energy at the start, for the drift of later segments
+		R, vR, vT, z, vz = (self.series[name]/scale for name, scale in (("R", self.ro), ("vR", self.vo), ("vT", self.vo), ("z", self.ro),
+			("vz", self.vo)))
+		phi = numpy.arctan2(self.series["y"], self.series["x"])
+		self.state = numpy.array([R[-1], vR[-1], vT[-1], z[-1], vz[-1], phi[-1]])
+		self.energy = (float(evaluatePotentials(pot_fxn, R[0], z[0], phi = phi[0], use_physical = False))
+			+ 0.5*(vR[0]**2 + vT[0]**2 + vz[0]**2))
+		if trace.method is not None:
+			self.methods.append((n_steps, trace.method))
+		if trace.drift is not None:
+			self.drifts.append((n_steps, trace.drift))
+
+		# the lattice's own trace is handed back for its own length
+		self.views[n_steps] = trace
+
+	def view(self, n_steps):
+		'''
+		Returns the OrbitTrace of the first n_steps output times, as views of the arrays — the views of each length are kept, so the
+		same trace (and anything cached by its digest) is handed back every time. Must be called with the run's lock held.
+		'''
+
+		trace = self.views.get(n_steps)
+		if trace is None:
+			method = next((method for length, method in self.methods if length >= n_steps), None)
+			drift = next((drift for length, drift in self.drifts if length >= n_steps), None)
+			series = self.lattice if self.lattice is not None and n_steps <= len(self.lattice) else self.series
+			trace = OrbitTrace(method = method, drift = drift, **{name: series[name][:n_steps] for name in OrbitTrace.SERIES})
+			self.views[n_steps] = trace
+			while len(self.views) > MAX_VIEWS:
+				self.views.popitem(last = False)
+		self.views.move_to_end(n_steps)
+		return trace
+
+
+@timed("integration")
+def _integrate_segment(pot_fxn, R, z, state, start, stop, rate, ro, vo):
+	'''
+	Integrates an orbit from output time number start up to (but not including) number stop, of an orbit that is output rate times
+	per Gyr, starting from the natural-unit phase-space state at the start — or from rest at radius R and height z if there is no
+	state yet, in which case start is 0. The segment is integrated with the integrator chosen for its potential (see integrators.py).
+	'''
+
+	from galpy.orbit import Orbit
+
+	if state is None:
+		orbit = Orbit(ro = ro, vo = vo) if R is None else Orbit(natural_units.initial_conditions(R, z, ro), ro = ro, vo = vo)
+	else:
+		orbit = Orbit(list(state), ro = ro, vo = vo)
+
+	# an orbit with a single output time is left at its initial conditions, since galpy's integrators never return from an
+	# integration over an empty time interval
+	if stop - start > 1:
+		times = numpy.arange(start, stop)/float(rate)
+		integrators.integrate(orbit, times/natural_units.time_in_Gyr(ro, vo), pot_fxn)
+	return orbit
+
+
+def _incremental_trace(pot_fxn, years, R, z):
+	'''
+	Returns the OrbitTrace of an orbit that is integrated incrementally: its trajectory is extended if it hasn't been integrated for
+	long enough yet, and cut short if it has been integrated for longer.
+	'''
+
+	key = run_key(pot_fxn, R, z)
+	rate = key[2]
+	n_steps = int(round(float(years)*rate)) + 1
+
+	run = _runs.setdefault(key, lambda: _Run(pot_fxn, rate))
+
+	# the run's own lock makes the sessions that ask for the same orbit at once wait for a single integration
+	if not run.lock.acquire(blocking = False):
+		_runs.count("shared")
+		run.lock.acquire()
+	try:
+		if run.length >= n_steps:
+			_runs.count("hits")
+			if run.length > n_steps:
+				_runs.count("truncations")
+			return run.view(n_steps)
+
+		# a trajectory that isn't integrated yet may be in the lattice, and then it starts from there (and is only integrated on
+		# from its end if the orbit is longer)
+		lattice = lookup(key) if run.length == 0 else None
+		if lattice is not None:
+			run.seed(pot_fxn, lattice)
+			_runs.count("lattice")
+		if run.length < n_steps:
+			run.extend(pot_fxn, R, z, n_steps)
+			_runs.count("extensions")
+		trace = run.view(n_steps)
+	finally:
+		run.lock.release()
+
+	_runs.count("misses")
+	_runs.resize(key)
+	return trace
+
+
+def cache_info():
+	'''
+	Reports the state of the orbit cache.
+
+	Outputs:
+	-------
+	info: a dictionary with the number of hits (and how many of those were cut short from a longer trajectory, or waited for another
+	session's integration), misses (and how many of those were served by the orbit lattice, or by extending a trajectory) and
+	evictions, the number of cached orbits and traces and of incrementally integrated trajectories, their total sizes in bytes, and
+	the limits of the cache
+	'''
+
+	orbits, runs = _orbits.info(), _runs.info()
+	info = {name: orbits.get(name, 0) + runs.get(name, 0)
+		for name in ("hits", "misses", "shared", "lattice", "evictions", "extensions", "truncations")}
+	info["entries"] = orbits["entries"]
+	info["runs"] = runs["entries"]
+	info["bytes"] = orbits["bytes"]
+	info["run_bytes"] = runs["bytes"]
+	info["max_entries"] = MAX_ENTRIES
+	info["max_bytes"] = MAX_BYTES
+	return info
+
+
+def configure(max_entries = None, max_bytes = None):
+	'''
+	Changes the limits of the orbit cache, evicting orbits straight away if the cache no longer fits.
+	'''
+
+	global MAX_ENTRIES, MAX_BYTES
+
+	if max_entries is not None:
+		MAX_ENTRIES = max_entries
+	if max_bytes is not None:
+		MAX_BYTES = max_bytes
+	_orbits.configure(max_entries, max_bytes)
+	_runs.configure(max_bytes = max_bytes)
+
+
+def clear_cache():
+	'''
+	Empties the orbit cache and resets its counters.
+	'''
+
+	_orbits.clear(reset = True)
+	_runs.clear(reset = True)
@@ -0,0 +1,256 @@
+# This file builds and reads the precomputed orbit lattice. Every input on the orbit pages is a slider with a fixed step, so the set of
+# orbits a visitor can ask for is finite: this file integrates a subset of that lattice ahead of time, in parallel, and writes the
+# trajectories to a columnar store — one .npy file per coordinate series, plus an index of where each trajectory starts and ends. Orbits
+# are output at a fixed rate (see sampling.output_rate), so the orbit of any integration time is the start of the longest one: only the
+# LATTICE_YEARS trajectory of each potential and starting point is stored, and the pages read the first part of it, through
+# memory-mapped, zero-copy views, and only integrate the orbits that are missing.
+#
+# The whole lattice (every combination of every slider) is far too big to build, so by default only the potentials with a single
+# parameter are built, at every value of their slider, from every fifth initial radius and height. To build it, run from the ViPOr
+# directory, for example:
+#     python orbit_lattice.py --out lattice --potentials "Plummer Potential" --radii 0:50:5 --heights 0:10:5
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import itertools
+import json
+import os
+import threading
+
+import numpy
+
+from orbit_trace import OrbitTrace
+from potential_registry import get_potential, get_spec, potential_names
+from profiler import timed
+from sampling import MAX_YEARS
+
+# where the pages look for the lattice, unless the VIPOR_LATTICE environment variable points somewhere else
+LATTICE_DIR = os.environ.get("VIPOR_LATTICE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "lattice"))
+
+# the slider values of the parameters of each potential on the orbit pages, as (start, stop, step) — for the potentials with more
+# than one parameter, every combination of the values is part of the lattice
+LATTICE_PARAMS = {pot_name: [parameter.slider_range() for parameter in get_spec(pot_name).parameters] for pot_name in potential_names()}
+
+# the integration time of the trajectories in the lattice — the longest that the time slider of the orbit pages allows
+LATTICE_YEARS = MAX_YEARS
+
+# the potentials, initial radii and initial heights that are built by default, as (start, stop, step): the sliders of the orbit pages
+# go from 0 to 50 kpc in steps of 1 kpc, and the potentials with more than one parameter have thousands of combinations of their values
+LATTICE_POTENTIALS = [pot_name for pot_name, sliders in LATTICE_PARAMS.items() if len(sliders) == 1]
+LATTICE_RADII = (0., 50., 5.)
+LATTICE_HEIGHTS = (0., 10., 5.)
+
+_lock = threading.Lock()
+_store = {}
+
+
+def make_potential(pot_name, param):
+	'''
+	Creates a potential from its name and the values of its sliders, in the same way as the orbit pages do.
+
+	Inputs
+	--------
+	pot_name: the name of the potential, one of the keys of LATTICE_PARAMS
+	param: the value of the key parameter, or a tuple of values for potentials with more than one parameter
+
+	Outputs:
+	-------
+	pot_fxn_set: the initialized potential
+	'''
+
+	return get_potential(pot_name, *(param if isinstance(param, tuple) else (param,)))
+
+
+def slider_values(start, stop, step):
+	'''
+	Returns the values of a slider that goes from start to stop (both included) in the given step.
+	'''
+
+	return [round(start + i*step, 9) for i in range(int(round((stop - start)/step)) + 1)]
+
+
+def lattice_jobs(potentials = None, radii = LATTICE_RADII, heights = LATTICE_HEIGHTS):
+	'''
+	Lists the trajectories of a subset of the lattice.
+
+	Inputs
+	--------
+	potentials: the names of the potentials to include (LATTICE_POTENTIALS by default)
+	radii, heights: the (start, stop, step) of the initial radii and initial heights to include
+
+	Outputs:
+	-------
+	jobs: a list of (pot_name, param, R, z) tuples, one per trajectory
+	'''
+
+	jobs = []
+	for pot_name in potentials or LATTICE_POTENTIALS:
+		grids = [slider_values(*spec) for spec in LATTICE_PARAMS[pot_name]]
+		params = grids[0] if len(grids) == 1 else list(itertools.product(*grids))
+		jobs.extend((pot_name, param) + start for param in params
+			for start in itertools.product(slider_values(*radii), slider_values(*heights)))
+	return jobs
+
+
+def _integrate_job(job):
+	'''
+	Integrates one trajectory of the lattice over LATTICE_YEARS (this runs in a worker process), at the same output times as the orbit
+	cache's incremental trajectories, and returns its key, the integrator and energy drift of the integration, and its coordinate series.
+	'''
+
+	from orbit_cache import _integrate_segment, run_key
+	import natural_units
+
+	pot_name, param, R, z = job
+	pot_fxn = make_potential(pot_name, param)
+	key = run_key(pot_fxn, R, z)
+	ro, vo = natural_units.scales(pot_fxn)
+	segment = _integrate_segment(pot_fxn, R, z, None, 0, int(round(LATTICE_YEARS*key[2])) + 1, key[2], ro, vo)
+	trace = OrbitTrace.from_orbit(segment)
+	report = getattr(segment, "integration_report", {})
+	return repr(key), report.get("method"), report.get("drift"), {name: trace[name].astype(numpy.float32) for name in OrbitTrace.SERIES}
+
+
+def build_lattice(out_dir, jobs, processes = None):
+	'''
+	Integrates the orbits of the lattice in parallel, and writes them to a columnar store.
+
+	Inputs
+	--------
+	out_dir: the directory to write the store to
+	jobs: the trajectories to integrate, as returned by lattice_jobs
+	processes: the number of worker processes (one per core by default)
+
+	Outputs:
+	-------
+	n_orbits: the number of trajectories in the store
+	'''
+
+	os.makedirs(out_dir, exist_ok = True)
+	index = {}
+	offset = 0
+
+	# the series are first appended to raw files as the orbits come in, so the lattice never has to fit in memory at once
+	raw = {name: open(os.path.join(out_dir, name + ".raw"), "wb") for name in OrbitTrace.SERIES}
+	with ProcessPoolExecutor(max_workers = processes) as pool:
+		for key, method, drift, series in pool.map(_integrate_job, jobs, chunksize = 16):
+			length = len(series["t"])
+			for name in OrbitTrace.SERIES:
+				raw[name].write(series[name].tobytes())
+			index[key] = [offset, length, method, drift]
+			offset += length
+
+	# then each raw file is turned into an .npy file, which can be memory-mapped
+	for name in OrbitTrace.SERIES:
+		raw[name].close()
+		with open(os.path.join(out_dir, name + ".npy"), "wb") as npy, open(os.path.join(out_dir, name + ".raw"), "rb") as data:
+			numpy.lib.format.write_array_header_1_0(npy, {"descr": numpy.lib.format.dtype_to_descr(numpy.dtype(numpy.float32)),
+				"fortran_order": False, "shape": (offset,)})
+			while True:
+				chunk = data.read(1 << 24)
+				if not chunk:
+					break
+				npy.write(chunk)
+		os.remove(os.path.join(out_dir, name + ".raw"))
+
+	with open(os.path.join(out_dir, "index.json"), "w") as index_file:
+		json.dump(index, index_file)
+
+	with _lock:
+		_store.pop(os.path.abspath(out_dir), None)
+
+	return len(index)
+
+
+def open_lattice(lattice_dir = None):
+	'''
+	Opens a lattice store, memory-mapping its series. The store is opened once per process, and again only if its index has been
+	written since — a store that doesn't exist yet is looked for again every time, so a lattice that is built while the server is
+	running is picked up.
+
+	Inputs
+	--------
+	lattice_dir: the directory of the store (LATTICE_DIR by default)
+
+	Outputs:
+	-------
+	store: a dictionary with the "index" and the memory-mapped "series", or None if there is no store
+	'''
+
+	lattice_dir = os.path.abspath(lattice_dir or LATTICE_DIR)
+	index_path = os.path.join(lattice_dir, "index.json")
+	try:
+		modified = os.stat(index_path).st_mtime_ns
+	except OSError:
+		return None
+
+	with _lock:
+		store = _store.get(lattice_dir)
+		if store is None or store["modified"] != modified:
+			with open(index_path) as index_file:
+				index = json.load(index_file)
+			series = {name: numpy.load(os.path.join(lattice_dir, name + ".npy"), mmap_mode = "r") for name in OrbitTrace.SERIES}
+			store = _store[lattice_dir] = {"index": index, "series": series, "modified": modified}
+		return store
+
+
+@timed("lattice lookup")
+def lookup(key, n_steps = None, lattice_dir = None):
+	'''
+	Looks an orbit up in the lattice store.
+
+	Inputs
+	--------
+	key: the key of the orbit's trajectory, as returned by orbit_cache.run_key
+	n_steps: the number of output times of the orbit — the trajectory is cut short to its first n_steps (all of it by default)
+	lattice_dir: the directory of the store (LATTICE_DIR by default)
+
+	Outputs:
+	-------
+	trace: the OrbitTrace of the orbit, whose series are read-only views into the memory-mapped store, or None if the trajectory
+	isn't in the store, or is shorter than n_steps
+	'''
+
+	store = open_lattice(lattice_dir)
+	entry = None if store is None else store["index"].get(repr(key))
+	if entry is None:
+		return None
+
+	offset, length, method, drift = entry
+	if n_steps is not None:
+		if n_steps > length:
+			return None
+		length = n_steps
+	return OrbitTrace(method = method, drift = drift, **{name: store["series"][name][offset:offset + length] for name in OrbitTrace.SERIES})
+
+
+def _parse_range(text):
+	'''
+	Parses a command line range, given as start:stop:step or as a single value.
+	'''
+
+	values = [float(part) for part in text.split(":")]
+	return tuple(values) if len(values) == 3 else (values[0], values[0], 1.)
+
+
+def main():
+	'''
+	Builds the lattice from the command line.
+	'''
+
+	parser = argparse.ArgumentParser(description = "Precompute the orbits of ViPOr's orbit pages.")
+	parser.add_argument("--out", default = LATTICE_DIR, help = "the directory to write the lattice to")
+	parser.add_argument("--potentials", nargs = "+", choices = list(LATTICE_PARAMS),
+		help = "the potentials to include (default: those with a single parameter)")
+	parser.add_argument("--radii", type = _parse_range, default = LATTICE_RADII, help = "initial radii, as start:stop:step (kpc)")
+	parser.add_argument("--heights", type = _parse_range, default = LATTICE_HEIGHTS, help = "initial heights, as start:stop:step (kpc)")
+	parser.add_argument("--processes", type = int, default = None, help = "the number of worker processes (default: one per core)")
+	args = parser.parse_args()
+
+	jobs = lattice_jobs(args.potentials, args.radii, args.heights)
+	print("Integrating %d orbits over %d Gyr ..." % (len(jobs), LATTICE_YEARS))
+	print("Wrote %d orbits to %s" % (build_lattice(args.out, jobs, args.processes), args.out))
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,103 @@
+# This file contains the OrbitTrace, a compact, array-backed copy of an integrated orbit. Every coordinate series that the plotting
+# functions and animations need is evaluated once, straight from the integrated orbit, and kept as a contiguous NumPy array, so we
+# never have to draw a hidden matplotlib figure with orbit.plot() just to read the data back out of it.
+
+import hashlib
+
+import numpy
+
+import natural_units
+from profiler import stage
+
+class OrbitTrace:
+	'''
+	The coordinate series of one integrated orbit, in physical units (Gyr, kpc, km/s and degrees).
+
+	Attributes
+	--------
+	t: the times at which the orbit was output, in Gyr
+	x, y, z: the Cartesian coordinates, in kpc
+	R: the cylindrical radius, in kpc
+	vR, vT, vz: the radial, tangential and vertical velocities, in km/s
+	ra, dec: the right ascension and declination, in degrees
+	method: the integrator the orbit was integrated with, or None if it's not known (e.g. for an orbit read from the orbit lattice)
+	drift: the relative change in the orbit's energy over the integration, or None if it's not known
+	'''
+
+	SERIES = ("t", "x", "y", "z", "R", "vR", "vT", "vz", "ra", "dec")
+
+	__slots__ = SERIES + ("method", "drift", "_digest")
+
+	def __init__(self, method = None, drift = None, **series):
+		self.method = method
+		self.drift = drift
+		self._digest = None
+		for name in self.SERIES:
+			# float32 series (read from the orbit lattice) are kept as they are, so a memory-mapped series is never copied
+			values = numpy.asarray(series[name])
+			dtype = values.dtype if values.dtype in (numpy.float32, numpy.float64) else numpy.float64
+			setattr(self, name, numpy.ascontiguousarray(values, dtype = dtype))
+
+	@classmethod
+	def from_orbit(cls, orbit):
+		'''
+		Evaluates every coordinate series of an integrated galpy Orbit in a single pass.
+
+		Inputs
+		--------
+		orbit: an integrated galpy Orbit, with physical output turned on (an orbit that was never integrated gives a
+		trace with only its initial point)
+
+		Outputs:
+		-------
+		trace: the OrbitTrace of the orbit
+		'''
+
+		# the phase-space coordinates are read in natural units and converted to physical units in one go, rather than asking galpy
+		# for each series separately — only the sky coordinates need galpy's coordinate transformations
+		with stage("extraction"):
+			t = getattr(orbit, "t", numpy.zeros(1))
+			phase_space = orbit.getOrbit() if hasattr(orbit, "t") else orbit.vxvv
+			series = natural_units.physical_series(phase_space.reshape(len(t), -1), t, *natural_units.scales(orbit))
+		with stage("RA/Dec transform"):
+			for name in ("ra", "dec"):
+				series[name] = getattr(orbit, name)(t, quantity = False)
+
+		# the integrator and energy drift of the orbit, if it was integrated through integrators.integrate
+		report = getattr(orbit, "integration_report", None) or {}
+		return cls(method = report.get("method"), drift = report.get("drift"), **series)
+
+	def __len__(self):
+		return len(self.t)
+
+	def __getitem__(self, name):
+		'''
+		Returns one of the coordinate series by name, so the figure builders can ask for e.g. trace["vR"].
+		'''
+
+		if name not in self.SERIES:
+			raise KeyError(name)
+		return getattr(self, name)
+
+	def digest(self):
+		'''
+		Returns a hash of every coordinate series, which identifies the content of the figures drawn from the trace (see image_cache).
+		It's computed the first time it's asked for, and kept with the trace.
+		'''
+
+		if self._digest is None:
+			digest = hashlib.sha1()
+			for name in self.SERIES:
+				values = getattr(self, name)
+				digest.update(("%s:%s%s|" % (name, values.dtype.str, values.shape)).encode())
+				digest.update(values.data)
+			self._digest = digest.hexdigest()
+		return self._digest
+
+	@property
+	def nbytes(self):
+		'''
+		The total memory taken up by the coordinate series, in bytes.
+		'''
+
+		return sum(getattr(self, name).nbytes for name in self.SERIES)
@@ -2,14 +2,57 @@
 # the user to visualize how particle's velocities change within a given potential, and compare those results across different mass 
 # distributions. 
 
-import numexpr
-import matplotlib.pyplot as plt
-from astropy import units
-from galpy.orbit import Orbit
-from galpy import potential
-from galpy.util.conversion import get_physical
 import numpy
 import streamlit as st
+from figure_manager import new_figure, show_figure
+from interactive_plots import curves_chart, plot_backend, show_chart
+from rotation_curves import rotation_curve
+from profiler import profiler_panel, start_run
+from startup import prewarm, wait_for_imports
+
+# collect the timing records of this run of the page, for the profiler in the sidebar
+start_run("A Closer Look at Rotation Curves")
+
+# start importing galpy, astropy and matplotlib in the background, in case the visitor came straight to this page
+prewarm()
+
+
+def make_radii():
+	'''
+	Returns the radii at which the rotation curves are evaluated, in kpc. astropy is only imported here, so the text of the page is
+	shown before it has loaded (by the background thread, if it's still importing it).
+	'''
+
+	wait_for_imports()
+	from astropy import units
+
+	return numpy.linspace(0.01, 50, 1000)*units.kpc
+
+
+def make_potentials():
+	'''
+	Initializes the potentials that we will calculate the rotation curves for, and the NFW potential of the dark matter. galpy is only
+	imported here, so the text of the page is shown before it has loaded (by the background thread, if it's still importing it).
+	'''
+
+	wait_for_imports()
+	from astropy import units
+	from galpy import potential
+
+	return (potential.HomogeneousSpherePotential(), potential.PowerSphericalPotential(), potential.PowerSphericalPotentialwCutoff(),
+		potential.SphericalShellPotential(), potential.DoubleExponentialDiskPotential(), potential.TwoPowerTriaxialPotential(b = 4, c = 16),
+		potential.NFWPotential(amp = (6*10**11)*units.solMass))
+
+
+def make_spiral_arms(number):
+	'''
+	Initializes the potential of a number of spiral arms.
+	'''
+
+	from galpy.potential import SpiralArmsPotential
+
+	return SpiralArmsPotential(N = number)
+
 
 # Initializing the user interface, adding instructions and various background information
 
@@ -43,28 +86,22 @@ st.markdown("In addition, you can add **:green[spiral arms]** or **:green[dark m
 
 # initialize the list of r values
 
-r_s = numpy.linspace(0.01, 50, 1000)*units.kpc
+r_s = make_radii()
 
 # initialize the potentials that we will calculate the rotation curves for
-hsp = potential.HomogeneousSpherePotential()
-psp = potential.PowerSphericalPotential()
-pspc = potential.PowerSphericalPotentialwCutoff()
-ssp = potential.SphericalShellPotential()
-dedp = potential.DoubleExponentialDiskPotential()
-tptp = potential.TwoPowerTriaxialPotential(b = 4, c = 16)
-lp = potential.NFWPotential(amp = (6*10**11)*units.solMass)
+hsp, psp, pspc, ssp, dedp, tptp, lp = make_potentials()
+
+# the extra components (spiral arms and dark matter) that the user adds to every potential — each is created once and shared by
+# all the potentials, and the rotation curves are built from the separate components
+
+extras = []
 
 # Create a checkbox for the user to add spiral arms, and a slider for the number of spiral arms to add
 # then alter the potentials by adding the arms component
 
 if st.checkbox("Add Spiral Arms?"):
 	number = st.slider("How many arms?", min_value = 1, max_value = 5)
-	hsp = hsp + potential.SpiralArmsPotential(N = number)
-	psp = psp + potential.SpiralArmsPotential(N = number)
-	pspc = pspc + potential.SpiralArmsPotential(N = number)
-	ssp = ssp + potential.SpiralArmsPotential(N = number)
-	dedp = dedp + potential.SpiralArmsPotential(N = number)
-	tptp = tptp + potential.SpiralArmsPotential(N = number)
+	extras.append(make_spiral_arms(number))
 
 # Create a checkbox for the user to add dark matter, and then alter the potentials by adding the dark matter component to each
 # potential, if the box is checked. 
@@ -74,82 +111,65 @@ if st.checkbox("Add Spiral Arms?"):
 dm_cb = st.checkbox("Add Dark Matter?")
 
 if dm_cb == True:
-	hsp = hsp + potential.NFWPotential(amp = (6*10**11)*units.solMass)
-	psp = psp + potential.NFWPotential(amp = (6*10**11)*units.solMass)
-	pspc = pspc + potential.NFWPotential(amp = (6*10**11)*units.solMass)
-	ssp = ssp + potential.NFWPotential(amp = (6*10**11)*units.solMass)
-	dedp = dedp + potential.NFWPotential(amp = (6*10**11)*units.solMass)
-	tptp = tptp + potential.NFWPotential(amp = (6*10**11)*units.solMass)
+	extras.append(lp)
 
 	st.markdown("We approximate the component of dark matter with the **NFW Potential**:")
 	st.latex(r'''\rho(r)= \frac{\text{amp}}{4\pi a^3} \frac{1}{(r/a)(1 + r/a)^{2}} ''')
 
-# define the initial conditions
-
-R = 10*units.kpc
-z = 5*units.kpc
-vR = 0.0*units.km/units.s
-vT = 0.0*units.km/units.s
-vz = 0.0*units.km/units.s
-phi = 0.0*units.radian
-
-init_cond = [R, vR, vT, z, vz, phi]
-
-# define the integration time
-
-times = numpy.linspace(0.,14.0,3001)*units.Gyr
-
-# create a plot to display the rotation curves
-
-fig, ax = plt.subplots(figsize = (10, 6))
-
-fig_orbit, ax_orbit = plt.subplots()
-
 st.markdown("Check a box to display the rotation curve for a given potential:")
 
 # give the users the option to display or hide different rotation curves, and if they select a given potential, calculate
 # its corresponding rotation curve and plot the result
 
+# the rotation curves to plot, by their labels, and how each one was computed — by adding up the cached components, or
+# directly for non-axisymmetric potentials
+curves = {}
+paths = {}
+
 if st.checkbox("Homogeneous Sphere Potential"):
-	rc_hsp = potential.calcRotcurve(hsp, r_s, phi = 0)
-	ax.plot(r_s, rc_hsp, label = "Homogeneous Sphere Potential")
+	curves["Homogeneous Sphere Potential"], paths["Homogeneous Sphere Potential"] = rotation_curve([hsp] + extras, r_s, phi = 0)
 
 if st.checkbox("Power Spherical Potential"):
-	rc_psp = potential.calcRotcurve(psp, r_s, phi = 0)
-	ax.plot(r_s, rc_psp, label = "Power Spherical")
+	curves["Power Spherical"], paths["Power Spherical"] = rotation_curve([psp] + extras, r_s, phi = 0)
 
 if st.checkbox("Power Spherical Potential, with Cutoff"):
-	rc_pspc = potential.calcRotcurve(pspc, r_s, phi = 0)
-	ax.plot(r_s, rc_pspc, label = "Power Spherical, with Cutoff")
+	curves["Power Spherical, with Cutoff"], paths["Power Spherical, with Cutoff"] = rotation_curve([pspc] + extras, r_s, phi = 0)
 
 if st.checkbox("Spherical Shell Potential"):
-	rc_ssp = potential.calcRotcurve(ssp, r_s, phi = 0)
-	ax.plot(r_s, rc_ssp, label = "Spherical Shell")
+	curves["Spherical Shell"], paths["Spherical Shell"] = rotation_curve([ssp] + extras, r_s, phi = 0)
 
 if st.checkbox("Double Exponential Disk Potential"):
-	rc_dedp = potential.calcRotcurve(dedp, r_s, phi = 0)
-	ax.plot(r_s, rc_dedp, label = "Double Exponential Disk")
+	curves["Double Exponential Disk"], paths["Double Exponential Disk"] = rotation_curve([dedp] + extras, r_s, phi = 0)
 
 if st.checkbox("Two Power Triaxial Potential"):
-	rc_tptp = potential.calcRotcurve(tptp, r_s, phi = 0)
-	ax.plot(r_s, rc_tptp, label = "Two Power Triaxial")
+	curves["Two Power Triaxial"], paths["Two Power Triaxial"] = rotation_curve([tptp] + extras, r_s, phi = 0)
 
 if st.checkbox("Dark Matter Halo") and dm_cb == True:
-	rc_lp = potential.calcRotcurve(lp, r_s, phi = 0)
-	ax.plot(r_s, rc_lp, label = "Dark Matter Halo")
+	curves["Dark Matter Halo"], paths["Dark Matter Halo"] = rotation_curve(lp, r_s, phi = 0)
+
+# display the rotation curves, either drawn by the browser or as a matplotlib figure with its labels and legend
+
+if plot_backend() == "interactive":
+	show_chart(curves_chart(r_s, curves, "Rotation Curves of Various Potentials", "R/R_0", "v_c(R)/v_c(R_0)"))
 
-# set labels and the legend for the plot
+else:
+	fig, ax = new_figure(figsize = (10, 6))
 
-ax.set_title("Rotation Curves of Various Potentials")
+	for label, curve in curves.items():
+		ax.plot(r_s, curve, label = label)
 
-ax.set_xlabel(r"$R/R_0$")
+	ax.set_title("Rotation Curves of Various Potentials")
 
-ax.set_ylabel(r"$v_c(R)/v_c(R_0)$")
+	ax.set_xlabel(r"$R/R_0$")
 
-ax.legend()
+	ax.set_ylabel(r"$v_c(R)/v_c(R_0)$")
 
-# display the final resulting plot
+	ax.legend()
 
-st.pyplot(fig)
+	show_figure(fig)
 
+if paths:
+	st.caption("Computed by: " + ", ".join(name + " (" + path + ")" for name, path in paths.items()))
 
+# show the profiler in the sidebar, if it's turned on
+profiler_panel()
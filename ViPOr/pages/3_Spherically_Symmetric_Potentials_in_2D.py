@@ -2,17 +2,25 @@
 # and then examine different plots that describe its motion in three-dimensions. At the end, there's an animation that shows the motion
 # of the particle in its orbit.
 
-from astropy import units
-from galpy.orbit import Orbit
-from galpy.util.conversion import get_physical
-from galpy.potential import plotPotentials, TwoPowerSphericalPotential, PowerSphericalPotential, HomogeneousSpherePotential, SphericalShellPotential, PlummerPotential
-import numexpr
-import matplotlib.pyplot as plt
-import numpy
 import streamlit as st
 
-from PlotPotentialandOrbit2D import plot_orbit_2D
-from pick_potential import pick_potential, set_potential
+from PlotPotentialandOrbit2D import submit_animation_2D, submit_figure_2D
+from orbit_cache import get_trace
+from potential_grid import potential_image
+from potential_registry import get_potential, get_spec, parameter_sliders, potential_names
+from tracer_cloud import get_cloud, plot_cloud_2D, snapshot_index
+from progressive import ProgressiveRenderer, fragment, on_demand, retained, submit
+from interactive_plots import plot_backend
+from profiler import profiler_panel, start_run
+from startup import prewarm, wait_for_imports
+
+# collect the timing records of this run of the page, for the profiler in the sidebar
+start_run("Spherically Symmetric Potentials in 2D")
+
+# import galpy, astropy and matplotlib in the background, in case the visitor came straight to this page — and wait for them, since
+# the page needs them straight away
+prewarm()
+wait_for_imports()
 
 # title and description of the page
 
@@ -26,23 +34,22 @@ st.markdown("Select a potential form below to get started.")
 
 # list of possible potentials and initialization of the dropdown menu
 
-pot_names = ["Power Spherical Potential", "Spherical Shell Potential", "Homogeneous Sphere Potential", "Plummer Potential"]
+pot_names = potential_names("spherical")
 pot_fxn = st.selectbox('Select a potential function:', pot_names)
 
 # print out the name of the potential
 pot_name_string = "You've selected the **"+pot_fxn+"**."
 st.markdown(pot_name_string)
 
-# given the chosen potential, get the equation, parameter of interest, latex string of the equation, as well as the minimum,
-# maximum and step values for the parameter's slider
-parameters, equation, param1, density_string, latex, min_value, max_value, step = pick_potential(pot_fxn, pot_names.index(pot_fxn))
+# given the chosen potential, get its entry in the registry, with the equation, the parameter of interest and its slider
+spec = get_spec(pot_fxn)
 
 # print the form of the mass distribution density
-st.markdown(density_string)
-st.latex(latex)
+st.markdown(spec.density_string)
+st.latex(spec.latex)
 
 # list the parameter that can be modified
-param_string = "The parameter you can modify is: **"+parameters+"**."
+param_string = "The parameter you can modify is: **"+spec.description+"**."
 
 st.markdown(param_string)
 
@@ -55,52 +62,128 @@ st.markdown("**NOTE: This may take a few moments to run and generate plots. If t
 	allowed — please select new ones.**")
 
 # initialize slider for the parameter of interest
-param = st.slider(param1, min_value = min_value, max_value = max_value, step = step)
-pot_fxn_set = set_potential(pot_fxn, param)
-
-# initialize sliders for the integration time, initial radius and initial height from the galactic plane
-years = st.slider("Time (Gyr):", min_value = 0, max_value = 14)
-radius = st.slider("Set the initial distance from the galactic center (kpc):", min_value = 0.0, max_value = 50.0, step = 1.0)
-height = st.slider("Set the initial height from the galactic plane (kpc):", min_value = 0.0, max_value = 50.0, step = 1.0)
-
-# get two dimensional plots for the selected potential and orbit
-fig0, fig1, fig2, fig3, raw_html, raw_html_2, density = plot_orbit_2D(pot_fxn_set, years, radius, height)
-
-st.markdown("Below is a plot of the potential over each value of R and \
-		z. The darker regions are areas where the magnitude of the potential is higher — so we can see that the potential \
-		increases as we get closer to the center.")
-
-# plot the potential over R and z
-st.pyplot(density.get_figure())
-
-st.markdown("We can examine three plots to understand how particles will move in this potential.")
-st.markdown("The first is an **R vs. z** plot, which displays the path of the orbit in the meridional plane. With this one, we can see how far the particle is from the \
-	galactic plane — its vertical distance — at each radius from the galactic center. We can see if orbits are bound or unbound, depending on the appearance of this plot.")
-
-# plot the orbit in R vs. z coordinates
-st.pyplot(fig0, bbox_inches = "tight", pad_inches = 0.5)
-
-st.markdown("The second is an **radius vs. radial velocity** plot, which displays the radial velocity of the particle at each radius — how fast the particle moves based on its distance \
-	from the galactic center. We can track where the velocity is positive and where it is negative, which indicates the direction the particle orbits. Bound orbits will \
-	fluctuate between positive and negative, while unbound orbits will increase in radial velocity off into infinity.")
-
-# plot the orbit in R vs. vR coordinates
-st.pyplot(fig2, bbox_inches = "tight", pad_inches = 0.5)
-
-st.markdown("The next is an **RA vs. Dec** plot, which displays the path of the orbit in celestial coordinates. This is the path the particle takes within the sky.")
-
-# plot the orbit in RA vs. Dec coordinates
-st.pyplot(fig1, bbox_inches = "tight", pad_inches = 0.5)
-
-st.markdown("Lastly, we show **the projection of the orbit into the x-y plane**, which shows the position and movement of the particle through the galactic plane.")
-
-# plot the orbit in Cartesian coordinates
-st.pyplot(fig3, bbox_inches = "tight", pad_inches = 0.5)
-
-st.markdown("Finally, there are two animations that displays the movement of the particle perpendicular to the galactic plane — its vertical height from the galactic plane \
-	at each radius — as well as the motion of the particle in the galactic plane.")
-
-# show the animations
-st.components.v1.html(raw_html, height = 600)
-st.components.v1.html(raw_html_2, height = 600)
-
+params = parameter_sliders(pot_fxn)
+pot_fxn_set = get_potential(pot_fxn, *params)
+
+# the rest of the page is split into sections, each of which is run again on its own when only its own widgets change (see
+# progressive.fragment) — moving one of the orbit's sliders redraws the orbit's plots and animations, but not the contour plot of the
+# potential, which is only drawn again when the potential changes
+backend = plot_backend()
+
+
+@fragment
+def show_potential(pot_fxn_set):
+	# each plot and animation is in a collapsed section, and is only made once the section is opened
+	with on_demand("Contour plot of the potential", "vipor_potential") as section:
+		st.markdown("Below is a plot of the potential over each value of R and \
+				z. The darker regions are areas where the magnitude of the potential is higher — so we can see that the potential \
+				increases as we get closer to the center.")
+
+		# plot the potential over R and z
+		if section.open:
+			renderer = ProgressiveRenderer()
+			renderer.figure(retained("potential", (pot_fxn_set,), submit, potential_image, pot_fxn_set, phi = 0.0))
+			renderer.render()
+
+
+@fragment
+def show_orbit(pot_fxn_set, backend):
+	# initialize sliders for the integration time, initial radius and initial height from the galactic plane
+	years = st.slider("Time (Gyr):", min_value = 0, max_value = 14)
+	radius = st.slider("Set the initial distance from the galactic center (kpc):", min_value = 0.0, max_value = 50.0, step = 1.0)
+	height = st.slider("Set the initial height from the galactic plane (kpc):", min_value = 0.0, max_value = 50.0, step = 1.0)
+
+	# start making the two dimensional plots that are open for the selected potential and orbit — each one is shown in its place on the
+	# page as soon as it's ready, and kept for the rest of the session
+	renderer = ProgressiveRenderer()
+	orbit = (pot_fxn_set, years, radius, height)
+	trace = retained("trace", orbit, submit, get_trace, *orbit)
+
+	st.markdown("We can examine three plots to understand how particles will move in this potential.")
+
+	# plot the orbit in R vs. z coordinates
+	with on_demand("R vs. z", "vipor_R_z", expanded = True) as section:
+		st.markdown("The first is an **R vs. z** plot, which displays the path of the orbit in the meridional plane. With this one, we can see how far the particle is from the \
+			galactic plane — its vertical distance — at each radius from the galactic center. We can see if orbits are bound or unbound, depending on the appearance of this plot.")
+		if section.open:
+			renderer.figure(retained("R vs. z", orbit + (backend,), submit_figure_2D, "R_z", trace, backend))
+
+	# plot the orbit in R vs. vR coordinates
+	with on_demand("Radius vs. radial velocity", "vipor_R_vR") as section:
+		st.markdown("The second is an **radius vs. radial velocity** plot, which displays the radial velocity of the particle at each radius — how fast the particle moves based on its distance \
+			from the galactic center. We can track where the velocity is positive and where it is negative, which indicates the direction the particle orbits. Bound orbits will \
+			fluctuate between positive and negative, while unbound orbits will increase in radial velocity off into infinity.")
+		if section.open:
+			renderer.figure(retained("R vs. vR", orbit + (backend,), submit_figure_2D, "R_vR", trace, backend))
+
+	# plot the orbit in RA vs. Dec coordinates
+	with on_demand("RA vs. Dec", "vipor_ra_dec") as section:
+		st.markdown("The next is an **RA vs. Dec** plot, which displays the path of the orbit in celestial coordinates. This is the path the particle takes within the sky.")
+		if section.open:
+			renderer.figure(retained("RA vs. Dec", orbit + (backend,), submit_figure_2D, "ra_dec", trace, backend))
+
+	# plot the orbit in Cartesian coordinates
+	with on_demand("Projection onto the x-y plane", "vipor_x_y") as section:
+		st.markdown("Lastly, we show **the projection of the orbit into the x-y plane**, which shows the position and movement of the particle through the galactic plane.")
+		if section.open:
+			renderer.figure(retained("x vs. y", orbit + (backend,), submit_figure_2D, "x_y", trace, backend))
+
+	# fill in the plots as they finish
+	renderer.render()
+
+	show_animations(pot_fxn_set, years, radius, height, trace)
+	show_tracer_cloud(pot_fxn_set, years, radius, height)
+
+
+@fragment
+def show_animations(pot_fxn_set, years, radius, height, trace):
+	st.markdown("Finally, there are two animations that displays the movement of the particle perpendicular to the galactic plane — its vertical height from the galactic plane \
+		at each radius — as well as the motion of the particle in the galactic plane.")
+
+	# show the animations, once their sections are opened
+	renderer = ProgressiveRenderer()
+	orbit = (pot_fxn_set, years, radius, height)
+	with on_demand("Animation in R vs. z", "vipor_animation_R_z") as section:
+		if section.open:
+			renderer.html(retained("animation in R vs. z", orbit, submit_animation_2D, *orbit, 'R', 'z', trace), height = 600)
+	with on_demand("Animation in the x-y plane", "vipor_animation_x_y") as section:
+		if section.open:
+			renderer.html(retained("animation in x vs. y", orbit, submit_animation_2D, *orbit, 'x', 'y', trace), height = 600)
+	renderer.render()
+
+
+# tracer-cloud mode: instead of a single particle, follow thousands of particles that start around the chosen radius and height
+
+@fragment
+def show_tracer_cloud(pot_fxn_set, years, radius, height):
+	st.markdown("### Tracer Clouds")
+
+	if not st.checkbox("Follow a cloud of particles instead of a single one?"):
+		return
+
+	st.markdown("In this mode, thousands of particles start in a cloud around the initial radius and height you chose above, with small, random \
+		velocities in every direction. All of them are integrated together, and the plots below show how densely the particles are packed at \
+		each point — watch how the potential stretches the cloud out as time goes on.")
+
+	# initialize sliders for the number of particles, the size of the cloud and the spread of the particles' velocities
+	n_particles = st.slider("Number of particles:", min_value = 1000, max_value = 10000, step = 1000)
+	spread = st.slider("Size of the cloud (kpc):", min_value = 0.5, max_value = 5.0, step = 0.5)
+	dispersion = st.slider("Velocity dispersion (km/s):", min_value = 0, max_value = 200, value = 50, step = 10)
+
+	# pick the moment in time to show, and integrate the cloud in the background, so the rest of the page isn't held up
+	time = st.slider("Show the cloud at time (Gyr):", min_value = 0.0, max_value = float(years), step = 0.1) if years > 0 else 0.0
+	options = {"n": n_particles, "spread": spread, "dispersion": dispersion}
+	cloud = retained("tracer cloud", (pot_fxn_set, years, radius, height, options), submit, get_cloud, pot_fxn_set, years, radius, height,
+		**options)
+
+	# plot the density of the cloud in the x-y plane and in R vs. z coordinates
+	renderer = ProgressiveRenderer("Integrating the cloud...")
+	renderer.figure(submit(plot_cloud_2D, cloud, submit(snapshot_index, cloud, time)), bbox_inches = "tight", pad_inches = 0.5)
+	renderer.render()
+
+
+show_potential(pot_fxn_set)
+show_orbit(pot_fxn_set, backend)
+
+# show the profiler in the sidebar, if it's turned on
+profiler_panel()
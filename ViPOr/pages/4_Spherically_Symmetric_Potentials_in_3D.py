@@ -2,18 +2,25 @@
 # and then examine different plots that describe its motion in three-dimensions. At the end, there's an animation that shows the motion
 # of the particle in its orbit.
 
-from astropy import units
-from galpy.orbit import Orbit
-from galpy.potential import plotPotentials, TwoPowerSphericalPotential, PowerSphericalPotential, HomogeneousSpherePotential, SphericalShellPotential, PlummerPotential
-from galpy.util.conversion import get_physical
-import numexpr
-import matplotlib.pyplot as plt
-import numpy
-
 import streamlit as st
 
-from PlotPotentialandOrbit3D import plot_orbit_3D
-from pick_potential import pick_potential, set_potential
+from PlotPotentialandOrbit3D import submit_animation_3D, submit_figure_3D
+from orbit_cache import get_trace
+from potential_grid import potential_image
+from potential_registry import get_potential, get_spec, parameter_sliders, potential_names
+from tracer_cloud import get_cloud, plot_cloud_3D, snapshot_index
+from progressive import ProgressiveRenderer, fragment, on_demand, retained, submit
+from interactive_plots import plot_backend
+from profiler import profiler_panel, start_run
+from startup import prewarm, wait_for_imports
+
+# collect the timing records of this run of the page, for the profiler in the sidebar
+start_run("Spherically Symmetric Potentials in 3D")
+
+# import galpy, astropy and matplotlib in the background, in case the visitor came straight to this page — and wait for them, since
+# the page needs them straight away
+prewarm()
+wait_for_imports()
 
 st.markdown("## Experimenting with Spherically Symmetric Orbits in Three Dimensions")
 
@@ -24,23 +31,22 @@ st.markdown("In this module, you can visualize various spherically symmetric pot
 st.markdown("Select a potential form below to get started.")
 
 # list of potential names and the drop down menu for the options the user has to pick their potential
-pot_names = ["Power Spherical Potential", "Spherical Shell Potential", "Homogeneous Sphere Potential", "Plummer Potential"]
+pot_names = potential_names("spherical")
 pot_fxn = st.selectbox('Select a potential function:', pot_names)
 
 # print out the name of the potential the user has picked
 pot_name_string = "You've selected the **"+pot_fxn+"**."
 st.markdown(pot_name_string)
 
-# given the chosen potential, get the equation, parameter of interest, latex string of the equation, as well as the minimum,
-# maximum and step values for the parameter's slider
-parameters, equation, param1, density_string, latex, min_value, max_value, step = pick_potential(pot_fxn, pot_names.index(pot_fxn))
+# given the chosen potential, get its entry in the registry, with the equation, the parameter of interest and its slider
+spec = get_spec(pot_fxn)
 
 # print out the equation of the mass density
-st.markdown(density_string)
-st.latex(latex)
+st.markdown(spec.density_string)
+st.latex(spec.latex)
 
 # print out the key parameter of interest
-param_string = "The parameter you can modify is: **"+parameters+"**."
+param_string = "The parameter you can modify is: **"+spec.description+"**."
 
 st.markdown(param_string)
 
@@ -52,46 +58,116 @@ st.markdown(
 st.markdown("**NOTE: This may take a few moments to run and generate plots. If the application stops running and throws an error, that's because the parameters are not \
 	allowed — please select new ones.**")
 
-param = st.slider(param1, min_value = min_value, max_value = max_value, step = step)
+params = parameter_sliders(pot_fxn)
 
 # set the potential with the chosen parameter
-pot_fxn_set = set_potential(pot_fxn, param)
-
-years = st.slider("Time (Gyr):", min_value = 0, max_value = 14)
-radius = st.slider("Set the initial distance from the galactic center (kpc):", min_value = 0.0, max_value = 50.0, step = 1.0)
-height = st.slider("Set the initial height from the galactic plane (kpc):", min_value = 0.0, max_value = 50.0, step = 1.0)
-
-# call plot_orbit_3D, which obtains the three plots and the animation for the given potential and initial conditions
-
-fig0, fig1, fig2, raw_html, density = plot_orbit_3D(pot_fxn_set, years, radius, height)
-
-st.markdown("Below is a plot of the potential over each value of R and \
-		z. The darker regions are areas where the magnitude of the potential is higher — so we can see that the potential \
-		increases as the object gets closer to the center.")
-
-# plot the potential
-
-st.pyplot(density.get_figure())
-
-st.markdown("This first plot shows the orbit in **x, y and z coordinates**. With this we can see how the particle will move \
-	in three-dimensional space.")
-
-# plot the orbit in Cartesian coordinates
-st.pyplot(fig0, bbox_inches = "tight", pad_inches = 0.5)
-
-st.markdown("This next plot shows the relationship between the **orbital radius, radial velocity and height from the disk plane**. \
-	This shows how the radial velocity of the particle changes with its position inside the distribution.")
-
-# plot the orbit with r vs. v_R vs. z
-st.pyplot(fig1, bbox_inches = "tight", pad_inches = 0.5)
-
-st.markdown("The last plot shows the relationship between the particle's **orbital radius, radial velocity and vertical velocity**. \
-	This plot shows how fast the particle is moving radially and vertically, depending on its distance from the center of the galaxy.")
-
-# plot the orbit with r vs. v_r vs. v_z.
-st.pyplot(fig2, bbox_inches = "tight", pad_inches = 0.5)
-
-# show the animated orbit in 3D
-st.markdown("And now we display the 3D animation of the orbit.")
-st.components.v1.html(raw_html, height = 800)
-
+pot_fxn_set = get_potential(pot_fxn, *params)
+
+# the rest of the page is split into sections, each of which is run again on its own when only its own widgets change (see
+# progressive.fragment) — moving one of the orbit's sliders redraws the orbit's plots and animation, but not the contour plot of the
+# potential, which is only drawn again when the potential changes
+backend = plot_backend()
+
+
+@fragment
+def show_potential(pot_fxn_set):
+	# each plot and the animation are in collapsed sections, and are only made once their section is opened
+	with on_demand("Contour plot of the potential", "vipor_potential") as section:
+		st.markdown("Below is a plot of the potential over each value of R and \
+				z. The darker regions are areas where the magnitude of the potential is higher — so we can see that the potential \
+				increases as the object gets closer to the center.")
+
+		# plot the potential
+		if section.open:
+			renderer = ProgressiveRenderer()
+			renderer.figure(retained("potential", (pot_fxn_set,), submit, potential_image, pot_fxn_set, phi = 0.0))
+			renderer.render()
+
+
+@fragment
+def show_orbit(pot_fxn_set, backend):
+	years = st.slider("Time (Gyr):", min_value = 0, max_value = 14)
+	radius = st.slider("Set the initial distance from the galactic center (kpc):", min_value = 0.0, max_value = 50.0, step = 1.0)
+	height = st.slider("Set the initial height from the galactic plane (kpc):", min_value = 0.0, max_value = 50.0, step = 1.0)
+
+	# start making the three dimensional plots that are open for the given potential and initial conditions — each one is shown in its
+	# place on the page as soon as it's ready, and kept for the rest of the session
+	renderer = ProgressiveRenderer()
+	orbit = (pot_fxn_set, years, radius, height)
+	trace = retained("trace", orbit, submit, get_trace, *orbit)
+
+	# plot the orbit in Cartesian coordinates
+	with on_demand("x, y and z", "vipor_x_y_z", expanded = True) as section:
+		st.markdown("This first plot shows the orbit in **x, y and z coordinates**. With this we can see how the particle will move \
+			in three-dimensional space.")
+		if section.open:
+			renderer.figure(retained("x vs. y vs. z", orbit + (backend,), submit_figure_3D, "x_y_z", trace, backend))
+
+	# plot the orbit with r vs. v_R vs. z
+	with on_demand("Radius, radial velocity and height", "vipor_R_vR_z") as section:
+		st.markdown("This next plot shows the relationship between the **orbital radius, radial velocity and height from the disk plane**. \
+			This shows how the radial velocity of the particle changes with its position inside the distribution.")
+		if section.open:
+			renderer.figure(retained("R vs. vR vs. z", orbit + (backend,), submit_figure_3D, "R_vR_z", trace, backend))
+
+	# plot the orbit with r vs. v_r vs. v_z.
+	with on_demand("Radius, radial velocity and vertical velocity", "vipor_R_vR_vz") as section:
+		st.markdown("The last plot shows the relationship between the particle's **orbital radius, radial velocity and vertical velocity**. \
+			This plot shows how fast the particle is moving radially and vertically, depending on its distance from the center of the galaxy.")
+		if section.open:
+			renderer.figure(retained("R vs. vR vs. vz", orbit + (backend,), submit_figure_3D, "R_vR_vz", trace, backend))
+
+	# fill in the plots as they finish
+	renderer.render()
+
+	show_animation(pot_fxn_set, years, radius, height, trace)
+	show_tracer_cloud(pot_fxn_set, years, radius, height)
+
+
+@fragment
+def show_animation(pot_fxn_set, years, radius, height, trace):
+	# show the animated orbit in 3D, once its section is opened
+	renderer = ProgressiveRenderer()
+	orbit = (pot_fxn_set, years, radius, height)
+	with on_demand("3D animation of the orbit", "vipor_animation_3D") as section:
+		st.markdown("And now we display the 3D animation of the orbit.")
+		if section.open:
+			renderer.html(retained("3D animation", orbit, submit_animation_3D, *orbit, trace = trace), height = 800)
+	renderer.render()
+
+
+# tracer-cloud mode: instead of a single particle, follow thousands of particles that start around the chosen radius and height
+
+@fragment
+def show_tracer_cloud(pot_fxn_set, years, radius, height):
+	st.markdown("### Tracer Clouds")
+
+	if not st.checkbox("Follow a cloud of particles instead of a single one?"):
+		return
+
+	st.markdown("In this mode, thousands of particles start in a cloud around the initial radius and height you chose above, with small, random \
+		velocities in every direction. All of them are integrated together, and the plot below shows how densely the particles are packed in \
+		each part of space — the bigger and brighter the point, the more particles there are.")
+
+	# initialize sliders for the number of particles, the size of the cloud and the spread of the particles' velocities
+	n_particles = st.slider("Number of particles:", min_value = 1000, max_value = 10000, step = 1000)
+	spread = st.slider("Size of the cloud (kpc):", min_value = 0.5, max_value = 5.0, step = 0.5)
+	dispersion = st.slider("Velocity dispersion (km/s):", min_value = 0, max_value = 200, value = 50, step = 10)
+
+	# pick the moment in time to show, and integrate the cloud in the background, so the rest of the page isn't held up
+	time = st.slider("Show the cloud at time (Gyr):", min_value = 0.0, max_value = float(years), step = 0.1) if years > 0 else 0.0
+	options = {"n": n_particles, "spread": spread, "dispersion": dispersion}
+	cloud = retained("tracer cloud", (pot_fxn_set, years, radius, height, options), submit, get_cloud, pot_fxn_set, years, radius, height,
+		**options)
+
+	# plot the density of the cloud in three dimensions
+	renderer = ProgressiveRenderer("Integrating the cloud...")
+	renderer.figure(submit(plot_cloud_3D, cloud, submit(snapshot_index, cloud, time)), bbox_inches = "tight", pad_inches = 0.5)
+	renderer.render()
+
+
+show_potential(pot_fxn_set)
+show_orbit(pot_fxn_set, backend)
+
+# show the profiler in the sidebar, if it's turned on
+profiler_panel()
@@ -2,27 +2,30 @@
 # Milky Way and see how they impact the rotation curve, orbits and motion of particles in the Milky Way — both individually
 # and summed together.
 
-from galpy.util.conversion import get_physical
-import numexpr
-import matplotlib.pyplot as plt
-from astropy import units
-from galpy.util import conversion
-from galpy import orbit 
-from galpy.potential import plotPotentials, calcRotcurve, PowerSphericalPotentialwCutoff, MiyamotoNagaiPotential, NFWPotential, KeplerPotential
-import numpy
 import streamlit as st
 
-# initialize the bulge potential, disk potential and dark matter halo potential
+from orbit_animation import get_animation
+from image_cache import show_image
+from interactive_plots import curves_chart, plot_backend, show_chart
+from milky_way import RADII, components, superpose, superposition_image
+from figure_manager import new_figure, show_figure
+from profiler import profiler_panel, start_run
+from startup import prewarm, wait_for_imports
 
-bp = PowerSphericalPotentialwCutoff(alpha=1.8,rc=1.9/8.,normalize=0.05)
-mp = MiyamotoNagaiPotential(a=3./8.,b=0.28/8.,normalize=.6)
-np = NFWPotential(a=16/8.,normalize=.35)
+# collect the timing records of this run of the page, for the profiler in the sidebar
+start_run("Understanding the Milky Way Potential")
 
-galaxy = []
+# import galpy, astropy and matplotlib in the background, in case the visitor came straight to this page — and wait for them, since
+# the page needs them straight away
+prewarm()
+wait_for_imports()
 
-# create a list of radii at which to evaluate the rotation curve
+# the bulge, disk, dark matter halo and black hole potentials — they never change, so they're made once for every session, and their
+# potentials on the contour grid and rotation curves are precomputed (see milky_way.py)
+milkyway = components()
 
-r_s = numpy.linspace(0.01, 10, 1000)
+# the radii at which the rotation curves are evaluated
+r_s = RADII
 
 st.markdown("## Understanding the Milky Way Potential")
 st.markdown("Now that you've had a chance to look at general potentials and understand how particles behave in them, in this module, we will look at \
@@ -44,86 +47,68 @@ disk = st.checkbox("Add disk?")
 darkmatter = st.checkbox("Add dark matter?")
 blackhole = st.checkbox("Add black hole?")
 
-fig, ax = plt.subplots()
+# the names of the MW components that are checked off, and the list of their potentials
 
-# for each MW component, calculate the rotation curve of the individual component, append the potential to the list and plot the separate rotation curve
+names = [name for name, checked in (("bulge", bulge), ("disk", disk), ("halo", darkmatter), ("black hole", blackhole)) if checked]
+galaxy = [milkyway[name] for name in names]
 
-if bulge == True:
-	rc_bp = calcRotcurve(bp, r_s)
-	galaxy.append(bp)
-	ax.plot(r_s, rc_bp, label = "Bulge Potential")
+backend = plot_backend()
 
-if disk == True:
-	rc_mp = calcRotcurve(mp, r_s)
-	ax.plot(r_s, rc_mp, label = "Disk Potential")
-	galaxy.append(mp)
+# if there are no galaxy components checked off and put into the list, there is nothing to show
 
-if darkmatter == True:
-	rc_np = calcRotcurve(np, r_s)
-	ax.plot(r_s, rc_np, label = "Dark Matter, NFW Potential")
-	galaxy.append(np)
+if len(galaxy) > 0:
 
-if blackhole == True:
-	milkyway_bh = KeplerPotential(amp=4*10**6./conversion.mass_in_msol(220.,8.))
-	rc_bh = calcRotcurve(milkyway_bh, r_s)
-	ax.plot(r_s, rc_bh, label = "Black Hole Potential")
-	galaxy.append(milkyway_bh)
-
-# if there are no galaxy components checked off and put into the list, do nothing at all
-
-if len(galaxy) == 0:
-
-	pass
-
-else:  
-
-	# set title, labels and legend for the rotation curve plot
-
-	ax.set_title("Rotation Curves of Components of the Milky Way Galaxy")
-	ax.set_xlabel(r"$R/R_0$")
-	ax.set_ylabel(r"$v_c(R)/v_c(R_0)$")
-	ax.legend()
-
-	# calculate the total rotation curve
-	rot_curve = calcRotcurve(galaxy, r_s)
+	# put together the potential and the rotation curves of the checked components from their precomputed tables — the potentials
+	# simply add, and so do the squared circular velocities of the total rotation curve
+	curves, rot_curve = superpose(names)[1:]
 
 	st.markdown("Here are the rotation curves for each individual component of the Milky Way:")
 
-	# plot the figure with the individual components
-	st.pyplot(fig)
-
-	fig_total, ax_total = plt.subplots()
-
-	# plot the total rotation curve, also set the titles and axis labels for the total rotation curve plot
-	ax_total.plot(r_s, rot_curve)
-	ax_total.set_xlabel(r"$R/R_0$")
-	ax_total.set_ylabel(r"$v_c(R)/v_c(R_0)$")
-	ax_total.set_title(r"Total Rotation Curve of the Milky Way Galaxy")
+	# plot the individual components, either drawn by the browser or as a matplotlib figure with its title, labels and legend
+	if backend == "interactive":
+		show_chart(curves_chart(r_s, curves, "Rotation Curves of Components of the Milky Way Galaxy", "R/R_0", "v_c(R)/v_c(R_0)"))
+	else:
+		fig, ax = new_figure()
+		for label, curve in curves.items():
+			ax.plot(r_s, curve, label = label)
+		ax.set_title("Rotation Curves of Components of the Milky Way Galaxy")
+		ax.set_xlabel(r"$R/R_0$")
+		ax.set_ylabel(r"$v_c(R)/v_c(R_0)$")
+		ax.legend()
+		show_figure(fig)
 
 	st.markdown("Here is the rotation curve for the sum of the components of the Milky Way:")
 
-	# show the total rotation curve plot
-	st.pyplot(fig_total)
-
-	# initialize and integrate the orbit over the age of the Milky Way
-	times = numpy.linspace(0.,13.6, 3001)*units.Gyr
-	orbits = orbit.Orbit(**get_physical(galaxy))
-	orbits.integrate(times, galaxy)
+	# plot the total rotation curve, also set the titles and axis labels for the total rotation curve plot
+	if backend == "interactive":
+		show_chart(curves_chart(r_s, {"Total": rot_curve}, "Total Rotation Curve of the Milky Way Galaxy", "R/R_0", "v_c(R)/v_c(R_0)"))
+	else:
+		fig_total, ax_total = new_figure()
+		ax_total.plot(r_s, rot_curve)
+		ax_total.set_xlabel(r"$R/R_0$")
+		ax_total.set_ylabel(r"$v_c(R)/v_c(R_0)$")
+		ax_total.set_title(r"Total Rotation Curve of the Milky Way Galaxy")
+		show_figure(fig_total)
+	st.caption("Computed by: " + ("adding the precomputed components in quadrature" if len(names) > 1 else "the precomputed component"))
 
 	st.markdown("Below is a plot of the potential for the Milky Way with the components selected, over each value of R and \
 		z. The darker regions are areas where the magnitude of the potential is higher — so we can see that the potential \
 		increases as the object gets closer to the center.")
 
-	# plot the potential at each value of R and z
-	density = plotPotentials(galaxy)
-	st.pyplot(density.get_figure())
+	# plot the potential at each value of R and z, added up from the precomputed grids of the components — the image of the plot is
+	# cached, so the same components are only drawn once
+	density = superposition_image(names)
+	show_image(density)
 
-	# take the raw html of the 2D animated orbit and plot it
+	# take the raw html of the 2D animated orbit, integrated over the age of the Milky Way, and plot it
 	st.markdown("See how the movement of the particle changes depending on the components we include. In two dimensions...")
-	raw_html = orbits.animate()._repr_html_()
+	raw_html = get_animation(galaxy, 13.6, d1 = 'R', d2 = 'z', height = 500)
 	st.components.v1.html(raw_html, height = 500)
 
 	# take the raw html of the 3D animated orbit and plot it
 	st.markdown("And in three dimensions...")
-	raw_html_3d = orbits.animate3d(mw_plane_bg = True)._repr_html_()
+	raw_html_3d = get_animation(galaxy, 13.6, d1 = 'x', d2 = 'y', d3 = 'z', height = 800, plane = True)
 	st.components.v1.html(raw_html_3d, height = 800)
+
+# show the profiler in the sidebar, if it's turned on
+profiler_panel()
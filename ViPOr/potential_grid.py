@@ -0,0 +1,157 @@
+# This file evaluates potentials on a grid in R and z, and draws the contour maps of the potential shown on the orbit pages. It replaces
+# galpy.potential.plotPotentials, which evaluates the potential point by point on a fresh grid every time it is called: here the whole
+# grid is evaluated with a single vectorized call, and kept in the shared result store (see result_store.py) keyed by the potential's
+# fingerprint and the grid, so moving a slider that only changes the orbit doesn't evaluate the potential again.
+
+import numpy
+
+from figure_manager import new_figure
+from image_cache import cached_figure
+from orbit_cache import potential_fingerprint
+from profiler import stage, timed
+import result_store
+
+# the default grid, in galpy's natural units — the same as galpy.potential.plotPotentials
+GRID = {"rmin": 0., "rmax": 1.5, "nrs": 21, "zmin": -0.5, "zmax": 0.5, "nzs": 21, "phi": 0.}
+
+# the number of grids kept in the cache
+MAX_ENTRIES = 256
+
+_grids = result_store.region("potential grids", max_entries = MAX_ENTRIES)
+
+
+@timed("potential grid")
+def evaluate_grid(pot_fxn, rmin, rmax, nrs, zmin, zmax, nzs, phi):
+	'''
+	Evaluates a potential on a regular grid in R and z, in galpy's natural units.
+
+	Inputs
+	--------
+	pot_fxn: the potential function (or a list of potentials)
+	rmin, rmax, nrs: the smallest and largest radius of the grid, and the number of radii
+	zmin, zmax, nzs: the smallest and largest height of the grid, and the number of heights
+	phi: the azimuth at which the potential is evaluated
+
+	Outputs:
+	-------
+	Rs: the radii of the grid
+	zs: the heights of the grid
+	potRz: the potential at each radius (first index) and height (second index), with nan where it's infinite
+	'''
+
+	from galpy.potential import evaluatePotentials
+
+	Rs = numpy.linspace(rmin, rmax, nrs)
+	zs = numpy.linspace(zmin, zmax, nzs)
+	R, z = numpy.meshgrid(Rs, zs, indexing = "ij")
+
+	with numpy.errstate(all = "ignore"):
+		try:
+			potRz = numpy.asarray(evaluatePotentials(pot_fxn, R, z, phi = phi, use_physical = False), dtype = numpy.float64)
+		except (ValueError, TypeError):
+			# a few potentials (e.g. the homogeneous sphere) only take scalar inputs, so fall back to evaluating them point by point
+			potRz = numpy.array([[evaluatePotentials(pot_fxn, r, h, phi = phi, use_physical = False) for h in zs] for r in Rs])
+
+	potRz[~numpy.isfinite(potRz)] = numpy.nan
+	return Rs, zs, potRz
+
+
+def potential_grid(pot_fxn, **grid_spec):
+	'''
+	Returns a potential evaluated on a grid in R and z, only evaluating it if the same potential on the same grid isn't cached.
+
+	Inputs
+	--------
+	pot_fxn: the potential function (or a list of potentials)
+	grid_spec: any of the entries of GRID, to change the default grid
+
+	Outputs:
+	-------
+	the same as evaluate_grid, which must not be modified by the caller
+	'''
+
+	spec = dict(GRID, **grid_spec)
+	key = (potential_fingerprint(pot_fxn),) + tuple(float(spec[name]) for name in sorted(spec))
+
+	return _grids.get_or_compute(key, evaluate_grid, pot_fxn, spec["rmin"], spec["rmax"], int(spec["nrs"]), spec["zmin"], spec["zmax"],
+		int(spec["nzs"]), spec["phi"])
+
+
+def plot_potential(pot_fxn, ncontours = 21, **grid_spec):
+	'''
+	Draws the contour map of a potential in R and z, in the same style as galpy.potential.plotPotentials.
+
+	Inputs
+	--------
+	pot_fxn: the potential function (or a list of potentials)
+	ncontours: the number of contours
+	grid_spec: any of the entries of GRID, to change the default grid
+
+	Outputs:
+	-------
+	density: the figure with the contour plot of the potential
+	'''
+
+	from galpy.util import conversion
+	from galpy.util.conversion import get_physical
+
+	spec = dict(GRID, **grid_spec)
+	Rs, zs, potRz = potential_grid(pot_fxn, **grid_spec)
+
+	# if the potential was set up with physical units, the axes are in kpc, otherwise they're in units of R_0
+	if conversion.physical_output(pot_fxn, {}, "density")[0]:
+		ro = get_physical(pot_fxn)["ro"]
+		extent = [spec["rmin"]*ro, spec["rmax"]*ro, spec["zmin"]*ro, spec["zmax"]*ro]
+		xlabel, ylabel = r"$R\,(\mathrm{kpc})$", r"$z\,(\mathrm{kpc})$"
+	else:
+		extent = [spec["rmin"], spec["rmax"], spec["zmin"], spec["zmax"]]
+		xlabel, ylabel = r"$R/R_0$", r"$z/R_0$"
+
+	return draw_contours(potRz, extent, xlabel, ylabel, ncontours)
+
+
+def draw_contours(potRz, extent, xlabel, ylabel, ncontours = 21):
+	'''
+	Draws the contour map of a potential that has already been evaluated on a grid (e.g. by potential_grid).
+
+	Inputs
+	--------
+	potRz: the potential at each radius (first index) and height (second index), with nan where it's infinite
+	extent: the smallest and largest radius and height of the grid, in the units of the axes
+	xlabel, ylabel: the labels of the axes
+	ncontours: the number of contours
+
+	Outputs:
+	-------
+	density: the figure with the contour plot of the potential
+	'''
+
+	with stage("contour plot"):
+		fig, ax = new_figure()
+		ax.imshow(potRz.T, origin = "lower", cmap = "gist_gray", extent = extent,
+			aspect = 0.75*(extent[1] - extent[0])/(extent[3] - extent[2]))
+		if numpy.isfinite(potRz).any() and numpy.nanmax(potRz) > numpy.nanmin(potRz):
+			levels = numpy.linspace(numpy.nanmin(potRz), numpy.nanmax(potRz), ncontours)
+			ax.contour(potRz.T, levels = levels, colors = "k", linestyles = "-", extent = extent, origin = "lower")
+		ax.set_xlabel(xlabel)
+		ax.set_ylabel(ylabel)
+
+	return fig
+
+
+def potential_image(pot_fxn, ncontours = 21, **grid_spec):
+	'''
+	Returns the image of the contour map of a potential drawn by plot_potential, which is only drawn if it isn't in the image cache yet.
+	The image is identified by the fingerprint of the potential, the number of contours and the grid.
+	'''
+
+	data = (potential_fingerprint(pot_fxn), ncontours, sorted(dict(GRID, **grid_spec).items()))
+	return cached_figure(plot_potential, pot_fxn, ncontours, data = data, **grid_spec)
+
+
+def cache_info():
+	'''
+	Reports the number of hits, misses and evictions of the grid cache, and the number of grids it holds.
+	'''
+
+	return _grids.info()
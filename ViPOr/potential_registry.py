@@ -0,0 +1,204 @@
+# This file is the registry of the potentials that ViPOr's pages offer. Each potential is described once, declaratively — its galpy class,
+# the sliders of its parameters (label, range and step, and whether the parameter is a length in kpc), and the text and equation the pages
+# show for it — and the selectboxes, sliders and potentials of the pages, the orbit lattice and vipor-render are all generated from it.
+# Potentials are also interned here: the pages ask for the same few (class, parameters) combinations over and over on every rerun, so
+# each combination is built once and the same instance is handed back to every session, from a region of the shared result store.
+# Interned potentials are shared, so they must never be modified.
+
+from collections import OrderedDict
+
+import natural_units
+import result_store
+
+# the number of interned potentials we keep
+MAX_ENTRIES = 256
+
+_potentials = result_store.region("potentials", max_entries = MAX_ENTRIES)
+
+
+class Parameter:
+	'''
+	One parameter of a potential, with the slider that sets it.
+
+	Inputs
+	--------
+	keyword: the name of the parameter in the galpy class
+	label: the label of the slider
+	min_value, max_value, step: the range and the step of the slider
+	kpc: whether the parameter is a length in kpc, which is converted to natural units before it is passed to galpy
+	'''
+
+	def __init__(self, keyword, label, min_value, max_value, step, kpc = False):
+		self.keyword = keyword
+		self.label = label
+		self.min_value = min_value
+		self.max_value = max_value
+		self.step = step
+		self.kpc = kpc
+
+	def slider_range(self):
+		'''
+		Returns the (start, stop, step) of the parameter's slider.
+		'''
+
+		return (self.min_value, self.max_value, self.step)
+
+
+class PotentialSpec:
+	'''
+	The description of a potential that the pages offer.
+
+	Inputs
+	--------
+	name: the name of the potential, as it is shown on the pages
+	galpy_class: the name of the potential's class in galpy.potential
+	parameters: the Parameters of the potential, in the order of its sliders
+	group: the pages the potential is offered on ("spherical", "axisymmetric" or "triaxial"), or None if it isn't on any page
+	description: the parameters the user can modify, as a sentence fragment
+	equation: the equation, in latex, of the mass density or the potential
+	density_string: the text that introduces the equation shown on the pages
+	latex: the equation shown on the pages, if it's different from equation
+	'''
+
+	def __init__(self, name, galpy_class, parameters, group, description, equation, density_string, latex = None):
+		self.name = name
+		self.galpy_class = galpy_class
+		self.parameters = tuple(parameters)
+		self.group = group
+		self.description = description
+		self.equation = equation
+		self.density_string = density_string
+		self.latex = latex or equation
+
+	def build(self, values):
+		'''
+		Creates a new galpy potential from the values of the parameters, in the units of the sliders.
+		'''
+
+		# galpy's potentials take a while to import, so they're only imported once a potential is set up
+		import galpy.potential
+		pot_class = getattr(galpy.potential, self.galpy_class)
+		return pot_class(**{parameter.keyword: natural_units.length(value) if parameter.kpc else value
+			for parameter, value in zip(self.parameters, values)})
+
+
+DENSITY_STRING = "The equation for the density of this distribution is:"
+
+REGISTRY = OrderedDict((spec.name, spec) for spec in (
+	PotentialSpec("Power Spherical Potential", "PowerSphericalPotential",
+		[Parameter("alpha", "Power Law Exponent, " + r"$\alpha$", 0.0, 3.0, 0.25)], "spherical",
+		r"$\alpha$, the power law exponent", r'''\rho(r)= \frac{\text{amp}}{r^{3}} \left(\frac{r_1}{r}\right)^\alpha''', DENSITY_STRING),
+	PotentialSpec("Spherical Shell Potential", "SphericalShellPotential",
+		[Parameter("a", "Shell Radius, " + r"$a$", 1, 50, 1, kpc = True)], "spherical",
+		r"$a$, the radius of the shell", r'''\rho(r)= \frac{\text{amp}}{4\pi a^2} \delta(r-a)''', DENSITY_STRING),
+	PotentialSpec("Homogeneous Sphere Potential", "HomogeneousSpherePotential",
+		[Parameter("R", "Sphere Radius, " + r"$R$", 1, 50, 1, kpc = True)], "spherical",
+		r"$R$, the radius of the sphere", r'''\rho(r)= \rho_0''', DENSITY_STRING),
+	# we only have the form of the plummer potential, not of its mass density
+	PotentialSpec("Plummer Potential", "PlummerPotential",
+		[Parameter("b", "Scale Parameter, " + r"$b$", 1, 20, 1)], "spherical",
+		r"$b$, the scale parameter", r'''\Phi(R, z) = \frac{\text{amp}}{\sqrt{R^2 + z^2 + b^2}''',
+		"This potential is characterized by the equation:", latex = r'''\Phi(R,z) = - \frac{\text{amp}}{\sqrt{R^2 + z^2 + b^2}}'''),
+	PotentialSpec("Double Exponential Disk Potential", "DoubleExponentialDiskPotential",
+		[Parameter("hr", "Scale Length, " + r"$h_r$", 1, 100, 1, kpc = True),
+			Parameter("hz", "Scale Height, " + r"$h_z$", 1, 20, 1, kpc = True)], "axisymmetric",
+		r"the disk scale-length, $h_r$, and scale-height, $h_z$", r"\rho (R, z) = \text{amp} \, \text{exp}( -R/h_R - |z|/h_z)",
+		"The density of this distribution is given by the expression:"),
+	PotentialSpec("Power Triaxial Potential", "PowerTriaxialPotential",
+		[Parameter("alpha", "Power-law Exponent, " + r"$\alpha$", 0.5, 5.0, 0.25),
+			Parameter("b", "Y-to-X Axis Ratio, " + r"$b$", 0.5, 8.0, 0.25),
+			Parameter("c", "Z-to-X Axis Ratio, " + r"$c$", 0.5, 8.0, 0.25)], "triaxial",
+		r"the power-law exponent, $\alpha$, as well as $b$, the y-to-x axis ratio, and $c$, the z-to-x axis ratio",
+		r'''\rho(r)= \frac{\text{amp}}{r_1^{3}} \left(\frac{r_1}{m}\right)^\alpha''',
+		"The general equation for the density of a power-law triaxial distribution is:"),
+	# this one isn't offered on any page, but set_potential has always been able to make it
+	PotentialSpec("Two Power Spherical Potential", "TwoPowerSphericalPotential",
+		[Parameter("alpha", "Inner Power Law Exponent, " + r"$\alpha$", 0.0, 3.0, 0.25),
+			Parameter("beta", "Outer Power Law Exponent, " + r"$\beta$", 3.0, 6.0, 0.25)], None,
+		r"$\alpha$ and $\beta$, the inner and outer power law exponents",
+		r'''\rho(r) = \frac{\text{amp}}{4\pi a^3} \frac{1}{(r/a)^\alpha (1+r/a)^{\beta-\alpha}}''', DENSITY_STRING),
+))
+
+
+def potential_names(group = None):
+	'''
+	Returns the names of the potentials offered on a group of pages ("spherical", "axisymmetric" or "triaxial"), or of every
+	potential that is offered on a page if no group is given.
+	'''
+
+	return [name for name, spec in REGISTRY.items() if spec.group is not None and (group is None or spec.group == group)]
+
+
+def get_spec(pot_name):
+	'''
+	Returns the PotentialSpec of a potential, by its name.
+	'''
+
+	try:
+		return REGISTRY[pot_name]
+	except KeyError:
+		raise ValueError("unknown potential: %s" % pot_name)
+
+
+def get_potential(pot_name, *values):
+	'''
+	Returns the potential with the given parameters — the same instance every time it is asked for, as long as it is in the cache.
+
+	Inputs
+	--------
+	pot_name: the name of the potential, one of the keys of REGISTRY
+	values: the values of its parameters, in the units and in the order of its sliders
+
+	Outputs:
+	-------
+	pot_fxn_set: the initialized potential, which must not be modified
+	'''
+
+	spec = get_spec(pot_name)
+	if len(values) != len(spec.parameters):
+		raise ValueError("%s takes %d parameters, not %d" % (pot_name, len(spec.parameters), len(values)))
+
+	# sliders hand back ints or floats depending on their step, so the values are normalized to floats — both for the key and for galpy,
+	# so that the same parameters always give the same potential, and the same orbit cache and lattice keys
+	values = tuple(float(value) for value in values)
+	return _potentials.get_or_compute((spec.galpy_class, values), _intern, spec, values)
+
+
+def _intern(spec, values):
+	'''
+	Builds a potential that is about to be interned.
+	'''
+
+	pot_fxn_set = spec.build(values)
+
+	# the fingerprint of an interned potential never changes, so the orbit cache can remember it instead of recomputing it on every rerun
+	from orbit_cache import remember_fingerprint
+	remember_fingerprint(pot_fxn_set)
+	return pot_fxn_set
+
+
+def parameter_sliders(pot_name):
+	'''
+	Shows the sliders of a potential's parameters on the page, and returns their values in order.
+	'''
+
+	import streamlit as st
+
+	return [st.slider(parameter.label, min_value = parameter.min_value, max_value = parameter.max_value, step = parameter.step)
+		for parameter in get_spec(pot_name).parameters]
+
+
+def cache_info():
+	'''
+	Reports the state of the cache of interned potentials.
+	'''
+
+	return _potentials.info()
+
+
+def clear_cache():
+	'''
+	Empties the cache of interned potentials.
+	'''
+
+	_potentials.clear()
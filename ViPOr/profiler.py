@@ -0,0 +1,244 @@
+# This file times the stages that ViPOr's pages spend their time in — integrating orbits, extracting their coordinates, transforming them
+# to RA and Dec, drawing and rasterizing figures, encoding animations, evaluating potential grids and rotation curves. Each stage is wrapped
+# with stage() or timed(), which emits a timing record. The records of one run of a page are collected together (including those emitted
+# by the worker threads that render the page progressively), and can be shown in an opt-in panel in the sidebar, along with the admin
+# view of the shared result store that ViPOr's caches live in. Setting the VIPOR_PROFILE_LOG environment variable to a file name also appends every record to that file, as
+# one line of JSON per record.
+
+import contextlib
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+
+# the file that timing records are appended to, if any
+LOG_PATH = os.environ.get("VIPOR_PROFILE_LOG")
+
+_current_run = contextvars.ContextVar("vipor_profile_run", default = None)
+_log_lock = threading.Lock()
+
+
+class ProfileRun:
+	'''
+	The timing records of one run of a page.
+	'''
+
+	def __init__(self, page):
+		self.page = page
+		self.started = time.perf_counter()
+		self.finished = False
+		self.section = False
+		self.panel = None
+		self.records = []
+		self._lock = threading.Lock()
+
+	def add(self, record):
+		with self._lock:
+			self.records.append(record)
+
+	def breakdown(self):
+		'''
+		Adds up the records by stage.
+
+		Outputs:
+		-------
+		stages: a dictionary with the number of calls and the total time (in seconds) of each stage, in the order the stages first ran
+		'''
+
+		stages = {}
+		with self._lock:
+			for record in self.records:
+				entry = stages.setdefault(record["stage"], {"calls": 0, "seconds": 0.})
+				entry["calls"] += 1
+				entry["seconds"] += record["seconds"]
+		return stages
+
+
+def start_run(page):
+	'''
+	Starts collecting the timing records of a run of a page. Every record emitted afterwards on this thread, or on a worker thread the
+	work was handed to with progressive.submit, belongs to this run.
+
+	Inputs
+	--------
+	page: the name of the page
+
+	Outputs:
+	-------
+	run: the ProfileRun collecting the records
+	'''
+
+	run = ProfileRun(page)
+	_current_run.set(run)
+	return run
+
+
+def start_section(section):
+	'''
+	Starts collecting the timing records of a section of a page that is run again on its own (see progressive.fragment), whose
+	profiler is shown in the place the run of the page reserved for it.
+
+	Inputs
+	--------
+	section: the name of the section
+
+	Outputs:
+	-------
+	run: the ProfileRun collecting the records
+	'''
+
+	import streamlit as st
+
+	run = start_run(section)
+	run.section = True
+	run.panel = st.session_state.get("vipor_profiler_panel")
+	return run
+
+
+def current_run():
+	'''
+	Returns the ProfileRun of the page being run, or None outside of a page (e.g. in the benchmarks or vipor-render). Once the run has
+	finished (see profiler_panel), it may still be returned to a section of the page that is run again on its own, which then starts a
+	run of its own (see progressive.fragment).
+	'''
+
+	return _current_run.get()
+
+
+def record(stage_name, seconds, **details):
+	'''
+	Emits a timing record: adds it to the current run, and appends it to the log file if there is one.
+	'''
+
+	entry = {"stage": stage_name, "seconds": seconds, "thread": threading.current_thread().name, "time": time.time()}
+	entry.update(details)
+
+	run = _current_run.get()
+	if run is not None:
+		entry["page"] = run.page
+		run.add(entry)
+
+	if LOG_PATH:
+		with _log_lock, open(LOG_PATH, "a") as log_file:
+			log_file.write(json.dumps(entry) + "\n")
+
+
+@contextlib.contextmanager
+def stage(stage_name, **details):
+	'''
+	Times the code inside a with block as one stage, e.g. "with stage('rasterization'): ...".
+	'''
+
+	start = time.perf_counter()
+	try:
+		yield
+	finally:
+		record(stage_name, time.perf_counter() - start, **details)
+
+
+def timed(stage_name):
+	'''
+	Decorates a function so that every call to it is timed as one stage.
+	'''
+
+	def decorate(fxn):
+		@functools.wraps(fxn)
+		def wrapper(*args, **kwargs):
+			with stage(stage_name):
+				return fxn(*args, **kwargs)
+		return wrapper
+	return decorate
+
+
+def _fill_panel(container, run, what):
+	'''
+	Shows the profiler in a Streamlit container: the time each stage took in a run, the live figures, and the admin views of the result
+	store and the integrators.
+	'''
+
+	container.markdown("### Profiler")
+	if run is not None:
+		container.markdown("This run of %s took **%.0f ms**:" % (what, 1000.*(time.perf_counter() - run.started)))
+		container.table([{"stage": name, "calls": entry["calls"], "time (ms)": round(1000.*entry["seconds"], 1)}
+			for name, entry in run.breakdown().items()])
+		container.caption("Stages that ran in the background overlap, so their times can add up to more than the run.")
+
+	from figure_manager import figure_panel
+	figure_panel(container)
+
+	from result_store import store_panel
+	store_panel(container)
+
+	from integrators import integrator_panel
+	integrator_panel(container)
+
+
+def reserve_panel():
+	'''
+	Reserves the place of the profiler in the sidebar while a page runs, before the first of its sections (see progressive.fragment),
+	so a section run again on its own can show its stages in the same place. This is called outside of the sections.
+	'''
+
+	import streamlit as st
+
+	run = _current_run.get()
+	if run is None or run.finished or run.section or run.panel is not None or not st.session_state.get("vipor_profiler"):
+		return
+	run.panel = st.session_state["vipor_profiler_panel"] = st.sidebar.empty()
+
+
+def claim_panel():
+	'''
+	Writes to the place reserved for the profiler from inside a section, while the page runs. Streamlit only lets a section that is run
+	again on its own write to a place outside of it that the section wrote to during the run of the page.
+	'''
+
+	run = _current_run.get()
+	if run is not None and not run.section and run.panel is not None:
+		run.panel.empty()
+
+
+def profiler_panel():
+	'''
+	Shows the profiler in the sidebar, if the user turns it on: the time each stage took in the current run of the page, the number of
+	live figures, the size, hit rates and evictions of the regions of the shared result store, and the integrator chosen for each kind
+	of potential. This is called at the very end of a page, once all of its stages have run, and finishes the page's run. The panel is
+	shown in the place reserved for it (see reserve_panel), which section_panel fills again when a section of the page is run again on
+	its own.
+	'''
+
+	import streamlit as st
+
+	run = _current_run.get()
+	if run is not None:
+		run.finished = True
+
+	if not st.sidebar.checkbox("Show profiler", key = "vipor_profiler"):
+		st.session_state.pop("vipor_profiler_panel", None)
+		return
+
+	panel = run.panel if run is not None and run.panel is not None else st.sidebar.empty()
+	st.session_state["vipor_profiler_panel"] = panel
+	_fill_panel(panel.container(), run, "the page")
+
+
+def section_panel(section):
+	'''
+	Finishes the run of a section of a page that was run again on its own (see progressive.fragment), and shows its stages in the
+	profiler in the sidebar in place of those of the last run of the page, if the profiler is turned on.
+
+	Inputs
+	--------
+	section: the name of the section
+	'''
+
+	import streamlit as st
+
+	run = _current_run.get()
+	if run is not None:
+		run.finished = True
+
+	if run is not None and run.panel is not None and st.session_state.get("vipor_profiler"):
+		_fill_panel(run.panel.container(), run, "the section *%s*" % section)
@@ -0,0 +1,227 @@
+# This file renders the orbit pages progressively. The expensive pieces of a page — integrating the orbit, building its figures, evaluating
+# the contour map of the potential and encoding the animations — are computed concurrently in a pool of worker threads, while the page
+# lays out its text with an empty placeholder wherever one of them goes. Each placeholder is then filled as soon as its piece is ready,
+# so the first plots appear long before the last animation is done. Only the page's own thread ever writes to streamlit. Each page is also
+# split into sections (see fragment) that are run again on their own when only their own widgets change, and the plots and animations
+# sit in collapsed sections (see on_demand) that are only computed once they're opened, and kept for the rest of the session.
+
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+import contextvars
+import functools
+import threading
+
+import streamlit as st
+
+from figure_manager import show_figure
+from image_cache import RenderedImage, show_image
+from interactive_plots import InteractiveChart, show_chart
+from profiler import claim_panel, current_run, reserve_panel, section_panel, start_section
+
+# the number of worker threads shared by every session — galpy's C integrators and NumPy release the GIL, so a few threads overlap well
+MAX_WORKERS = 4
+
+_executor = None
+_lock = threading.Lock()
+
+
+def executor():
+	'''
+	Returns the pool of worker threads, creating it the first time it is needed.
+	'''
+
+	global _executor
+
+	with _lock:
+		if _executor is None:
+			_executor = ThreadPoolExecutor(max_workers = MAX_WORKERS, thread_name_prefix = "vipor-render")
+		return _executor
+
+
+def submit(fxn, *args, after = (), **kwargs):
+	'''
+	Runs a function in the worker pool. Any argument that is a Future is replaced by its result before the function is called, so
+	tasks can be chained: e.g. submit(plot_R_z, trace) draws the figure once the orbit's trace is ready.
+
+	Inputs
+	--------
+	fxn: the function to run
+	args, kwargs: its arguments
+	after: Futures that must be done before the function starts, without being passed to it (e.g. the orbit's trace, before
+	an animation that reads it from the orbit cache)
+
+	Outputs:
+	-------
+	future: the Future of the function's result
+	'''
+
+	# dependencies are always submitted before the tasks that wait for them, so a waiting task never holds up its own dependency
+	context = contextvars.copy_context()
+
+	def run():
+		for dependency in after:
+			dependency.result()
+		resolved = [arg.result() if isinstance(arg, Future) else arg for arg in args]
+		return fxn(*resolved, **kwargs)
+
+	# the task runs in a copy of the caller's context, so its timing records go to the profiler's record of the caller's page
+	return executor().submit(context.run, run)
+
+
+def fragment(fxn):
+	'''
+	Makes a section of a page into a Streamlit fragment: when one of the widgets inside the section changes, only the section is run
+	again (with the same arguments as before), rather than the whole page. Sections called inside a section are run again along with
+	it. A widget that everything on the page depends on (e.g. the parameters of the potential) belongs outside of every section, where
+	changing it runs the whole page again.
+
+	Inputs
+	--------
+	fxn: the function that lays out the section
+
+	Outputs:
+	-------
+	section: the function, as a Streamlit fragment
+	'''
+
+	@functools.wraps(fxn)
+	def section(*args, **kwargs):
+		# a section that runs on its own isn't part of a run of the page (which has finished, if the section is run on the same thread),
+		# so its timing records are collected in a run of their own, which the profiler in the sidebar then shows
+		run = current_run()
+		if run is not None and not run.finished:
+			claim_panel()
+			return fxn(*args, **kwargs)
+		start_section(fxn.__name__)
+		result = fxn(*args, **kwargs)
+		section_panel(fxn.__name__)
+		return result
+
+	streamlit_fragment = st.fragment(section)
+
+	@functools.wraps(fxn)
+	def call(*args, **kwargs):
+		# the place of the profiler is reserved outside of the section, where the page's run writes to the sidebar
+		reserve_panel()
+		return streamlit_fragment(*args, **kwargs)
+
+	return call
+
+
+def on_demand(label, key, expanded = False):
+	'''
+	Adds a collapsible section (a Streamlit expander) whose contents are only computed while it's open: opening or closing it runs the
+	page (or the section of the page it's in) again, and its open property tells whether to compute them, e.g.
+
+		with on_demand("Orbit, in R vs. z", "vipor_R_z") as section:
+			if section.open:
+				...
+
+	Inputs
+	--------
+	label: the label of the section
+	key: the key of its state in st.session_state
+	expanded: whether it starts out open
+
+	Outputs:
+	-------
+	section: the expander
+	'''
+
+	return st.expander(label, expanded = expanded, key = key, on_change = "rerun")
+
+
+def retained(name, inputs, fxn, *args, **kwargs):
+	'''
+	Returns the Future of a result that the session keeps: fxn(*args, **kwargs) is only called (to start computing the result) if the
+	session hasn't asked for the result with the same inputs before. Each session keeps the last result of each name, so closing and
+	reopening a section shows its plot straight away, even if it has been evicted from the shared result store in the meantime.
+
+	Inputs
+	--------
+	name: the name of the result, e.g. "R vs. z" — results with the same name and inputs are the same on every page
+	inputs: everything the result depends on (e.g. the potential, the initial conditions and the plotting backend)
+	fxn: the function that starts computing the result and returns its Future, e.g. submit
+	args, kwargs: its arguments
+
+	Outputs:
+	-------
+	future: the Future of the result
+	'''
+
+	results = st.session_state.setdefault("vipor_results", {})
+	entry = results.get(name)
+	if entry is not None and entry[0] == inputs:
+		future = entry[1]
+		# a result that failed is computed again, rather than kept
+		if not (future.done() and future.exception() is not None):
+			return future
+
+	future = fxn(*args, **kwargs)
+	results[name] = (inputs, future)
+	return future
+
+
+def _show_figure_or_image(result, **kwargs):
+	if isinstance(result, tuple):
+		for item in result:
+			_show_figure_or_image(item, **kwargs)
+	elif isinstance(result, InteractiveChart):
+		show_chart(result)
+	elif isinstance(result, RenderedImage):
+		show_image(result, **kwargs)
+	else:
+		show_figure(result, **kwargs)
+
+
+class ProgressiveRenderer:
+	'''
+	Collects the placeholders of a page and fills them, in whatever order their contents become ready. A new renderer is made on
+	every run of a page.
+	'''
+
+	def __init__(self, message = "Computing..."):
+		self.message = message
+		self._slots = []
+
+	def show(self, future, display, **kwargs):
+		'''
+		Adds a placeholder at the current position on the page, which will be filled by calling display(result, **kwargs) with the
+		result of the future.
+		'''
+
+		slot = st.empty()
+		slot.caption(self.message)
+		self._slots.append((slot, future, display, kwargs))
+
+	def figure(self, future, **kwargs):
+		'''
+		Adds a placeholder for a figure, which is shown (and released) with show_figure once it's ready — or, if the future gives
+		the rendered image of the figure or an interactive chart instead, with show_image or show_chart. A future that gives a tuple
+		of figures fills the placeholder with each of them, one below the other.
+		'''
+
+		self.show(future, _show_figure_or_image, **kwargs)
+
+	def html(self, future, height):
+		'''
+		Adds a placeholder for the HTML of an animation.
+		'''
+
+		self.show(future, st.components.v1.html, height = height)
+
+	def render(self):
+		'''
+		Waits for the contents of the placeholders, and fills each placeholder as soon as its content is ready. A piece that fails
+		(e.g. an orbit that galpy can't integrate for the chosen parameters) fills its own placeholder with the error, and the others
+		are still shown.
+		'''
+
+		pending = {future: (slot, display, kwargs) for slot, future, display, kwargs in self._slots}
+		self._slots = []
+		for future in as_completed(pending):
+			slot, display, kwargs = pending[future]
+			with slot:
+				try:
+					display(future.result(), **kwargs)
+				except Exception as exc:
+					slot.error("This plot couldn't be made — %s: %s" % (type(exc).__name__, exc))
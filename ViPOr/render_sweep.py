@@ -0,0 +1,287 @@
+# This file renders ViPOr's plots, trajectories and animations in bulk, without the streamlit pages. It takes a sweep over a potential's
+# parameters and the orbit's integration time, initial radius and initial height, renders every combination in a pool of worker processes,
+# and writes the results to an output directory, one sub-directory per orbit. A manifest records every finished orbit with the time its
+# stages took, so a sweep that was interrupted picks up where it left off when it is run again.
+#
+# Once ViPOr is installed, run it as, for example:
+#     vipor-render --potential "Plummer Potential" --params 1:20:1 --years 1:14:1 --radii 5:50:5 --heights 0 --out assets
+# or from the ViPOr directory as "python render_sweep.py ...". A sweep can also be written as a JSON file of the same options, e.g.
+#     {"potential": "Plummer Potential", "params": ["1:20:1"], "years": "1:14:1", "radii": [5, 10, 20], "heights": 0}
+# and passed with --spec, where strings are start:stop:step ranges and lists are explicit values.
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import itertools
+import json
+import os
+import re
+import sys
+import time
+
+# the modules next to this one import each other by their bare names, as the streamlit pages do, so this directory has to be on the path
+# when the command is run as an installed entry point
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from orbit_lattice import LATTICE_PARAMS, make_potential, slider_values
+
+# what a sweep can write for each orbit
+OUTPUTS = ("figures", "trajectories", "animations")
+DIMENSIONS = ("2D", "3D")
+
+# the resolution of the figures, in dots per inch
+DPI = 100
+
+# the name of the manifest in the output directory, with one line of JSON per finished orbit
+MANIFEST = "manifest.jsonl"
+
+
+def sweep_values(value):
+	'''
+	Reads the values of one axis of a sweep: a "start:stop:step" range (both ends included), a single number, or a list of values.
+	A string that is neither a number nor a range raises a ValueError.
+	'''
+
+	if isinstance(value, str):
+		parts = [float(part) for part in value.split(":")]
+		if len(parts) not in (1, 3):
+			raise ValueError("%r is not a number or a start:stop:step range" % value)
+		return slider_values(*parts) if len(parts) == 3 else parts
+	if isinstance(value, (list, tuple)):
+		return [float(item) for item in value]
+	return [float(value)]
+
+
+def sweep_jobs(potential, params, years, radii, heights):
+	'''
+	Lists the orbits of a sweep.
+
+	Inputs
+	--------
+	potential: the name of the potential, as in potential_registry
+	params: one entry per parameter of the potential, each in any of the forms read by sweep_values (None for the values of the
+	parameter's slider on the pages)
+	years, radii, heights: the integration times (Gyr), initial radii and initial heights (kpc), in any of the forms read by sweep_values
+
+	Outputs:
+	-------
+	jobs: a list of (pot_name, param, years, R, z) tuples, one per orbit
+	'''
+
+	sliders = LATTICE_PARAMS[potential]
+	params = params or [None]*len(sliders)
+	if len(params) != len(sliders):
+		raise ValueError("%s takes %d parameters, not %d" % (potential, len(sliders), len(params)))
+
+	grids = [slider_values(*slider) if values is None else sweep_values(values) for values, slider in zip(params, sliders)]
+	param_values = grids[0] if len(grids) == 1 else list(itertools.product(*grids))
+	return [(potential, param) + orbit for param in param_values
+		for orbit in itertools.product(sweep_values(years), sweep_values(radii), sweep_values(heights))]
+
+
+def job_name(job):
+	'''
+	Names the sub-directory of an orbit after its potential, parameters and initial conditions.
+	'''
+
+	pot_name, param, years, R, z = job
+	params = "-".join("%g" % value for value in (param if isinstance(param, tuple) else (param,)))
+	slug = re.sub(r"[^a-z0-9]+", "_", pot_name.lower()).strip("_")
+	return "%s_p%s_t%g_R%g_z%g" % (slug, params, years, R, z)
+
+
+def render_job(job, out_dir, outputs = OUTPUTS, dimensions = DIMENSIONS, dpi = DPI):
+	'''
+	Renders one orbit of a sweep (this runs in a worker process), and writes its files.
+
+	Inputs
+	--------
+	job: the orbit, as listed by sweep_jobs
+	out_dir: the output directory of the sweep
+	outputs: what to write, any of OUTPUTS
+	dimensions: which plots and animations to write, any of DIMENSIONS
+	dpi: the resolution of the figures
+
+	Outputs:
+	-------
+	record: the orbit's line of the manifest — its name, status, output files and the time each stage took, in seconds
+	'''
+
+	import matplotlib
+	matplotlib.use("Agg")
+	import numpy
+
+	from figure_manager import release
+	from orbit_animation import get_animation
+	from orbit_cache import get_trace
+	from orbit_trace import OrbitTrace
+	import PlotPotentialandOrbit2D
+	import PlotPotentialandOrbit3D
+	from potential_grid import plot_potential
+
+	figures = {"2D": {"R_z": PlotPotentialandOrbit2D.plot_R_z, "ra_dec": PlotPotentialandOrbit2D.plot_ra_dec,
+			"R_vR": PlotPotentialandOrbit2D.plot_R_vR, "x_y": PlotPotentialandOrbit2D.plot_x_y},
+		"3D": {"x_y_z": PlotPotentialandOrbit3D.plot_x_y_z, "R_vR_z": PlotPotentialandOrbit3D.plot_R_vR_z,
+			"R_vR_vz": PlotPotentialandOrbit3D.plot_R_vR_vz}}
+	animations = {"2D": {"R_z": {"d1": "R", "d2": "z"}, "x_y": {"d1": "x", "d2": "y"}},
+		"3D": {"x_y_z": {"d1": "x", "d2": "y", "d3": "z", "height": 800}}}
+
+	name = job_name(job)
+	pot_name, param, years, R, z = job
+	job_dir = os.path.join(out_dir, name)
+	os.makedirs(job_dir, exist_ok = True)
+	timings = {}
+	files = []
+
+	def write(file_name):
+		files.append(os.path.join(name, file_name))
+		return os.path.join(job_dir, file_name)
+
+	start = time.perf_counter()
+	try:
+		pot_fxn = make_potential(pot_name, param)
+		trace = get_trace(pot_fxn, years, R, z)
+		timings["integration"] = time.perf_counter() - start
+
+		if "trajectories" in outputs:
+			stage = time.perf_counter()
+			numpy.savez_compressed(write("trajectory.npz"), **{series: trace[series] for series in OrbitTrace.SERIES})
+			timings["trajectories"] = time.perf_counter() - stage
+
+		if "figures" in outputs:
+			stage = time.perf_counter()
+			for fig_name, fig in [("potential", plot_potential(pot_fxn, phi = 0.0))] + \
+					[(dim + "_" + fig_name, plot_fxn(trace)) for dim in dimensions for fig_name, plot_fxn in figures[dim].items()]:
+				fig.savefig(write(fig_name + ".png"), dpi = dpi, bbox_inches = "tight", pad_inches = 0.5)
+				release(fig)
+			timings["figures"] = time.perf_counter() - stage
+
+		if "animations" in outputs:
+			stage = time.perf_counter()
+			for dim in dimensions:
+				for anim_name, options in animations[dim].items():
+					with open(write("%s_%s_animation.html" % (dim, anim_name)), "w") as html_file:
+						html_file.write(get_animation(pot_fxn, years, R, z, **options))
+			timings["animations"] = time.perf_counter() - stage
+
+		status, error = "ok", None
+	except Exception as exc:
+		# some parameters aren't allowed (just as on the pages), so a failed orbit is recorded and the sweep carries on
+		status, error = "error", "%s: %s" % (type(exc).__name__, exc)
+
+	timings["total"] = time.perf_counter() - start
+	return {"job": name, "potential": pot_name, "param": param, "years": years, "R": R, "z": z, "status": status, "error": error,
+		"files": files, "timings": timings}
+
+
+def finished_jobs(out_dir):
+	'''
+	Reads the names of the orbits that a previous run of the sweep already rendered, from its manifest.
+	'''
+
+	done = set()
+	manifest_path = os.path.join(out_dir, MANIFEST)
+	if os.path.exists(manifest_path):
+		with open(manifest_path) as manifest:
+			for line in manifest:
+				try:
+					record = json.loads(line)
+				except ValueError:
+					# the last line may have been cut off if the previous run was killed
+					continue
+				if record.get("status") == "ok":
+					done.add(record["job"])
+	return done
+
+
+def render_sweep(jobs, out_dir, outputs = OUTPUTS, dimensions = DIMENSIONS, dpi = DPI, processes = None, progress = print):
+	'''
+	Renders every orbit of a sweep in a pool of worker processes, skipping the orbits that are already in the manifest.
+
+	Inputs
+	--------
+	jobs: the orbits, as listed by sweep_jobs
+	out_dir: the output directory
+	outputs, dimensions, dpi: as for render_job
+	processes: the number of worker processes (one per core by default)
+	progress: a function that is called with a line of text every time an orbit is done
+
+	Outputs:
+	-------
+	counts: a dictionary with the number of orbits that were rendered ("ok"), that failed ("error") and that were skipped because
+	they were already done ("skipped")
+	'''
+
+	os.makedirs(out_dir, exist_ok = True)
+	done = finished_jobs(out_dir)
+	todo = [job for job in jobs if job_name(job) not in done]
+	counts = {"ok": 0, "error": 0, "skipped": len(jobs) - len(todo)}
+
+	# a line that was cut off when the previous run was killed is ended first, so it doesn't swallow the first line of this run
+	manifest_path = os.path.join(out_dir, MANIFEST)
+	cut_off = False
+	if os.path.exists(manifest_path) and os.path.getsize(manifest_path):
+		with open(manifest_path, "rb") as manifest:
+			manifest.seek(-1, os.SEEK_END)
+			cut_off = manifest.read(1) != b"\n"
+
+	with ProcessPoolExecutor(max_workers = processes) as pool, open(manifest_path, "a") as manifest:
+		if cut_off:
+			manifest.write("\n")
+		futures = [pool.submit(render_job, job, out_dir, outputs, dimensions, dpi) for job in todo]
+		for future in as_completed(futures):
+			record = future.result()
+			# each line is flushed as soon as the orbit is done, so an interrupted sweep loses at most the orbits still running
+			manifest.write(json.dumps(record) + "\n")
+			manifest.flush()
+			counts[record["status"]] += 1
+			progress("[%d/%d] %s %s (%.2f s)" % (counts["ok"] + counts["error"], len(todo), record["status"], record["job"],
+				record["timings"]["total"]))
+
+	return counts
+
+
+def main():
+	'''
+	Runs a sweep from the command line.
+	'''
+
+	parser = argparse.ArgumentParser(description = "Render ViPOr's plots, trajectories and animations for a sweep of orbits.")
+	parser.add_argument("--spec", help = "a JSON file with the options of the sweep (options given on the command line take precedence)")
+	parser.add_argument("--potential", choices = list(LATTICE_PARAMS), help = "the potential")
+	parser.add_argument("--params", nargs = "+", help = "the values of each parameter of the potential, as start:stop:step ranges \
+		(default: the values of the parameter's slider)")
+	parser.add_argument("--years", help = "integration times, as start:stop:step (Gyr)")
+	parser.add_argument("--radii", help = "initial radii, as start:stop:step (kpc)")
+	parser.add_argument("--heights", help = "initial heights, as start:stop:step (kpc)")
+	parser.add_argument("--out", help = "the output directory")
+	parser.add_argument("--outputs", nargs = "+", choices = OUTPUTS, help = "what to write for each orbit (default: everything)")
+	parser.add_argument("--dimensions", nargs = "+", choices = DIMENSIONS, help = "which plots and animations to write (default: both)")
+	parser.add_argument("--dpi", type = int, help = "the resolution of the figures (default: %d)" % DPI)
+	parser.add_argument("--processes", type = int, help = "the number of worker processes (default: one per core)")
+	args = parser.parse_args()
+
+	options = {}
+	if args.spec:
+		with open(args.spec) as spec_file:
+			options.update(json.load(spec_file))
+	options.update({key: value for key, value in vars(args).items() if value is not None and key != "spec"})
+
+	for required in ("potential", "years", "radii", "heights", "out"):
+		if required not in options:
+			parser.error("the sweep needs a value for --%s" % required)
+	if options["potential"] not in LATTICE_PARAMS:
+		parser.error("unknown potential: %s" % options["potential"])
+
+	jobs = sweep_jobs(options["potential"], options.get("params"), options["years"], options["radii"], options["heights"])
+	start = time.perf_counter()
+	counts = render_sweep(jobs, options["out"], options.get("outputs", OUTPUTS), options.get("dimensions", DIMENSIONS),
+		options.get("dpi", DPI), options.get("processes"))
+	print("Rendered %d orbits (%d failed, %d already done) in %.1f s; the manifest is %s" % (counts["ok"], counts["error"],
+		counts["skipped"], time.perf_counter() - start, os.path.join(options["out"], MANIFEST)))
+
+	if counts["error"]:
+		sys.exit(1)
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,366 @@
+# This file is ViPOr's shared result store. Every session of the Streamlit server runs in the same process, so a result computed for one
+# session — a potential, an orbit, a potential grid, a rotation curve, an animation or a rendered image — is handed to every other session
+# that asks for it: a classroom of students on the same default sliders integrates each orbit once, not once per student. Each kind of
+# result lives in its own region of the store, with its own limits and counters, but all of the regions share one memory budget, and once
+# it is exceeded the least recently used results of any region are evicted. Identical requests that arrive while a result is still being
+# computed wait for that computation instead of repeating it (single flight). The admin view, in the profiler panel, shows the size, hit
+# rate and evictions of each region.
+
+from collections import OrderedDict
+from concurrent.futures import Future
+import mmap
+import os
+import sys
+import threading
+
+import numpy
+
+# the memory budget (in bytes) shared by every region, unless the VIPOR_STORE_MB environment variable sets it (in MB)
+MAX_BYTES = int(float(os.environ.get("VIPOR_STORE_MB", 1024))*1024**2)
+
+_lock = threading.Lock()
+_regions = OrderedDict()
+_stats = {"bytes": 0}
+
+# every result in the store, as (region name, key), least recently used first
+_lru = OrderedDict()
+
+# the Futures of the results being computed, by (region name, key)
+_inflight = {}
+
+# what a computation that failed hands to the requests waiting for it, which then try it themselves
+_FAILED = object()
+
+
+def _owns_memory(values):
+	'''
+	Tells whether an array holds its own data in memory, rather than being a view of a memory-mapped file (e.g. the orbit lattice).
+	'''
+
+	while values is not None:
+		if isinstance(values, (numpy.memmap, mmap.mmap)):
+			return False
+		values = getattr(values, "base", None)
+	return True
+
+
+def estimate_size(value):
+	'''
+	Estimates the memory taken up by a result: arrays by their data (memory-mapped arrays take up none), bytes and strings by their
+	length, dictionaries, lists and tuples by their contents, objects that report their own nbytes by that, and anything else by
+	sys.getsizeof.
+	'''
+
+	if isinstance(value, numpy.ndarray):
+		return value.nbytes if _owns_memory(value) else 0
+	if isinstance(value, (bytes, bytearray, str)):
+		return len(value)
+	if isinstance(value, dict):
+		return sum(estimate_size(item) for item in value.values())
+	if isinstance(value, (list, tuple)):
+		return sum(estimate_size(item) for item in value)
+	nbytes = getattr(value, "nbytes", None)
+	if isinstance(nbytes, int):
+		return nbytes
+	return sys.getsizeof(value)
+
+
+class Region:
+	'''
+	One region of the store, holding one kind of result. Regions are made with region(), never directly.
+
+	Inputs
+	--------
+	name: the name of the region, as it is shown in the admin view
+	max_entries: the number of results the region may hold, or None if only the memory budget limits it
+	max_bytes: the memory (in bytes) its results may take up, or None if only the memory budget limits it
+	sizeof: the function that measures the memory taken up by one of its results
+	'''
+
+	def __init__(self, name, max_entries = None, max_bytes = None, sizeof = estimate_size):
+		self.name = name
+		self.max_entries = max_entries
+		self.max_bytes = max_bytes
+		self.sizeof = sizeof
+		self._values = OrderedDict()
+		self._stats = {"hits": 0, "misses": 0, "shared": 0, "evictions": 0, "bytes": 0}
+
+	def _touch(self, key):
+		self._values.move_to_end(key)
+		_lru.move_to_end((self.name, key))
+
+	def _remove(self, key):
+		_, nbytes = self._values.pop(key)
+		del _lru[(self.name, key)]
+		self._stats["bytes"] -= nbytes
+		_stats["bytes"] -= nbytes
+
+	def _evict(self):
+		'''
+		Evicts the least recently used results of the region until it fits within its own limits, and then those of any region until
+		the store fits within its budget. The most recently used result is never evicted. Must be called with the lock held.
+		'''
+
+		while len(self._values) > 1 and ((self.max_entries is not None and len(self._values) > self.max_entries)
+				or (self.max_bytes is not None and self._stats["bytes"] > self.max_bytes)):
+			self._remove(next(iter(self._values)))
+			self._stats["evictions"] += 1
+
+		while len(_lru) > 1 and _stats["bytes"] > MAX_BYTES:
+			name, key = next(iter(_lru))
+			_regions[name]._remove(key)
+			_regions[name]._stats["evictions"] += 1
+
+	def _store(self, key, value, nbytes):
+		'''
+		Puts a result into the region. Must be called with the lock held.
+		'''
+
+		if key in self._values:
+			self._remove(key)
+		self._values[key] = [value, nbytes]
+		_lru[(self.name, key)] = None
+		self._stats["bytes"] += nbytes
+		_stats["bytes"] += nbytes
+		self._evict()
+
+	def get(self, key, default = None):
+		'''
+		Returns the result stored under a key, or default if there is none.
+		'''
+
+		with _lock:
+			entry = self._values.get(key)
+			if entry is None:
+				self._stats["misses"] += 1
+				return default
+			self._touch(key)
+			self._stats["hits"] += 1
+			return entry[0]
+
+	def put(self, key, value):
+		'''
+		Stores a result under a key, replacing the one stored there before (if any), and returns it.
+		'''
+
+		nbytes = self.sizeof(value)
+		with _lock:
+			self._store(key, value, nbytes)
+		return value
+
+	def get_or_compute(self, key, compute, *args, **kwargs):
+		'''
+		Returns the result stored under a key, computing it with compute(*args, **kwargs) and storing it if there is none. If the same
+		result is already being computed for another session, this waits for that computation and returns its result instead.
+
+		Inputs
+		--------
+		key: the key of the result, which identifies everything it depends on
+		compute: the function that computes the result
+		args, kwargs: its arguments
+
+		Outputs:
+		-------
+		value: the result, which is shared with every other session and must not be modified by the caller
+		'''
+
+		with _lock:
+			entry = self._values.get(key)
+			if entry is not None:
+				self._touch(key)
+				self._stats["hits"] += 1
+				return entry[0]
+
+			pending = _inflight.get((self.name, key))
+			owner = pending is None
+			if owner:
+				pending = _inflight[(self.name, key)] = Future()
+				self._stats["misses"] += 1
+			else:
+				self._stats["hits"] += 1
+				self._stats["shared"] += 1
+
+		if not owner:
+			value = pending.result()
+			# a computation that failed (or was interrupted by a rerun of its page) isn't shared: the waiting requests try it again
+			return self.get_or_compute(key, compute, *args, **kwargs) if value is _FAILED else value
+
+		try:
+			value = compute(*args, **kwargs)
+			nbytes = self.sizeof(value)
+		except BaseException:
+			with _lock:
+				del _inflight[(self.name, key)]
+			pending.set_result(_FAILED)
+			raise
+
+		with _lock:
+			self._store(key, value, nbytes)
+			del _inflight[(self.name, key)]
+		pending.set_result(value)
+		return value
+
+	def setdefault(self, key, factory):
+		'''
+		Returns the result stored under a key, storing factory() under it first if there is none. This doesn't count as a hit or a miss
+		(the caller counts its own, with count()), and factory is called with the store locked, so it must be quick.
+		'''
+
+		with _lock:
+			entry = self._values.get(key)
+			if entry is not None:
+				self._touch(key)
+				return entry[0]
+			value = factory()
+			self._store(key, value, self.sizeof(value))
+			return value
+
+	def items(self):
+		'''
+		Returns the (key, result) pairs held by the region, least recently used first, without counting them as lookups.
+		'''
+
+		with _lock:
+			return [(key, entry[0]) for key, entry in self._values.items()]
+
+	def resize(self, key):
+		'''
+		Measures a result again after it has grown (or shrunk), evicting results if the region or the store no longer fits. A result
+		that has been evicted in the meantime is left alone.
+		'''
+
+		with _lock:
+			entry = self._values.get(key)
+			if entry is None:
+				return
+			nbytes = self.sizeof(entry[0])
+			self._stats["bytes"] += nbytes - entry[1]
+			_stats["bytes"] += nbytes - entry[1]
+			entry[1] = nbytes
+			self._evict()
+
+	def count(self, counter, n = 1):
+		'''
+		Adds to one of the region's counters — hits and misses, or a counter of its own (e.g. the orbits served by the orbit lattice).
+		'''
+
+		with _lock:
+			self._stats[counter] = self._stats.get(counter, 0) + n
+
+	def configure(self, max_entries = None, max_bytes = None):
+		'''
+		Changes the limits of the region, evicting results straight away if it no longer fits.
+		'''
+
+		with _lock:
+			if max_entries is not None:
+				self.max_entries = max_entries
+			if max_bytes is not None:
+				self.max_bytes = max_bytes
+			self._evict()
+
+	def info(self):
+		'''
+		Reports the state of the region.
+
+		Outputs:
+		-------
+		info: a dictionary with the region's counters — hits (and how many of those waited for another session's computation, as
+		shared), misses, evictions and any counters of its own — the number of results it holds and their total size in bytes, and
+		its limits
+		'''
+
+		with _lock:
+			return dict(self._stats, entries = len(self._values), max_entries = self.max_entries, max_bytes = self.max_bytes)
+
+	def clear(self, reset = False):
+		'''
+		Empties the region, and also resets its counters if asked to.
+		'''
+
+		with _lock:
+			for key in list(self._values):
+				self._remove(key)
+			if reset:
+				for counter in self._stats:
+					self._stats[counter] = 0
+
+
+def region(name, max_entries = None, max_bytes = None, sizeof = estimate_size):
+	'''
+	Returns the region of the store with the given name, making it the first time it is asked for. A module that is imported again
+	(e.g. when Streamlit reloads a changed file) gets back the same region, with the results that are already in it.
+
+	Inputs
+	--------
+	the same as for Region
+
+	Outputs:
+	-------
+	region: the Region
+	'''
+
+	with _lock:
+		store_region = _regions.get(name)
+		if store_region is None:
+			store_region = _regions[name] = Region(name, max_entries, max_bytes, sizeof)
+		else:
+			store_region.max_entries, store_region.max_bytes, store_region.sizeof = max_entries, max_bytes, sizeof
+		return store_region
+
+
+def configure(max_bytes):
+	'''
+	Changes the memory budget of the store, evicting results straight away if the store no longer fits.
+	'''
+
+	global MAX_BYTES
+
+	with _lock:
+		MAX_BYTES = max_bytes
+		for store_region in _regions.values():
+			store_region._evict()
+
+
+def store_info():
+	'''
+	Reports the state of the whole store.
+
+	Outputs:
+	-------
+	info: a dictionary with the total size of the results in bytes, the memory budget, and the info() of each region
+	'''
+
+	with _lock:
+		names = list(_regions)
+		info = {"bytes": _stats["bytes"], "max_bytes": MAX_BYTES}
+	info["regions"] = OrderedDict((name, _regions[name].info()) for name in names)
+	return info
+
+
+def clear_store():
+	'''
+	Empties every region of the store.
+	'''
+
+	for store_region in list(_regions.values()):
+		store_region.clear()
+
+
+def store_panel(container):
+	'''
+	Shows the admin view of the store in a Streamlit container (e.g. the sidebar): the memory used out of the budget, and the number
+	of results, size, hit rate, evictions and shared computations of each region since the server started.
+	'''
+
+	info = store_info()
+	container.markdown("The shared result store holds **%.1f MB** of its %.0f MB budget:" % (info["bytes"]/1024.**2, info["max_bytes"]/1024.**2))
+
+	rows = []
+	for name, region_info in info["regions"].items():
+		lookups = region_info["hits"] + region_info["misses"]
+		rows.append({"region": name, "entries": region_info["entries"], "size (MB)": round(region_info["bytes"]/1024.**2, 2),
+			"hit rate": "%.0f%%" % (100.*region_info["hits"]/lookups) if lookups else "-", "evictions": region_info["evictions"],
+			"shared": region_info["shared"]})
+	container.table(rows)
+	container.caption("Shared lookups waited for the same result to be computed for another session, instead of computing it again.")
@@ -0,0 +1,145 @@
+# This file computes rotation curves for the rotation-curve and Milky Way pages. The circular velocity of each component potential is
+# computed once and kept in the shared result store (see result_store.py), and the rotation curve of a sum of axisymmetric components
+# is built from the cached components: since v_c^2 = R dPhi/dR and potentials add, the terms R dPhi/dR of the components add up. Each
+# term keeps its sign — a component can pull outwards (e.g. inside a shell, or with a negative amplitude), where its own circular velocity
+# isn't defined — so the composite matches galpy's. Composites that include a non-axisymmetric component (spiral arms, triaxial halos)
+# are evaluated directly instead.
+
+import hashlib
+
+import numpy
+
+from orbit_cache import potential_fingerprint
+from profiler import stage
+import result_store
+
+# the number of rotation curves kept in the cache
+MAX_ENTRIES = 256
+
+_curves = result_store.region("rotation curves", max_entries = MAX_ENTRIES)
+
+
+def _radii_key(radii):
+	'''
+	Builds a hashable key for an array of radii, which may be an astropy Quantity.
+	'''
+
+	values = numpy.ascontiguousarray(getattr(radii, "value", radii), dtype = numpy.float64)
+	return hashlib.sha1(values.tobytes()).hexdigest() + str(getattr(radii, "unit", ""))
+
+
+def _cached_curve(pot_fxn, radii, phi):
+	'''
+	Returns the rotation curve of a potential (or of a list of potentials, evaluated together), computing it with galpy only
+	if it isn't in the cache. The second output tells whether the curve came from the cache.
+	'''
+
+	key = (potential_fingerprint(pot_fxn), _radii_key(radii), phi)
+
+	computed = []
+
+	def compute():
+		from galpy.potential import calcRotcurve
+		computed.append(True)
+		with stage("rotation curve"):
+			return numpy.asarray(calcRotcurve(pot_fxn, radii, phi = phi), dtype = numpy.float64)
+
+	curve = _curves.get_or_compute(key, compute)
+	return curve, not computed
+
+
+def _cached_term(pot_fxn, radii, phi):
+	'''
+	Returns R dPhi/dR (the squared circular velocity, with its sign) of a component potential in the plane, in natural units, at each
+	radius, computing it with galpy only if it isn't in the cache.
+	'''
+
+	key = ("R dPhi/dR", potential_fingerprint(pot_fxn), _radii_key(radii), phi)
+
+	def compute():
+		from galpy.potential import PotentialError, evaluateplanarRforces, toPlanarPotential
+		from galpy.util.conversion import get_physical
+
+		# radii with units are converted to natural units with the component's own distance scale, as calcRotcurve does
+		values = numpy.atleast_1d(radii.to_value("kpc")/get_physical(pot_fxn)["ro"] if hasattr(radii, "unit") else radii)
+		with stage("rotation curve"):
+			try:
+				forces = [evaluateplanarRforces(pot_fxn, R, phi = phi, use_physical = False) for R in values]
+			except PotentialError:
+				planar = toPlanarPotential(pot_fxn)
+				forces = [evaluateplanarRforces(planar, R, phi = phi, use_physical = False) for R in values]
+			return -values*numpy.asarray(forces, dtype = numpy.float64)
+
+	return _curves.get_or_compute(key, compute)
+
+
+def _components(pot_fxn):
+	'''
+	Splits a potential into its components: a list of potentials, or a potential built by adding potentials together.
+	'''
+
+	if isinstance(pot_fxn, (list, tuple)):
+		return [part for component in pot_fxn for part in _components(component)]
+	if hasattr(pot_fxn, "_potlist"):
+		return _components(pot_fxn._potlist)
+	return [pot_fxn]
+
+
+def component_curve(pot_fxn, radii, phi = None):
+	'''
+	Returns the rotation curve of a single component potential, from the cache if it has been computed before.
+
+	Inputs
+	--------
+	pot_fxn: the potential function
+	radii: the radii at which to evaluate the rotation curve, as for galpy.potential.calcRotcurve
+	phi: the azimuth at which to evaluate it (only needed for non-axisymmetric potentials)
+
+	Outputs:
+	-------
+	rot_curve: the circular velocity at each radius, which must not be modified by the caller
+	'''
+
+	return _cached_curve(pot_fxn, radii, phi)[0]
+
+
+def rotation_curve(pot_fxn, radii, phi = None):
+	'''
+	Returns the rotation curve of a potential that may be made up of several components. If every component is axisymmetric, the
+	curve is built by adding up the cached terms R dPhi/dR of the components; otherwise it is evaluated directly.
+
+	Inputs
+	--------
+	pot_fxn: the potential function — a single potential, a list of potentials, or potentials added together
+	radii: the radii at which to evaluate the rotation curve, as for galpy.potential.calcRotcurve
+	phi: the azimuth at which to evaluate it (only needed for non-axisymmetric potentials)
+
+	Outputs:
+	-------
+	rot_curve: the circular velocity at each radius, which must not be modified by the caller
+	path: how the curve was computed — "cached" (a single component, already in the cache), "component" (a single component,
+	computed now), "quadrature" (from the sum of the components' terms R dPhi/dR) or "direct" (the whole composite, evaluated
+	with galpy because a component is non-axisymmetric)
+	'''
+
+	components = _components(pot_fxn)
+
+	if len(components) == 1:
+		curve, hit = _cached_curve(components[0], radii, phi)
+		return curve, "cached" if hit else "component"
+
+	if any(getattr(component, "isNonAxi", False) for component in components):
+		return _cached_curve(components, radii, phi)[0], "direct"
+
+	# where the components pull outwards overall there is no circular orbit, and the curve is NaN, as it is with galpy
+	vc2 = sum(_cached_term(component, radii, phi) for component in components)
+	with numpy.errstate(invalid = "ignore"):
+		return numpy.sqrt(vc2), "quadrature"
+
+
+def cache_info():
+	'''
+	Reports the number of hits, misses and evictions of the rotation-curve cache, and the number of curves it holds.
+	'''
+
+	return _curves.info()
@@ -0,0 +1,163 @@
+# This file decides how finely orbits are sampled. Instead of outputting every orbit at 3001 times, no matter whether it covers one Gyr or
+# fourteen, we pick the number of output times from the orbit's dynamical time. Then, before a series is plotted, it is trimmed to a
+# number of points that suits the size of the plot with a shape-preserving downsampler, so long orbits stay accurate on screen without
+# us drawing tens of thousands of points.
+
+import math
+
+import numpy
+
+import natural_units
+
+# the number of output times per dynamical time, and the smallest and largest number of output times an orbit may have
+SAMPLES_PER_TDYN = 150
+MIN_STEPS = 501
+MAX_STEPS = 20001
+
+# the longest integration time on the pages, in Gyr — orbits that are integrated incrementally are output at a fixed rate, which is
+# bounded so that an orbit this long has between MIN_STEPS and MAX_STEPS output times
+MAX_YEARS = 14
+
+# the number of points a plotted series is trimmed to — a little more than the width, in pixels, of the plots streamlit shows
+MAX_PLOT_POINTS = 2000
+
+
+def dynamical_time(pot_fxn, R, z):
+	'''
+	Estimates the dynamical time at the starting point of an orbit, from the strength of the gravitational force there.
+
+	Inputs
+	--------
+	pot_fxn: the potential function
+	R: the initial radius from the galactic center, in kpc
+	z: the initial height from the galactic plane, in kpc
+
+	Outputs:
+	-------
+	tdyn: the dynamical time, in Gyr, or None if there is no force at the starting point (e.g. inside a spherical shell)
+	'''
+
+	from galpy.potential import evaluateRforces, evaluatezforces
+	ro, vo = natural_units.scales(pot_fxn)
+
+	# work in galpy's natural units, where the dynamical time is 2 pi sqrt(r/g)
+	r = math.hypot(R, z)/ro
+	if r == 0.:
+		return None
+	with numpy.errstate(all = "ignore"):
+		g = math.hypot(evaluateRforces(pot_fxn, R/ro, z/ro, phi = 0., use_physical = False),
+			evaluatezforces(pot_fxn, R/ro, z/ro, phi = 0., use_physical = False))
+	if not numpy.isfinite(g) or g <= 0.:
+		return None
+
+	return 2.*numpy.pi*math.sqrt(r/g)*natural_units.time_in_Gyr(ro, vo)
+
+
+def output_steps(pot_fxn, years, R, z):
+	'''
+	Picks the number of times at which an orbit is output, so there are about SAMPLES_PER_TDYN of them per dynamical time.
+
+	Inputs
+	--------
+	pot_fxn: the potential function
+	years: integration time of the orbit, in Gyr
+	R: the initial radius from the galactic center, in kpc (None for galpy's default orbit, which starts at the Sun)
+	z: the initial height from the galactic plane, in kpc
+
+	Outputs:
+	-------
+	n_steps: the number of output times
+	'''
+
+	if years <= 0.:
+		return 1
+
+	if R is None:
+		R, z = natural_units.scales(pot_fxn)[0], 0.
+
+	tdyn = dynamical_time(pot_fxn, R, z)
+	if tdyn is None:
+		return MIN_STEPS
+
+	return int(numpy.clip(math.ceil(years/tdyn*SAMPLES_PER_TDYN) + 1, MIN_STEPS, MAX_STEPS))
+
+
+def output_rate(pot_fxn, R, z):
+	'''
+	Picks the number of output times per Gyr of an orbit that is integrated incrementally (see orbit_cache), so there are about
+	SAMPLES_PER_TDYN of them per dynamical time, as for output_steps. Unlike output_steps, this doesn't depend on how long the orbit is
+	integrated for, so the orbit can be extended, or cut short, without changing the times at which it's output — which means the
+	smallest number of output times is only guaranteed for an orbit of MAX_YEARS, and a shorter orbit of a slow potential has fewer.
+
+	Inputs
+	--------
+	pot_fxn: the potential function
+	R: the initial radius from the galactic center, in kpc (None for galpy's default orbit, which starts at the Sun)
+	z: the initial height from the galactic plane, in kpc
+
+	Outputs:
+	-------
+	rate: the number of output times per Gyr
+	'''
+
+	if R is None:
+		R, z = natural_units.scales(pot_fxn)[0], 0.
+
+	min_rate, max_rate = math.ceil((MIN_STEPS - 1)/MAX_YEARS), (MAX_STEPS - 1)//MAX_YEARS
+	tdyn = dynamical_time(pot_fxn, R, z)
+	if tdyn is None:
+		return min_rate
+
+	return int(numpy.clip(math.ceil(SAMPLES_PER_TDYN/tdyn), min_rate, max_rate))
+
+
+def triangle_downsample(*series, n_out = MAX_PLOT_POINTS):
+	'''
+	Picks the points to keep when a curve is drawn with fewer points than it has, using a variant of the
+	largest-triangle-three-buckets (LTTB) method: the curve is split into n_out buckets, and from each bucket we keep the point
+	that makes the largest triangle with the averages of the neighbouring buckets. Standard LTTB uses the point it kept from
+	the bucket before instead of that bucket's average, which makes each bucket wait for the one before it; with the averages,
+	every bucket is scored at once, in a few array operations. This keeps the turning points of the orbit, which evenly
+	spaced sampling would cut off. Works for curves in any number of dimensions.
+
+	Inputs
+	--------
+	series: the coordinates of the curve, e.g. trace.R and trace.z
+	n_out: the number of points to keep
+
+	Outputs:
+	-------
+	keep: the sorted indices of the points to keep, always including the first and last point
+	'''
+
+	n = len(series[0])
+	if n <= n_out or n_out < 3:
+		return numpy.arange(n)
+
+	# scale each coordinate to the same range, so the triangle areas match what we see on the plot
+	points = numpy.column_stack([numpy.asarray(s, dtype = numpy.float64) for s in series])
+	span = numpy.ptp(points, axis = 0)
+	points = (points - points.min(axis = 0))/numpy.where(span > 0., span, 1.)
+
+	# the first and last points are kept, and the rest are split into n_out - 2 buckets
+	edges = numpy.linspace(1, n - 1, n_out - 1).astype(int)
+	starts = edges[:-1]
+	sizes = numpy.diff(edges)
+	means = numpy.add.reduceat(points[1:n - 1], starts - 1, axis = 0)/sizes[:, None]
+
+	# for every point, the average point of the bucket before and after its own bucket
+	bucket = numpy.repeat(numpy.arange(len(starts)), sizes)
+	before = numpy.vstack([points[:1], means])[bucket]
+	after = numpy.vstack([means, points[-1:]])[bucket + 1]
+
+	# the area of the triangle made by each point with the neighbouring averages, in any number of dimensions
+	a = points[1:n - 1] - before
+	b = after - before
+	area2 = (a*a).sum(axis = 1)*(b*b).sum(axis = 1) - ((a*b).sum(axis = 1))**2
+
+	# the index of the largest triangle in each bucket
+	order = numpy.lexsort((-area2, bucket))
+	first = numpy.concatenate([[0], numpy.cumsum(sizes)[:-1]])
+	chosen = order[first] + 1
+
+	return numpy.concatenate([[0], chosen, [n - 1]])
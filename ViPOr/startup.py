@@ -0,0 +1,144 @@
+# This file speeds up the first visit to ViPOr's pages. The scientific libraries that the pages need (galpy, astropy and matplotlib) take
+# seconds to import, and ViPOr's own modules only import them when they're first used. When the server starts, the homepage calls
+# prewarm, which imports them in a background thread while the visitor is still reading, so they're already loaded by the time the
+# visitor opens another page. Running this file prints how long each module takes to import from scratch, in milliseconds.
+
+import argparse
+import importlib
+import json
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+
+# the slow imports that the pages need, in the order they're prewarmed
+HEAVY_MODULES = ("numpy", "astropy.units", "galpy.potential", "galpy.orbit", "matplotlib.figure", "mpl_toolkits.mplot3d")
+
+# ViPOr's own modules, which are included in the import-time report
+VIPOR_MODULES = ("result_store", "potential_registry", "pick_potential", "figure_manager", "integrators", "orbit_cache", "orbit_animation",
+	"potential_grid", "rotation_curves", "milky_way", "tracer_cloud", "surface_of_section", "PlotPotentialandOrbit2D", "PlotPotentialandOrbit3D")
+
+_lock = threading.Lock()
+_thread = None
+_import_times = {}
+
+
+def timed_import(name):
+	'''
+	Imports a module and records how long the import took, in milliseconds (zero if it had already been imported).
+	'''
+
+	start = time.perf_counter()
+	importlib.import_module(name)
+	elapsed = 1000.*(time.perf_counter() - start)
+
+	with _lock:
+		_import_times.setdefault(name, elapsed)
+
+
+def prewarm(modules = HEAVY_MODULES):
+	'''
+	Starts importing the slow modules in a background thread, once per server process. Prewarming can be turned off by setting the
+	VIPOR_PREWARM environment variable to 0.
+
+	Inputs
+	--------
+	modules: the names of the modules to import
+
+	Outputs:
+	-------
+	thread: the thread doing the imports, or None if prewarming is turned off
+	'''
+
+	global _thread
+
+	if os.environ.get("VIPOR_PREWARM", "1") == "0":
+		return None
+
+	def run():
+		for name in modules:
+			try:
+				timed_import(name)
+			except ImportError:
+				# a missing optional module is imported (and reported) again by whichever page needs it
+				pass
+
+	with _lock:
+		if _thread is None:
+			_thread = threading.Thread(target = run, name = "vipor-prewarm", daemon = True)
+			_thread.start()
+		return _thread
+
+
+def wait_for_imports():
+	'''
+	Waits for the background thread started by prewarm to finish its imports, if it's still importing. A page that needs the slow modules
+	straight away calls this before it uses them, rather than importing them at the same time as the thread — two threads importing
+	packages that import each other (e.g. astropy, IPython and matplotlib) can each find the other's module half initialized.
+	'''
+
+	with _lock:
+		thread = _thread
+	if thread is not None and thread is not threading.current_thread():
+		thread.join()
+
+
+def import_times():
+	'''
+	Returns the time each prewarmed module took to import in this process, in milliseconds.
+	'''
+
+	with _lock:
+		return dict(_import_times)
+
+
+def import_report(modules = HEAVY_MODULES + VIPOR_MODULES):
+	'''
+	Measures how long each module takes to import from scratch, each in a fresh Python process, using Python's -X importtime.
+
+	Inputs
+	--------
+	modules: the names of the modules to measure
+
+	Outputs:
+	-------
+	report: a dictionary with the cumulative import time of each module (including everything it imports), in milliseconds
+	'''
+
+	here = os.path.dirname(os.path.abspath(__file__))
+	report = {}
+	for name in modules:
+		result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import " + name], cwd = here, capture_output = True,
+			text = True)
+		# the last line of -X importtime's output is the module itself, with its cumulative time in microseconds
+		lines = [line for line in result.stderr.splitlines() if re.match(r"import time:\s+\d", line)]
+		if result.returncode == 0 and lines:
+			report[name] = int(lines[-1].split("|")[1])/1000.
+		else:
+			report[name] = None
+	return report
+
+
+def main():
+	'''
+	Prints the import-time report from the command line.
+	'''
+
+	parser = argparse.ArgumentParser(description = "Report how long ViPOr's modules take to import.")
+	parser.add_argument("--json", help = "a JSON file to write the report to")
+	parser.add_argument("modules", nargs = "*", help = "the modules to measure (default: the slow libraries and ViPOr's modules)")
+	args = parser.parse_args()
+
+	report = import_report(tuple(args.modules) or HEAVY_MODULES + VIPOR_MODULES)
+	for name, elapsed in report.items():
+		print("%-28s %s" % (name, "failed" if elapsed is None else "%8.1f ms" % elapsed))
+
+	if args.json:
+		with open(args.json, "w") as json_file:
+			json.dump(report, json_file, indent = 1)
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,249 @@
+# This file contains the surface-of-section mode of the axisymmetric page. A surface of section shows, instead of one orbit's path, where
+# a whole family of orbits with the same energy E and angular momentum L_z pass upwards through the galactic plane, in the (R, v_R) plane:
+# regular orbits trace out closed curves, and chaotic ones scatter over an area. Hundreds of orbits are launched from the plane across
+# the region that their energy allows, and integrated together in batches (see integrators.integrate_batch), in an interpolated copy of
+# the potential — the double exponential disk is far too slow to evaluate directly at every step of every orbit. The crossings of the
+# plane are then located on the sampled arrays, by interpolating between the output times on either side of each crossing, so nothing
+# is plotted until the whole section is ready. Sections are kept in the shared result store, by the potential, E and L_z.
+
+import numpy
+
+from figure_manager import new_figure
+from image_cache import cached_figure
+import integrators
+import natural_units
+from orbit_cache import potential_fingerprint
+from profiler import timed
+import result_store
+
+# the number of orbits in a section, how long each one is integrated (in periods of the circular orbit with the same angular momentum),
+# and the number of times each one is output
+N_ORBITS = 200
+N_PERIODS = 60
+N_OUTPUTS = 4000
+
+# the number of radii and heights of the grid that the potential is interpolated on
+GRID_SIZE = (81, 41)
+
+# how far out (in units of the radius of the circular orbit) we look for the edge of the region the orbits are allowed in
+MAX_RADIUS = 50.
+
+# the number of sections kept in the cache
+MAX_ENTRIES = 16
+
+_sections = result_store.region("surfaces of section", max_entries = MAX_ENTRIES)
+
+
+def circular_orbit(pot_fxn, R):
+	'''
+	Returns the energy and angular momentum of the circular orbit at radius R (in kpc) in the galactic plane.
+
+	Outputs:
+	-------
+	E: the energy per unit mass, in (km/s)^2
+	Lz: the angular momentum per unit mass, in kpc km/s
+	'''
+
+	from galpy.potential import evaluatePotentials, vcirc
+
+	ro, vo = natural_units.scales(pot_fxn)
+	R = R/ro
+	vc = vcirc(pot_fxn, R, use_physical = False)
+	return (evaluatePotentials(pot_fxn, R, 0., use_physical = False) + 0.5*vc**2)*vo**2, R*vc*ro*vo
+
+
+def _effective_potential(pot_fxn, R, z, Lz):
+	from galpy.potential import evaluatePotentials
+
+	return evaluatePotentials(pot_fxn, R, z, use_physical = False) + 0.5*Lz**2/R**2
+
+
+def zero_velocity_curve(pot_fxn, E, Lz, n = 400):
+	'''
+	Finds the region of the galactic plane that orbits with a given energy and angular momentum can reach, and the largest radial velocity
+	they can have at each radius — the edge of their surface of section.
+
+	Inputs
+	--------
+	pot_fxn: the (axisymmetric) potential function
+	E, Lz: the energy and angular momentum of the orbits, in galpy's natural units
+	n: the number of radii the region is resolved with
+
+	Outputs:
+	-------
+	R: the radii of the region, in natural units
+	vR_max: the largest radial velocity at each radius, in natural units
+	'''
+
+	# the region is looked for on a logarithmic grid around the radius of the circular orbit, roughly Lz over the circular velocity
+	from galpy.potential import vcirc
+	guiding = abs(Lz)/vcirc(pot_fxn, 1., use_physical = False)
+	radii = numpy.geomspace(0.01*guiding, MAX_RADIUS*guiding, n)
+	allowed = numpy.flatnonzero(_effective_potential(pot_fxn, radii, 0.*radii, Lz) < E)
+	if not len(allowed):
+		raise ValueError("no orbit has this little energy for its angular momentum")
+	if allowed[-1] == n - 1:
+		raise ValueError("orbits with this much energy are not bound")
+
+	R = numpy.linspace(radii[max(allowed[0] - 1, 0)], radii[allowed[-1] + 1], n)
+	vR_max = numpy.sqrt(numpy.clip(2.*(E - _effective_potential(pot_fxn, R, 0.*R, Lz)), 0., None))
+	return R, vR_max
+
+
+@timed("potential interpolation")
+def interpolated_potential(pot_fxn, R, vR_max, Lz):
+	'''
+	Interpolates a potential on a grid in R and z that covers the region orbits of a given angular momentum can reach, as found by
+	zero_velocity_curve. The interpolated potential is integrated in C, in a fraction of the time of the original.
+	'''
+
+	from galpy.potential import interpRZPotential
+
+	# the orbits climb highest above the radius where they move fastest in the plane, which is where they can reach from the plane
+	center = R[numpy.argmax(vR_max)]
+	E = _effective_potential(pot_fxn, center, 0., Lz) + 0.5*vR_max.max()**2
+	heights = numpy.geomspace(1e-3*center, MAX_RADIUS*center, 100)
+	above = numpy.flatnonzero(_effective_potential(pot_fxn, center + 0.*heights, heights, Lz) > E)
+	zmax = heights[above[0]] if len(above) else heights[-1]
+
+	# the grid is logarithmic in R, as galpy's interpolated potentials are by default
+	return interpRZPotential(RZPot = pot_fxn, rgrid = (numpy.log(0.8*R[0]), numpy.log(1.2*R[-1]), GRID_SIZE[0]),
+		zgrid = (0., 1.5*zmax, GRID_SIZE[1]), logR = True, interpPot = True, interpRforce = True, interpzforce = True, zsym = True,
+		enable_c = True)
+
+
+def launch_orbits(R, vR_max, Lz, n, seed = 0):
+	'''
+	Draws the initial conditions of a family of orbits that start in the galactic plane and move upwards through it: their radii and
+	radial velocities are spread evenly over the region they can reach, and their vertical velocities make up the rest of their energy.
+
+	Outputs:
+	-------
+	vxvv: an array with one row of natural-unit [R, vR, vT, z, vz, phi] per orbit
+	'''
+
+	rng = numpy.random.default_rng(seed)
+	radii = rng.uniform(R[0], R[-1], n)
+	vR_limit = numpy.interp(radii, R, vR_max)
+	vR = rng.uniform(-1., 1., n)*vR_limit
+	vz = numpy.sqrt(numpy.clip(vR_limit**2 - vR**2, 0., None))
+	return numpy.column_stack([radii, vR, Lz/radii, numpy.zeros(n), vz, numpy.zeros(n)])
+
+
+def find_crossings(t, R, vR, z, vz, iterations = 3):
+	'''
+	Locates the upward crossings of the galactic plane (z going from negative to positive) of a family of sampled orbits. Each crossing
+	is bracketed by the two output times on either side of it, and its time is found by solving for the root of the cubic through
+	z and v_z at both ends — which is what an integrator's event location does — starting from the straight line between them. R is
+	interpolated with the same kind of cubic, and v_R along a straight line.
+
+	Inputs
+	--------
+	t: the output times
+	R, vR, z, vz: the phase-space coordinates, with one row per orbit and one column per output time
+
+	Outputs:
+	-------
+	R_cross, vR_cross: the radius and radial velocity of every crossing
+	orbit: the number of the orbit each crossing belongs to
+	'''
+
+	orbit, k = numpy.nonzero((z[:, :-1] < 0.) & (z[:, 1:] >= 0.))
+	h = (t[1:] - t[:-1])[k]
+	z0, z1, dz0, dz1 = z[orbit, k], z[orbit, k + 1], h*vz[orbit, k], h*vz[orbit, k + 1]
+
+	def hermite(s, p0, p1, m0, m1):
+		return (2*s**3 - 3*s**2 + 1)*p0 + (s**3 - 2*s**2 + s)*m0 + (-2*s**3 + 3*s**2)*p1 + (s**3 - s**2)*m1
+
+	def hermite_slope(s, p0, p1, m0, m1):
+		return (6*s**2 - 6*s)*p0 + (3*s**2 - 4*s + 1)*m0 + (-6*s**2 + 6*s)*p1 + (3*s**2 - 2*s)*m1
+
+	s = z0/(z0 - z1)
+	for _ in range(iterations):
+		slope = hermite_slope(s, z0, z1, dz0, dz1)
+		step = numpy.divide(hermite(s, z0, z1, dz0, dz1), slope, out = numpy.zeros_like(s), where = slope > 0.)
+		s = numpy.clip(s - step, 0., 1.)
+
+	R_cross = hermite(s, R[orbit, k], R[orbit, k + 1], h*vR[orbit, k], h*vR[orbit, k + 1])
+	vR_cross = (1. - s)*vR[orbit, k] + s*vR[orbit, k + 1]
+	return R_cross, vR_cross, orbit
+
+
+@timed("section integration")
+def integrate_section(pot_fxn, E, Lz, n_periods = N_PERIODS, n_orbits = N_ORBITS):
+	'''
+	Integrates a family of orbits with the same energy and angular momentum, and collects their upward crossings of the galactic plane.
+
+	Inputs
+	--------
+	pot_fxn: the (axisymmetric) potential function
+	E: the energy of the orbits, in (km/s)^2
+	Lz: their angular momentum, in kpc km/s
+	n_periods: how long each orbit is integrated, in periods of the circular orbit with the same angular momentum
+	n_orbits: the number of orbits
+
+	Outputs:
+	-------
+	section: a dictionary with the radius "R" (in kpc) and radial velocity "vR" (in km/s) of every crossing and the number of the "orbit"
+	it belongs to, the edge of the section as the radii "edge_R" (in kpc) and largest radial velocities "edge_vR" (in km/s), and the
+	"E" and "Lz" of the orbits, and the integrator ("method") they were integrated with and their largest relative energy "drift"
+	'''
+
+	ro, vo = natural_units.scales(pot_fxn)
+	R, vR_max = zero_velocity_curve(pot_fxn, E/vo**2, Lz/(ro*vo))
+	interpolated = interpolated_potential(pot_fxn, R, vR_max, Lz/(ro*vo))
+
+	# the circular orbit is where the orbits move fastest through the plane, and its period is 2 pi R^2/L_z
+	guiding = R[numpy.argmax(vR_max)]
+	times = numpy.linspace(0., n_periods*2.*numpy.pi*guiding**2/abs(Lz/(ro*vo)), N_OUTPUTS)
+
+	# the orbits all have the same angular momentum, so none of them comes near the center, and the adaptive integrators (which get
+	# through the many vertical oscillations of orbits in a thin disk the fastest) can be chosen too
+	phase_space, report = integrators.integrate_batch(launch_orbits(R, vR_max, Lz/(ro*vo), n_orbits), times, interpolated, ro, vo,
+		adaptive = True)
+
+	R_cross, vR_cross, orbit = find_crossings(times, phase_space[..., 0], phase_space[..., 1], phase_space[..., 3], phase_space[..., 4])
+	return {"R": (ro*R_cross).astype(numpy.float32), "vR": (vo*vR_cross).astype(numpy.float32), "orbit": orbit.astype(numpy.int32),
+		"edge_R": ro*R, "edge_vR": vo*vR_max, "E": float(E), "Lz": float(Lz), "method": report["method"], "drift": report["drift"]}
+
+
+def get_section(pot_fxn, E, Lz, n_periods = N_PERIODS, n_orbits = N_ORBITS):
+	'''
+	Returns the surface of section of a potential at a given energy and angular momentum, integrating its orbits only if it isn't in the
+	cache. The inputs and outputs are the same as for integrate_section.
+	'''
+
+	key = (potential_fingerprint(pot_fxn), round(float(E), 6), round(float(Lz), 6), int(n_periods), int(n_orbits))
+	return _sections.get_or_compute(key, integrate_section, pot_fxn, E, Lz, n_periods, n_orbits)
+
+
+def plot_section(section):
+	'''
+	Plots a surface of section: every crossing as a dot, colored by the orbit it belongs to, inside the edge of the region the orbits
+	can reach.
+	'''
+
+	fig0, ax0 = new_figure()
+	ax0.scatter(section["R"], section["vR"], c = section["orbit"], s = 1, cmap = "viridis", linewidths = 0)
+	ax0.plot(numpy.concatenate([section["edge_R"], section["edge_R"][::-1]]), numpy.concatenate([section["edge_vR"], -section["edge_vR"][::-1]]),
+		color = "k", linewidth = 0.8)
+	ax0.set_xlabel(r"$R$ (kpc)")
+	ax0.set_ylabel(r"$v_R$ (km/s)")
+	ax0.set_title(r"Surface of Section at $z = 0$, $E = %.0f$ km$^2$/s$^2$, $L_z = %.0f$ kpc km/s" % (section["E"], section["Lz"]))
+	return fig0
+
+
+def section_image(section):
+	'''
+	Returns the image of the plot of a surface of section, which is only drawn if it isn't in the image cache yet.
+	'''
+
+	return cached_figure(plot_section, section, data = (section["E"], section["Lz"], section["R"], section["vR"]))
+
+
+def cache_info():
+	'''
+	Reports the number of hits, misses and evictions of the section cache, and the number of sections it holds.
+	'''
+
+	return _sections.info()
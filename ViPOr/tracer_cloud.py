@@ -0,0 +1,225 @@
+# This file contains the tracer-cloud mode of the spherically symmetric pages. Instead of following a single particle, we draw thousands
+# of particles around the chosen starting point, integrate all of them together in chunks split over a pool of worker processes, and
+# show how the cloud spreads out through the potential as a density histogram, which stays readable where thousands of separate lines
+# would not.
+
+import math
+
+import numpy
+
+from figure_manager import new_figure
+import integrators
+import natural_units
+from orbit_cache import potential_fingerprint
+from profiler import timed
+import result_store
+from sampling import dynamical_time
+
+# the number of snapshots of the cloud we keep, and the number of integration steps per dynamical time
+N_SNAPSHOTS = 51
+STEPS_PER_TDYN = 30
+
+# the radius (in kpc) at which the shortest dynamical time a particle may meet is estimated, for a cloud that starts at the center, where
+# the dynamical time can't be estimated from the cloud's own position
+CORE_RADIUS = 0.1
+
+# the largest number of integration steps of each particle, which bounds the cost of a cloud in a cuspy potential, whose dynamical time
+# keeps shrinking towards the center
+MAX_STEPS = 3000
+
+# the number of clouds kept in the cache — each 10,000-particle cloud takes up about 10 MB
+MAX_ENTRIES = 8
+
+_clouds = result_store.region("tracer clouds", max_entries = MAX_ENTRIES)
+
+
+def sample_cloud(R, z, n, spread, dispersion, seed = 0):
+	'''
+	Draws the initial conditions of a cloud of particles, distributed isotropically around a starting point: their positions
+	are Gaussian around (x, y, z) = (R, 0, z), and their velocities are Gaussian around zero.
+
+	Inputs
+	--------
+	R: the radius of the center of the cloud, in kpc
+	z: the height of the center of the cloud, in kpc
+	n: the number of particles
+	spread: the standard deviation of the positions, in kpc
+	dispersion: the standard deviation of each velocity component, in km/s
+	seed: the seed of the random number generator, so the same cloud is drawn every time
+
+	Outputs:
+	-------
+	init_cond: an array with one row of [R, vR, vT, z, vz, phi] (in kpc, km/s and radians) per particle
+	'''
+
+	rng = numpy.random.default_rng(seed)
+	x, y, zs = rng.normal((R, 0., z), spread, size = (n, 3)).T
+	vx, vy, vz = rng.normal(0., dispersion, size = (3, n))
+
+	# go from Cartesian to cylindrical coordinates
+	phi = numpy.arctan2(y, x)
+	vR = vx*numpy.cos(phi) + vy*numpy.sin(phi)
+	vT = -vx*numpy.sin(phi) + vy*numpy.cos(phi)
+
+	return numpy.column_stack([numpy.hypot(x, y), vR, vT, zs, vz, phi])
+
+
+@timed("cloud integration")
+def integrate_cloud(pot_fxn, years, init_cond):
+	'''
+	Integrates every particle of a cloud, in chunks split over the pool of worker processes (see integrators.integrate_batch), with the
+	integrator chosen for the potential's family. The integration uses a fixed time step, a fraction of the dynamical time near the
+	center of the cloud's orbit, so particles that pass close to a cusp don't slow the whole cloud down.
+
+	Inputs
+	--------
+	pot_fxn: the potential function
+	years: integration time, in Gyr
+	init_cond: the initial conditions of the particles, as returned by sample_cloud
+
+	Outputs:
+	-------
+	cloud: a dictionary with the snapshot times "t" (in Gyr) and the positions "x", "y", "z" and "R" (in kpc) of every
+	particle at every snapshot, as float32 arrays with one row per particle
+	'''
+
+	ro, vo = natural_units.scales(pot_fxn)
+	time_in_Gyr = natural_units.time_in_Gyr(ro, vo)
+
+	# the initial conditions in galpy's natural units
+	vxvv = init_cond/numpy.array([ro, vo, vo, ro, vo, 1.])
+
+	if years > 0.:
+		times = numpy.linspace(0., years/time_in_Gyr, N_SNAPSHOTS)
+		# the time step comes from the dynamical time at a tenth of the cloud's distance from the center, which is much shorter than
+		# at the cloud itself for cuspy potentials, where particles that fall through the center would otherwise be flung out — and
+		# never from a longer one than at CORE_RADIUS, which also covers a cloud that starts right at the center
+		center = numpy.median(init_cond[:, [0, 3]], axis = 0)
+		probes = (center, 0.1*center, (CORE_RADIUS, 0.))
+		tdyns = [tdyn for tdyn in (dynamical_time(pot_fxn, *probe) for probe in probes) if tdyn is not None]
+		# a potential with no force at any of them is integrated with STEPS_PER_TDYN steps per snapshot
+		tdyn = min(tdyns) if tdyns else (times[1] - times[0])*time_in_Gyr
+		substeps = max(1, min(math.ceil((times[1] - times[0])*STEPS_PER_TDYN*time_in_Gyr/tdyn), MAX_STEPS//(N_SNAPSHOTS - 1)))
+		phase_space = integrators.integrate_batch(vxvv, times, pot_fxn, ro, vo, dt = (times[1] - times[0])/substeps)[0]
+	else:
+		times = numpy.zeros(1)
+		phase_space = vxvv[:, None, :]
+
+	R, z, phi = ro*phase_space[..., 0], ro*phase_space[..., 3], phase_space[..., 5]
+	return {"t": times*time_in_Gyr, "x": (R*numpy.cos(phi)).astype(numpy.float32), "y": (R*numpy.sin(phi)).astype(numpy.float32),
+		"z": z.astype(numpy.float32), "R": R.astype(numpy.float32)}
+
+
+def get_cloud(pot_fxn, years, R, z, n = 10000, spread = 1., dispersion = 50., seed = 0):
+	'''
+	Returns a cloud of n particles around (R, z), integrated over a number of Gyr, integrating it only if it isn't in the cache.
+	The inputs are the same as for sample_cloud, with the potential and the integration time in Gyr.
+	'''
+
+	key = (potential_fingerprint(pot_fxn), round(float(years), 9), float(R), float(z), int(n), float(spread), float(dispersion), seed)
+
+	return _clouds.get_or_compute(key, lambda: integrate_cloud(pot_fxn, years, sample_cloud(R, z, n, spread, dispersion, seed)))
+
+
+def _plot_range(*series):
+	'''
+	Returns the range of each series to histogram, leaving out the 0.5% most extreme particles on each side — a few particles that
+	pass very close to a cusp are flung far out, and would otherwise squeeze the rest of the cloud into a single bin.
+	'''
+
+	limits = []
+	for values in series:
+		lo, hi = numpy.percentile(values, [0.5, 99.5])
+		limits.append((lo, hi) if hi > lo else (lo - 1., hi + 1.))
+	return limits
+
+
+def snapshot_index(cloud, time):
+	'''
+	Returns the index of the snapshot of the cloud closest to a given time, in Gyr.
+	'''
+
+	return int(numpy.argmin(numpy.abs(cloud["t"] - time)))
+
+
+def plot_cloud_2D(cloud, index, bins = 100):
+	'''
+	Plots the density of a cloud at one snapshot, projected onto the x-y plane and onto R and z.
+
+	Inputs
+	--------
+	cloud: the cloud, as returned by get_cloud
+	index: the index of the snapshot
+	bins: the number of histogram bins along each axis
+
+	Outputs:
+	-------
+	fig0: a two dimensional histogram of the cloud in x vs. y coordinates
+	fig1: a two dimensional histogram of the cloud in R vs. z coordinates
+	'''
+
+	from matplotlib.colors import LogNorm
+
+	time = cloud["t"][index]
+
+	fig0, ax0 = new_figure()
+	x, y = cloud["x"][:, index], cloud["y"][:, index]
+	_, _, _, image = ax0.hist2d(x, y, bins = bins, range = _plot_range(x, y), cmap = "viridis", norm = LogNorm())
+	fig0.colorbar(image, ax = ax0, label = "Number of particles")
+	ax0.set_aspect("equal", adjustable = "datalim")
+	ax0.set_xlabel(r"$x$ (kpc)")
+	ax0.set_ylabel(r"$y$ (kpc)")
+	ax0.set_title("Tracer Cloud at t = %.2f Gyr, Projected Onto X-Y Plane" % time)
+
+	fig1, ax1 = new_figure()
+	R, z = cloud["R"][:, index], cloud["z"][:, index]
+	_, _, _, image = ax1.hist2d(R, z, bins = bins, range = _plot_range(R, z), cmap = "viridis", norm = LogNorm())
+	fig1.colorbar(image, ax = ax1, label = "Number of particles")
+	ax1.set_xlabel(r"$R$ (kpc)")
+	ax1.set_ylabel(r"$z$ (kpc)")
+	ax1.set_title("Tracer Cloud at t = %.2f Gyr, in R vs. z" % time)
+
+	return fig0, fig1
+
+
+def plot_cloud_3D(cloud, index, bins = 24):
+	'''
+	Plots the density of a cloud at one snapshot in three dimensions, as a histogram of the particles in cubic cells: each
+	occupied cell is drawn as a point, colored and sized by the number of particles in it.
+
+	Inputs
+	--------
+	cloud: the cloud, as returned by get_cloud
+	index: the index of the snapshot
+	bins: the number of cells along each axis
+
+	Outputs:
+	-------
+	fig0: a three dimensional histogram of the cloud in Cartesian coordinates
+	'''
+
+	from matplotlib.colors import LogNorm
+
+	positions = numpy.column_stack([cloud[name][:, index] for name in ("x", "y", "z")])
+	counts, edges = numpy.histogramdd(positions, bins = bins, range = _plot_range(*positions.T))
+	centers = [0.5*(edge[1:] + edge[:-1]) for edge in edges]
+	occupied = numpy.nonzero(counts)
+
+	fig0, ax0 = new_figure(figsize = (10, 9), projection = '3d')
+	points = ax0.scatter(centers[0][occupied[0]], centers[1][occupied[1]], centers[2][occupied[2]], c = counts[occupied],
+		s = 4. + 40.*counts[occupied]/counts.max(), cmap = "viridis", norm = LogNorm(), depthshade = False)
+	fig0.colorbar(points, ax = ax0, label = "Number of particles", shrink = 0.6)
+	ax0.set_xlabel(r"$x$ (kpc)")
+	ax0.set_ylabel(r"$y$ (kpc)")
+	ax0.set_zlabel(r"$z$ (kpc)")
+	ax0.set_title("Tracer Cloud at t = %.2f Gyr" % cloud["t"][index])
+
+	return fig0
+
+
+def cache_info():
+	'''
+	Reports the number of hits, misses and evictions of the cloud cache, and the number of clouds it holds.
+	'''
+
+	return _clouds.info()
@@ -0,0 +1,295 @@
+# This file is the benchmark suite of ViPOr. It times setting up each of the spherically symmetric potentials, the 2D and 3D orbit
+# plots in each of them, and full reruns of the rotation-curve and Milky Way pages through Streamlit's headless AppTest harness. The
+# orbit plots are broken down into the time spent integrating the orbit, extracting its coordinate series, building and rendering the
+# figures, and generating the animations, and every benchmark reports the peak memory it allocated. The results are written to a JSON
+# file, and can be compared against an earlier run to catch regressions.
+#
+# Run it from the top-level directory with:
+#     python benchmarks/run_benchmarks.py --out benchmarks/results.json [--compare benchmarks/baseline.json]
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import resource
+import sys
+import time
+import tracemalloc
+import warnings
+
+VIPOR_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "ViPOr")
+sys.path.insert(0, VIPOR_DIR)
+
+import matplotlib
+matplotlib.use("Agg")
+
+import figure_manager
+import milky_way
+import orbit_animation
+import orbit_cache
+import orbit_lattice
+from orbit_trace import OrbitTrace
+import pick_potential
+from PlotPotentialandOrbit2D import plot_orbit_2D
+from PlotPotentialandOrbit3D import plot_orbit_3D
+import potential_grid
+import potential_registry
+import rotation_curves
+
+# the potentials of the spherically symmetric pages, in the same order as their pot_names
+POT_NAMES = potential_registry.potential_names("spherical")
+
+# the orbit that is plotted in every potential: its integration time (Gyr), and initial radius and height (kpc)
+YEARS = 5
+R = 8.
+Z = 1.
+
+# the pages that are rerun end to end, and whether all of their checkboxes are ticked first
+PAGES = {"2_A_Closer_Look_at_Rotation_Curves.py": False, "7_Understanding_Milky_Way_Potential.py": True}
+
+# a benchmark is reported as a regression if it got slower than this fraction of its earlier time
+REGRESSION_THRESHOLD = 1.25
+
+
+class StageTimer:
+	'''
+	Adds up the time spent in a few functions of the plotting pipeline, by wrapping them while the timer is active.
+	'''
+
+	# the stage that each wrapped function belongs to, as (module or class, attribute name)
+	STAGES = {"integration": (orbit_cache, "_integrate"), "extraction": (OrbitTrace, "from_orbit"),
+		"animation": (orbit_animation, "animation_html")}
+
+	def __init__(self):
+		self.times = dict.fromkeys(self.STAGES, 0.)
+		self._originals = {}
+
+	def _wrap(self, stage, function):
+		def timed(*args, **kwargs):
+			start = time.perf_counter()
+			try:
+				return function(*args, **kwargs)
+			finally:
+				self.times[stage] += time.perf_counter() - start
+		return timed
+
+	def __enter__(self):
+		for stage, (owner, name) in self.STAGES.items():
+			original = vars(owner)[name]
+			self._originals[stage] = original
+			if isinstance(original, classmethod):
+				setattr(owner, name, classmethod(self._wrap(stage, original.__func__)))
+			else:
+				setattr(owner, name, self._wrap(stage, original))
+		return self
+
+	def __exit__(self, *exc):
+		for stage, (owner, name) in self.STAGES.items():
+			setattr(owner, name, self._originals[stage])
+
+
+def clear_caches():
+	'''
+	Empties every cache of ViPOr, so the next benchmark starts cold.
+	'''
+
+	orbit_cache.clear_cache()
+	for region in (orbit_animation._animations, potential_grid._grids, rotation_curves._curves, milky_way._tables):
+		region.clear()
+
+
+def slider_middle(pot_name):
+	'''
+	Returns the value of a potential's key parameter halfway along its slider.
+	'''
+
+	min_value, max_value, step = pick_potential.pick_potential(pot_name, POT_NAMES.index(pot_name))[5:]
+	return min_value + round((max_value - min_value)/2./step)*step
+
+
+def render(figures):
+	'''
+	Renders the figures to PNG, as st.pyplot does, and releases them.
+	'''
+
+	for fig in figures:
+		fig = fig if hasattr(fig, "savefig") else fig.get_figure()
+		fig.savefig(io.BytesIO(), format = "png")
+		figure_manager.release(fig)
+
+
+def peak_memory(function):
+	'''
+	Runs a function once, and returns the peak memory it allocated, in MB. This is a separate run from the timed one, since tracing
+	the allocations slows the function down.
+	'''
+
+	tracemalloc.start()
+	function()
+	peak = tracemalloc.get_traced_memory()[1]
+	tracemalloc.stop()
+	return peak/1024.**2
+
+
+def _figures(outputs):
+	'''
+	Picks the figures out of the outputs of an orbit plotting function, leaving out the animations' HTML.
+	'''
+
+	return [output for output in outputs if not isinstance(output, str)]
+
+
+def bench_set_potential(pot_name, repeat):
+	'''
+	Times setting up a potential, as the best of a number of repeats — both building it from scratch ("total") and handing back the
+	interned instance on a later rerun ("interned").
+	'''
+
+	param = slider_middle(pot_name)
+	times = {"total": [], "interned": []}
+	for _ in range(repeat):
+		potential_registry.clear_cache()
+		for stage in ("total", "interned"):
+			start = time.perf_counter()
+			pick_potential.set_potential(pot_name, param)
+			times[stage].append(time.perf_counter() - start)
+	return {stage: min(stage_times) for stage, stage_times in times.items()}
+
+
+def bench_plot_orbit(plot_fxn, pot_name, warm):
+	'''
+	Times one call of an orbit plotting function, broken down into stages. A cold call starts from empty caches, a warm call repeats
+	the same call with the caches filled.
+	'''
+
+	pot_fxn = pick_potential.set_potential(pot_name, slider_middle(pot_name))
+	run = lambda: render(_figures(plot_fxn(pot_fxn, YEARS, R, Z)))
+
+	def prepare():
+		clear_caches()
+		if warm:
+			run()
+
+	prepare()
+	with StageTimer() as timer:
+		start = time.perf_counter()
+		outputs = plot_fxn(pot_fxn, YEARS, R, Z)
+		elapsed = time.perf_counter() - start
+		start = time.perf_counter()
+		render(_figures(outputs))
+		rendering = time.perf_counter() - start
+
+	result = dict(timer.times)
+	result["figures"] = elapsed - sum(timer.times.values())
+	result["rendering"] = rendering
+	result["total"] = elapsed + rendering
+
+	prepare()
+	result["peak_memory_mb"] = peak_memory(run)
+	return result
+
+
+def bench_page(page, tick_all):
+	'''
+	Times a full run of a page through Streamlit's headless AppTest harness, from empty caches.
+	'''
+
+	from streamlit.testing.v1 import AppTest
+
+	clear_caches()
+	app = AppTest.from_file(os.path.join(VIPOR_DIR, "pages", page), default_timeout = 600)
+
+	def run():
+		app.run()
+		if tick_all:
+			for checkbox in app.checkbox:
+				checkbox.check()
+			app.run()
+
+	start = time.perf_counter()
+	run()
+	elapsed = time.perf_counter() - start
+	if app.exception:
+		raise RuntimeError("%s raised: %s" % (page, app.exception[0].value))
+
+	# the peak memory is measured on a second cold run, of a fresh copy of the page
+	clear_caches()
+	app = AppTest.from_file(os.path.join(VIPOR_DIR, "pages", page), default_timeout = 600)
+	peak = peak_memory(run)
+	return {"total": elapsed, "peak_memory_mb": peak}
+
+
+def compare(results, baseline):
+	'''
+	Lists the benchmarks whose total time grew by more than REGRESSION_THRESHOLD against an earlier run.
+	'''
+
+	regressions = []
+	for name, result in results["benchmarks"].items():
+		before = baseline.get("benchmarks", {}).get(name)
+		if before and result["total"] > REGRESSION_THRESHOLD*before["total"]:
+			regressions.append("%s: %.3f s -> %.3f s" % (name, before["total"], result["total"]))
+	return regressions
+
+
+def main():
+	'''
+	Runs the benchmark suite from the command line.
+	'''
+
+	parser = argparse.ArgumentParser(description = "Benchmark ViPOr's plotting functions and pages.")
+	parser.add_argument("--out", default = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results.json"),
+		help = "the JSON file to write the results to")
+	parser.add_argument("--compare", help = "an earlier results file to check for regressions")
+	parser.add_argument("--repeat", type = int, default = 5, help = "the number of repeats of the quick benchmarks")
+	parser.add_argument("--skip-pages", action = "store_true", help = "don't run the pages through AppTest")
+	args = parser.parse_args()
+
+	warnings.filterwarnings("ignore")
+	benchmarks = {}
+
+	def record(name, function, *inputs):
+		benchmarks[name] = function(*inputs)
+		print("%-60s %8.3f s" % (name, benchmarks[name]["total"]), flush = True)
+
+	for pot_name in POT_NAMES:
+		record("set_potential/" + pot_name, bench_set_potential, pot_name, args.repeat)
+		for plot_name, plot_fxn in (("plot_orbit_2D", plot_orbit_2D), ("plot_orbit_3D", plot_orbit_3D)):
+			for warm in (False, True):
+				record("%s/%s/%s" % (plot_name, pot_name, "warm" if warm else "cold"), bench_plot_orbit, plot_fxn, pot_name, warm)
+
+	if not args.skip_pages:
+		# the pages print their own warnings about running outside of "streamlit run", which would drown out the report
+		with contextlib.redirect_stderr(io.StringIO()):
+			for page, tick_all in PAGES.items():
+				record("page/" + page, bench_page, page, tick_all)
+
+	results = {
+		"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+		"python": platform.python_version(),
+		"platform": platform.platform(),
+		"cpus": os.cpu_count(),
+		# with an orbit lattice on disk, the cold orbit plots read their orbits from it instead of integrating them
+		"lattice": orbit_lattice.open_lattice() is not None,
+		"max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss/1024.,
+		"benchmarks": benchmarks,
+	}
+
+	os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok = True)
+	with open(args.out, "w") as out_file:
+		json.dump(results, out_file, indent = 1)
+	print("Wrote the results to %s" % args.out)
+
+	if args.compare:
+		with open(args.compare) as baseline_file:
+			regressions = compare(results, json.load(baseline_file))
+		for regression in regressions:
+			print("REGRESSION " + regression)
+		if regressions:
+			sys.exit(1)
+
+
+if __name__ == "__main__":
+	main()
@@ -7,6 +7,7 @@ setuptools.setup(
      author_email="olivia.aspegren@yale.edu",
      description="A teaching tool for understanding galaxy potentials and orbits",
      packages=["ViPOr","ViPOr/pages"],
-     install_requires=["streamlit", "numpy", "galpy", "matplotlib", "astropy", "numexpr"],
+     install_requires=["streamlit", "numpy", "galpy", "matplotlib", "astropy"],
+     entry_points={"console_scripts": ["vipor-render=ViPOr.render_sweep:main"]},
 )
 
@@ -0,0 +1,21 @@
+# This file sets up the tests of ViPOr. The modules import each other by their bare names, as the streamlit pages do, so the ViPOr
+# directory is put on the path, and everything the modules write to disk (the image cache, the Milky Way tables and the orbit lattice)
+# is kept in a temporary directory, so the tests never read or leave behind the files of a real server.
+#
+# Run the tests from the top-level directory with:
+#     python -m pytest tests
+
+import os
+import sys
+import tempfile
+
+VIPOR_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "ViPOr")
+sys.path.insert(0, VIPOR_DIR)
+
+_scratch = tempfile.mkdtemp(prefix = "vipor-tests-")
+for variable, name in (("VIPOR_IMAGE_CACHE", "image_cache"), ("VIPOR_MILKY_WAY", "milky_way_tables"), ("VIPOR_LATTICE", "lattice")):
+	os.environ.setdefault(variable, os.path.join(_scratch, name))
+os.environ.setdefault("VIPOR_PREWARM", "0")
+
+import matplotlib
+matplotlib.use("Agg")
@@ -0,0 +1,70 @@
+# Tests of the incrementally integrated orbits: a trajectory that is cut short, extended, or started from the orbit lattice matches an
+# orbit integrated in one go on the same output times.
+
+import numpy
+import pytest
+
+import orbit_cache
+from orbit_lattice import make_potential
+from orbit_trace import OrbitTrace
+from sampling import output_rate
+
+R, Z = 8., 1.
+
+
+@pytest.fixture
+def pot_fxn():
+	orbit_cache.clear_cache()
+	yield make_potential("Plummer Potential", 7.)
+	orbit_cache.clear_cache()
+
+
+def fixed_trace(pot_fxn, years):
+	'''
+	Integrates an orbit in one go, with as many output times as the incremental trajectory of the same length.
+	'''
+
+	return orbit_cache.get_trace(pot_fxn, years, R, Z, n_steps = years*output_rate(pot_fxn, R, Z) + 1)
+
+
+def assert_same_orbit(trace, expected):
+	assert len(trace) == len(expected)
+	for name in OrbitTrace.SERIES:
+		assert numpy.allclose(trace[name], expected[name], rtol = 1e-5, atol = 1e-5), name
+
+
+def test_extended_trace_matches_fixed_steps(pot_fxn):
+	orbit_cache._incremental_trace(pot_fxn, 2, R, Z)
+	trace = orbit_cache._incremental_trace(pot_fxn, 5, R, Z)
+
+	assert_same_orbit(trace, fixed_trace(pot_fxn, 5))
+	assert orbit_cache.cache_info()["extensions"] == 2
+
+
+def test_truncated_trace_matches_fixed_steps(pot_fxn):
+	orbit_cache._incremental_trace(pot_fxn, 5, R, Z)
+	trace = orbit_cache._incremental_trace(pot_fxn, 2, R, Z)
+
+	assert_same_orbit(trace, fixed_trace(pot_fxn, 2))
+	assert orbit_cache._incremental_trace(pot_fxn, 2, R, Z) is trace
+	info = orbit_cache.cache_info()
+	assert info["extensions"] == 1 and info["truncations"] == 2
+
+
+def test_trajectory_starts_from_the_lattice(pot_fxn, monkeypatch):
+	expected, shorter = fixed_trace(pot_fxn, 7), fixed_trace(pot_fxn, 2)
+
+	# the lattice keeps the longest trajectory of each orbit, in single precision
+	lattice_trace = fixed_trace(pot_fxn, 5)
+	stored = OrbitTrace(**{name: lattice_trace[name].astype(numpy.float32) for name in OrbitTrace.SERIES})
+	monkeypatch.setattr(orbit_cache, "lookup", lambda key: stored)
+
+	# a shorter orbit is the start of the stored trajectory, and a longer one is integrated on from its end
+	trace = orbit_cache._incremental_trace(pot_fxn, 2, R, Z)
+	assert len(trace) == len(shorter) and numpy.shares_memory(trace.R, stored.R)
+	assert orbit_cache._incremental_trace(pot_fxn, 5, R, Z) is stored
+	trace = orbit_cache._incremental_trace(pot_fxn, 7, R, Z)
+
+	assert_same_orbit(trace, expected)
+	info = orbit_cache.cache_info()
+	assert info["lattice"] == 1 and info["extensions"] == 1
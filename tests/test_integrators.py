@@ -0,0 +1,90 @@
+# Tests of the choice of integrator: an orbit that drifts too far in energy with the chosen integrator is integrated again with the most
+# accurate one, which is then used for the rest of its family of potentials, while in a batch of orbits only the orbits that drift too
+# far are integrated again.
+
+import numpy
+import pytest
+
+import integrators
+import natural_units
+from orbit_lattice import make_potential
+
+
+@pytest.fixture
+def pot_fxn():
+	integrators._choices.clear(reset = True)
+	yield make_potential("Plummer Potential", 7.)
+	integrators._choices.clear(reset = True)
+
+
+def make_orbit(pot_fxn):
+	from galpy.orbit import Orbit
+
+	ro, vo = natural_units.scales(pot_fxn)
+	return Orbit(natural_units.initial_conditions(8., 1., ro), ro = ro, vo = vo), natural_units.time_grid(2., 501, ro, vo)
+
+
+def choose(pot_fxn, orbit, times):
+	ro, vo = natural_units.scales(pot_fxn)
+	return integrators.choose_method(pot_fxn, numpy.asarray(orbit.vxvv).reshape(-1), times[1] - times[0], ro, vo)
+
+
+def choose_fastest(pot_fxn, orbit, times):
+	'''
+	Makes the family of the potential use an integrator other than its most accurate one, so that an orbit can fall back.
+	'''
+
+	choice = choose(pot_fxn, orbit, times)
+	fastest = next(method for method in integrators.candidate_methods(pot_fxn) if method != choice["reference"])
+	key = (integrators.potential_family(pot_fxn), integrators.candidate_methods(pot_fxn))
+	integrators._choices.put(key, dict(choice, method = fastest))
+	return choice, fastest
+
+
+def test_drifting_orbit_falls_back(pot_fxn, monkeypatch):
+	orbit, times = make_orbit(pot_fxn)
+	choice, fastest = choose_fastest(pot_fxn, orbit, times)
+	monkeypatch.setattr(integrators, "DRIFT_TOLERANCE", 0.)
+
+	report = integrators.integrate(orbit, times, pot_fxn)
+
+	assert report["fell back"] and report["method"] == choice["reference"]
+	assert choose(pot_fxn, orbit, times)["method"] == choice["reference"]
+	assert integrators.cache_info()["fallbacks"] == 1
+
+
+def test_conserving_orbit_keeps_its_integrator(pot_fxn):
+	orbit, times = make_orbit(pot_fxn)
+	choice = choose(pot_fxn, orbit, times)
+
+	report = integrators.integrate(orbit, times, pot_fxn)
+
+	assert not report["fell back"] and report["method"] == choice["method"]
+	assert report["drift"] <= integrators.DRIFT_TOLERANCE
+
+
+def test_only_drifting_orbits_of_a_batch_fall_back(pot_fxn, monkeypatch):
+	orbit, times = make_orbit(pot_fxn)
+	choice, fastest = choose_fastest(pot_fxn, orbit, times)
+	ro, vo = natural_units.scales(pot_fxn)
+	vxvv = numpy.array([natural_units.initial_conditions(R, 1., ro) for R in (1., 2., 4., 8., 16., 32.)], dtype = float)
+	monkeypatch.setattr(integrators, "MAX_CORES", 1)
+	monkeypatch.setattr(integrators, "CHUNK_SIZE", 4)
+
+	# the tolerance is set between the drifts of the orbits, so half of them fall back
+	drifts = integrators._integrate_chunk(vxvv, times, pot_fxn, ro, vo, fastest, fastest, {})[1]
+	monkeypatch.setattr(integrators, "DRIFT_TOLERANCE", float(numpy.median(drifts)))
+	failed = drifts > integrators.DRIFT_TOLERANCE
+
+	phase_space, report = integrators.integrate_batch(vxvv, times, pot_fxn, ro, vo)
+
+	assert phase_space.shape == (len(vxvv), len(times), 6)
+	assert report["method"] == fastest and report["fell back"] == failed.sum() > 0
+	assert integrators.cache_info()["fallbacks"] == failed.sum()
+	assert choose(pot_fxn, orbit, times)["method"] == fastest
+
+	# the orbits that didn't drift too far are the ones integrated with the family's integrator, and the others were integrated again
+	kept = integrators._integrate_chunk(vxvv[~failed], times, pot_fxn, ro, vo, fastest, fastest, {})[0]
+	again = integrators._integrate_chunk(vxvv[failed], times, pot_fxn, ro, vo, choice["reference"], choice["reference"], {})[0]
+	assert numpy.allclose(phase_space[~failed], kept)
+	assert numpy.allclose(phase_space[failed], again)
@@ -0,0 +1,31 @@
+# Tests of the Milky Way's precomputed tables: the potential and the rotation curve of a combination of components, put together from
+# the tables of the components, match those of the combination evaluated with galpy.
+
+import numpy
+
+import milky_way
+
+
+def test_superposition_matches_galpy():
+	from galpy.potential import calcRotcurve
+
+	names = ["bulge", "disk", "halo"]
+	potRz, curves, rot_curve = milky_way.superpose(names)
+
+	tables = [milky_way.component_table(name) for name in names]
+	assert numpy.allclose(potRz, sum(table["potRz"] for table in tables))
+	assert list(curves) == [milky_way.LABELS[name] for name in names]
+
+	bulge, disk, halo = (milky_way.components()[name] for name in names)
+	combination = bulge + disk + halo
+	assert numpy.allclose(rot_curve, calcRotcurve(combination, milky_way.RADII), rtol = 1e-8)
+
+
+def test_tables_are_read_back_from_disk():
+	table = milky_way.component_table("black hole")
+	milky_way._tables.clear(reset = True)
+
+	again = milky_way.component_table("black hole")
+	assert milky_way.cache_info()["disk"] == 1
+	# the potential of the black hole is undefined at the center, which is on the grid
+	assert all(numpy.array_equal(table[field], again[field], equal_nan = True) for field in table)
@@ -0,0 +1,26 @@
+# Tests of the orbit animations: an animation that is already in the cache is handed back without working anything out with galpy.
+
+import orbit_animation
+import orbit_cache
+from orbit_lattice import make_potential
+
+
+def test_cached_animation_skips_galpy(monkeypatch):
+	orbit_animation._animations.clear(reset = True)
+	pot_fxn = make_potential("Plummer Potential", 7.)
+	raw_html = orbit_animation.get_animation(pot_fxn, 3, 8., 1.)
+
+	def fail(*args, **kwargs):
+		raise AssertionError("the output rate was worked out again")
+
+	monkeypatch.setattr(orbit_cache, "output_rate", fail)
+	assert orbit_animation.get_animation(pot_fxn, 3, 8., 1.) is raw_html
+	assert orbit_animation.cache_info()["hits"] == 1
+
+
+def test_animation_is_decimated():
+	trace = orbit_cache.get_trace(make_potential("Plummer Potential", 7.), 10, 8., 1.)
+	raw_html = orbit_animation.animation_html(trace, "x", "y", frame_budget = 100)
+
+	assert len(trace) > 100 and "var n = 100," in raw_html
+	assert len(orbit_animation.decimate(len(trace), 100)) == 100
@@ -0,0 +1,83 @@
+# Tests of the cache of integrated orbits: the 2D and 3D plots of the same orbit share a single integration, even with potentials that
+# are different objects, and the cache evicts its least recently used orbits when it runs out of entries or memory.
+
+import pytest
+
+from figure_manager import release
+import orbit_cache
+
+R, Z = 8., 1.
+
+
+def plummer():
+	'''
+	Builds a Plummer potential directly with galpy, so that each call returns a new object with the same fingerprint.
+	'''
+
+	from galpy.potential import PlummerPotential
+
+	return PlummerPotential(amp = 1., b = 0.8)
+
+
+@pytest.fixture(autouse = True)
+def empty_cache():
+	limits = orbit_cache.MAX_ENTRIES, orbit_cache.MAX_BYTES
+	orbit_cache.clear_cache()
+	yield
+	orbit_cache.configure(*limits)
+	orbit_cache.clear_cache()
+
+
+def test_2D_and_3D_plots_share_the_orbit():
+	from PlotPotentialandOrbit2D import plot_orbit_2D
+	from PlotPotentialandOrbit3D import plot_orbit_3D
+
+	first, second = plummer(), plummer()
+	assert first is not second
+	assert orbit_cache.potential_fingerprint(first) == orbit_cache.potential_fingerprint(second)
+
+	for output in plot_orbit_2D(first, 2, R, Z)[:4]:
+		release(output)
+	assert orbit_cache.cache_info()["misses"] == 1
+	hits = orbit_cache.cache_info()["hits"]
+
+	for output in plot_orbit_3D(second, 2, R, Z)[:3]:
+		release(output)
+	info = orbit_cache.cache_info()
+	assert info["misses"] == 1 and info["hits"] > hits
+	assert orbit_cache.get_trace(first, 2, R, Z) is orbit_cache.get_trace(second, 2, R, Z)
+
+
+def test_hits_and_misses_are_counted():
+	pot_fxn = plummer()
+	orbit = orbit_cache.get_orbit(pot_fxn, 2, R, Z, n_steps = 101)
+	assert orbit_cache.get_orbit(plummer(), 2, R, Z, n_steps = 101) is orbit
+	orbit_cache.get_orbit(pot_fxn, 3, R, Z, n_steps = 101)
+
+	info = orbit_cache.cache_info()
+	assert info["hits"] == 1 and info["misses"] == 2 and info["entries"] == 2
+
+
+def test_least_recently_used_orbit_is_evicted():
+	orbit_cache.configure(max_entries = 2)
+	pot_fxn = plummer()
+	first = orbit_cache.get_orbit(pot_fxn, 1, R, Z, n_steps = 101)
+	orbit_cache.get_orbit(pot_fxn, 2, R, Z, n_steps = 101)
+	assert orbit_cache.get_orbit(pot_fxn, 1, R, Z, n_steps = 101) is first
+	orbit_cache.get_orbit(pot_fxn, 3, R, Z, n_steps = 101)
+
+	info = orbit_cache.cache_info()
+	assert info["entries"] == 2 and info["evictions"] == 1
+	assert orbit_cache.get_orbit(pot_fxn, 1, R, Z, n_steps = 101) is first
+	assert orbit_cache.cache_info()["misses"] == 3
+
+
+def test_orbits_are_evicted_past_the_byte_budget():
+	pot_fxn = plummer()
+	orbit_cache.get_orbit(pot_fxn, 1, R, Z, n_steps = 101)
+	nbytes = orbit_cache.cache_info()["bytes"]
+	orbit_cache.configure(max_bytes = int(1.5*nbytes))
+	orbit_cache.get_orbit(pot_fxn, 2, R, Z, n_steps = 101)
+
+	info = orbit_cache.cache_info()
+	assert info["entries"] == 1 and info["evictions"] == 1 and info["bytes"] == nbytes
@@ -0,0 +1,59 @@
+# Tests of the orbit lattice: only the longest trajectory of each potential and starting point is stored, and every shorter orbit is read
+# from the start of it, while a lattice that is built while the server runs is picked up.
+
+import numpy
+import pytest
+
+import orbit_cache
+import orbit_lattice
+from orbit_lattice import build_lattice, lattice_jobs, lookup, make_potential, open_lattice
+from orbit_trace import OrbitTrace
+from sampling import output_rate
+
+R, Z = 10., 5.
+
+
+@pytest.fixture
+def lattice_dir(tmp_path, monkeypatch):
+	monkeypatch.setattr(orbit_lattice, "LATTICE_DIR", str(tmp_path))
+	orbit_cache.clear_cache()
+	yield str(tmp_path)
+	orbit_cache.clear_cache()
+
+
+def test_jobs_have_no_integration_time():
+	jobs = lattice_jobs(["Plummer Potential"], (0., 10., 5.), (0., 5., 5.))
+
+	assert len(jobs) == 20*3*2
+	assert jobs[0] == ("Plummer Potential", 1.0, 0.0, 0.0)
+
+
+def test_missing_lattice_is_looked_for_again(lattice_dir):
+	assert open_lattice() is None
+
+	build_lattice(lattice_dir, lattice_jobs(["Plummer Potential"], (R, R, 1.), (Z, Z, 1.))[:1], processes = 1)
+	store = open_lattice()
+
+	assert store is not None and len(store["index"]) == 1
+	assert open_lattice() is store
+
+
+def test_shorter_orbits_are_read_from_the_longest(lattice_dir):
+	build_lattice(lattice_dir, [("Plummer Potential", 7.0, R, Z)], processes = 1)
+	pot_fxn = make_potential("Plummer Potential", 7.0)
+	rate = output_rate(pot_fxn, R, Z)
+	stored = lookup(orbit_cache.run_key(pot_fxn, R, Z))
+	assert len(stored) == orbit_lattice.LATTICE_YEARS*rate + 1
+
+	# an orbit of 3 Gyr is the start of the stored trajectory, which matches the same orbit integrated on its own
+	trace = orbit_cache.get_trace(pot_fxn, 3, R, Z)
+	assert len(trace) == 3*rate + 1
+	assert numpy.shares_memory(trace.R, stored.R)
+	expected = orbit_cache.get_trace(pot_fxn, 3, R, Z, n_steps = 3*rate + 1)
+	assert numpy.shares_memory(expected.R, stored.R)
+	integrated = OrbitTrace.from_orbit(orbit_cache.get_orbit(pot_fxn, 3, R, Z, n_steps = 3*rate + 1))
+	for name in OrbitTrace.SERIES:
+		assert numpy.allclose(trace[name], integrated[name], rtol = 1e-5, atol = 1e-5), name
+
+	info = orbit_cache.cache_info()
+	assert info["lattice"] == 2 and info["extensions"] == 0
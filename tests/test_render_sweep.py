@@ -0,0 +1,48 @@
+# Tests of sweeps: the values of an axis are read from ranges, numbers or lists, and a sweep that is run again only renders the orbits
+# that didn't finish the first time.
+
+import json
+import os
+
+import pytest
+
+import render_sweep
+
+
+def fake_render_job(job, out_dir, outputs, dimensions, dpi):
+	'''
+	Stands in for render_job in the worker processes, without rendering anything.
+	'''
+
+	return {"job": render_sweep.job_name(job), "status": "ok", "error": None, "files": [], "timings": {"total": 0.}}
+
+
+def test_sweep_resumes_from_manifest(tmp_path, monkeypatch):
+	monkeypatch.setattr(render_sweep, "render_job", fake_render_job)
+	jobs = render_sweep.sweep_jobs("Plummer Potential", [[1.]], 1, [5, 10, 20], 0)
+	names = [render_sweep.job_name(job) for job in jobs]
+
+	# the first orbit finished, the second failed, and the run was killed while writing the third
+	with open(os.path.join(tmp_path, render_sweep.MANIFEST), "w") as manifest:
+		manifest.write(json.dumps({"job": names[0], "status": "ok"}) + "\n")
+		manifest.write(json.dumps({"job": names[1], "status": "error"}) + "\n")
+		manifest.write('{"job": "%s", "sta' % names[2])
+	assert render_sweep.finished_jobs(tmp_path) == {names[0]}
+
+	lines = []
+	counts = render_sweep.render_sweep(jobs, str(tmp_path), processes = 1, progress = lines.append)
+	assert counts == {"ok": 2, "error": 0, "skipped": 1}
+	assert len(lines) == 2
+	assert render_sweep.finished_jobs(tmp_path) == set(names)
+
+	assert render_sweep.render_sweep(jobs, str(tmp_path), processes = 1) == {"ok": 0, "error": 0, "skipped": 3}
+
+
+def test_sweep_values():
+	assert render_sweep.sweep_values("1:3:1") == [1., 2., 3.]
+	assert render_sweep.sweep_values("2.5") == [2.5]
+	assert render_sweep.sweep_values([5, 10]) == [5., 10.]
+
+	for value in ("1:3", "1:3:1:2"):
+		with pytest.raises(ValueError):
+			render_sweep.sweep_values(value)
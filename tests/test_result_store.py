@@ -0,0 +1,93 @@
+# Tests of the shared result store: a result that is asked for by several sessions at once is computed once, and the regions evict
+# their least recently used results when they run out of entries or memory.
+
+import threading
+import time
+
+import numpy
+import pytest
+
+import result_store
+
+
+def test_concurrent_requests_compute_once():
+	store_region = result_store.region("test single flight")
+	store_region.clear(reset = True)
+	calls = []
+	barrier = threading.Barrier(8)
+	results = []
+
+	def compute():
+		calls.append(None)
+		time.sleep(0.2)
+		return object()
+
+	def ask():
+		barrier.wait()
+		results.append(store_region.get_or_compute("key", compute))
+
+	threads = [threading.Thread(target = ask) for _ in range(8)]
+	for thread in threads:
+		thread.start()
+	for thread in threads:
+		thread.join()
+
+	assert len(calls) == 1
+	assert all(result is results[0] for result in results)
+	info = store_region.info()
+	assert info["misses"] == 1 and info["hits"] == 7 and info["shared"] == 7
+
+
+def test_failed_computation_is_tried_again():
+	store_region = result_store.region("test failure")
+	store_region.clear(reset = True)
+
+	def fail():
+		raise RuntimeError("interrupted")
+
+	with pytest.raises(RuntimeError):
+		store_region.get_or_compute("key", fail)
+	assert store_region.get_or_compute("key", lambda: 42) == 42
+	assert store_region.info()["entries"] == 1
+
+
+def test_least_recently_used_is_evicted():
+	store_region = result_store.region("test lru", max_entries = 2)
+	store_region.clear(reset = True)
+	store_region.put("a", 1)
+	store_region.put("b", 2)
+	assert store_region.get("a") == 1
+	store_region.put("c", 3)
+
+	assert [key for key, _ in store_region.items()] == ["a", "c"]
+	assert store_region.get("b") is None
+	assert store_region.info()["evictions"] == 1
+
+
+def test_region_byte_limit():
+	store_region = result_store.region("test bytes", max_bytes = 100)
+	store_region.clear(reset = True)
+	for key in "abc":
+		store_region.put(key, numpy.zeros(5))
+
+	info = store_region.info()
+	assert [key for key, _ in store_region.items()] == ["b", "c"]
+	assert info["bytes"] == 80 and info["evictions"] == 1
+
+
+def test_store_budget_evicts_across_regions():
+	first, second = result_store.region("test budget 1"), result_store.region("test budget 2")
+	budget = result_store.MAX_BYTES
+	result_store.clear_store()
+	try:
+		result_store.configure(100)
+		first.put("a", numpy.zeros(5))
+		second.put("b", numpy.zeros(5))
+		first.get("a")
+		second.put("c", numpy.zeros(5))
+
+		assert first.get("a") is not None
+		assert second.get("b") is None and second.get("c") is not None
+		assert result_store.store_info()["bytes"] == 80
+	finally:
+		result_store.configure(budget)
@@ -0,0 +1,20 @@
+# Tests of the rotation curves of composite potentials: the curve built from the cached components matches galpy's, even where one of
+# the components pulls outwards and has no circular velocity of its own.
+
+import numpy
+
+import rotation_curves
+
+
+def test_composite_matches_galpy():
+	from astropy import units
+	from galpy.potential import NFWPotential, PlummerPotential, SphericalShellPotential, calcRotcurve
+
+	radii = numpy.linspace(0.01, 50, 200)*units.kpc
+	pot_fxn = [SphericalShellPotential(amp = 1., a = 3.), PlummerPotential(amp = -0.2, b = 1.), NFWPotential(a = 2.)]
+	assert numpy.isnan(rotation_curves.component_curve(pot_fxn[1], radii)).all()
+
+	curve, path = rotation_curves.rotation_curve(pot_fxn, radii)
+
+	assert path == "quadrature"
+	assert numpy.allclose(curve, calcRotcurve(pot_fxn, radii), rtol = 1e-10)
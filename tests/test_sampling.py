@@ -0,0 +1,29 @@
+# Tests of the downsampling of the curves that are drawn with fewer points than they have, with the triangle variant of LTTB.
+
+import numpy
+
+from sampling import triangle_downsample
+
+
+def test_triangle_downsample_keeps_endpoints_and_count():
+	t = numpy.linspace(0., 40., 10000)
+	keep = triangle_downsample(numpy.cos(t), numpy.sin(3*t), n_out = 500)
+
+	assert len(keep) == 500
+	assert keep[0] == 0 and keep[-1] == len(t) - 1
+	assert numpy.all(numpy.diff(keep) > 0)
+
+
+def test_triangle_downsample_keeps_spikes():
+	x = numpy.arange(10000.)
+	y = numpy.zeros(10000)
+	y[1234] = 1.
+	keep = triangle_downsample(x, y, n_out = 100)
+
+	assert 1234 in keep
+
+
+def test_short_curves_are_kept_whole():
+	keep = triangle_downsample(numpy.arange(50.), numpy.arange(50.), n_out = 100)
+
+	assert numpy.array_equal(keep, numpy.arange(50))
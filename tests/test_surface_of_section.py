@@ -0,0 +1,27 @@
+# Tests of the location of the crossings of the galactic plane, on orbits whose crossings are known exactly.
+
+import numpy
+
+from surface_of_section import find_crossings
+
+
+def test_crossings_of_harmonic_orbits():
+	# two orbits oscillating harmonically about the plane, with z = A sin(w t + p), and harmonically in radius with frequency W
+	t = numpy.arange(0.3, 60., 0.2)
+	A, w, p = numpy.array([[1.], [0.5]]), numpy.array([[1.], [1.7]]), numpy.array([[0.], [1.]])
+	W = 0.7
+	z, vz = A*numpy.sin(w*t + p), A*w*numpy.cos(w*t + p)
+	R, vR = 8. + numpy.cos(W*t)*numpy.ones((2, 1)), -W*numpy.sin(W*t)*numpy.ones((2, 1))
+
+	R_cross, vR_cross, orbit = find_crossings(t, R, vR, z, vz)
+
+	# the upward crossings are at w t + p = 2 pi k
+	expected = []
+	for i in range(2):
+		k = numpy.arange(numpy.ceil((w[i, 0]*t[0] + p[i, 0])/(2*numpy.pi)), (w[i, 0]*t[-1] + p[i, 0])/(2*numpy.pi))
+		expected.append((2*numpy.pi*k - p[i, 0])/w[i, 0])
+	assert numpy.array_equal(orbit, numpy.repeat([0, 1], [len(times) for times in expected]))
+
+	t_cross = numpy.concatenate(expected)
+	assert numpy.allclose(R_cross, 8. + numpy.cos(W*t_cross), atol = 1e-4)
+	assert numpy.allclose(vR_cross, -W*numpy.sin(W*t_cross), atol = 1e-2)